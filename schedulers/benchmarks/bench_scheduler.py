@@ -0,0 +1,246 @@
+import argparse
+import glog
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import schedulers.constants as const
+from schedulers.lib.domain import Cluster
+from schedulers.lib.misc import percentile
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.synthetic import (DEFAULT_FLAVORS, DEFAULT_SERVER_TYPES, Lifetime,
+    parse_flavors, write_topology, write_workload)
+from schedulers.lib.weighers import WEIGHERS, make_weigher_policy
+
+from schedulers.novafilter import NovaFilter
+
+# metric name -> True if higher is better
+METRIC_DIRECTIONS = {
+    'load_secs': False,
+    'allocate_events_per_sec': True,
+    'allocate_p50_microsec': False,
+    'allocate_p99_microsec': False,
+    'deallocate_events_per_sec': True,
+    'deallocate_p50_microsec': False,
+    'deallocate_p99_microsec': False,
+    'output_secs': False,
+    'peak_rss_mb': False,
+}
+# metrics that depend on the speed of the machine, see calibrate
+TIMED_METRICS = set(METRIC_DIRECTIONS) - {'peak_rss_mb'}
+
+
+def peak_rss_mb() -> float:
+    """ Peak resident set size of this process so far. ru_maxrss is in KB on
+    Linux and in bytes on macOS. """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2**20 if sys.platform == 'darwin' else maxrss / 2**10
+
+
+def latency_metrics(prefix: str, latencies: List[float], total_secs: float) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {
+        prefix + '_events': len(latencies),
+        prefix + '_events_per_sec': len(latencies) / total_secs if total_secs > 0 else 0.0,
+        prefix + '_p50_microsec': percentile(latencies, 50),
+        prefix + '_p99_microsec': percentile(latencies, 99),
+    }
+
+
+def run_benchmark(topology_path: str, workload_path: str, cluster_mode: str,
+        weigher: str, output_path: str, host_subset_size: int = 0,
+        filter_cache_size: int = 0, shards: int = 0) -> Dict[str, float]:
+    """ Time loading, every allocate_vm and deallocate_vm call, and writing the
+    output of one replay. """
+    perf_counter = time.perf_counter
+    start_time = perf_counter()
+    if cluster_mode in ('vectorized', 'sharded'):
+        from schedulers.lib.array_domain import ArrayCluster
+        cluster = ArrayCluster()
+    else:
+        cluster = Cluster()
+    cluster.load(topology_path)
+    if cluster_mode == 'index':
+        cluster.build_capacity_index()
+    elif cluster_mode == 'topology':
+        cluster.build_topology_index()
+    elif cluster_mode == 'sharded':
+        cluster.start_shards(shards)
+    replayer = WorkloadReplayer()
+    replayer.load_workload(workload_path)
+    load_secs = perf_counter() - start_time
+
+    scheduler = NovaFilter(cluster, False, weigher_policy=make_weigher_policy(weigher),
+        host_subset_size=host_subset_size, filter_cache_size=filter_cache_size)
+    allocate_latencies = []
+    deallocate_latencies = []
+    allocate_secs = 0.0
+    deallocate_secs = 0.0
+    events = replayer.replay()
+    while len(events) > 0:
+        for req in events:
+            if req.type == const.VM_CREATE_STR:
+                start_time = perf_counter()
+                scheduler.allocate_vm(req)
+                elapsed = perf_counter() - start_time
+                allocate_secs += elapsed
+                allocate_latencies.append(elapsed * 10**6)
+            else:
+                start_time = perf_counter()
+                scheduler.deallocate_vm(req)
+                elapsed = perf_counter() - start_time
+                deallocate_secs += elapsed
+                deallocate_latencies.append(elapsed * 10**6)
+        events = replayer.replay()
+
+    if cluster.shard_router is not None:
+        cluster.shard_router.close()
+
+    start_time = perf_counter()
+    scheduler.output_allocations(output_path)
+    output_secs = perf_counter() - start_time
+
+    metrics = {'load_secs': load_secs, 'output_secs': output_secs, 'peak_rss_mb': peak_rss_mb(),
+        const.FAIL_VM_STR: scheduler.failure_stats[const.FAIL_VM_STR]}
+    metrics.update(latency_metrics('allocate', allocate_latencies, allocate_secs))
+    metrics.update(latency_metrics('deallocate', deallocate_latencies, deallocate_secs))
+    if scheduler.filter_cache is not None:
+        metrics['filter_cache_hit_rate'] = scheduler.filter_cache.stats()['hit_rate']
+    return metrics
+
+
+def machine() -> Dict[str, object]:
+    """ Where a baseline was measured. """
+    return {'platform': platform.platform(), 'processor': platform.processor(),
+        'cpus': os.cpu_count(), 'python': platform.python_version()}
+
+
+def calibrate(repeat: int = 5) -> float:
+    """ Seconds a fixed pure Python workload takes in this process, the best
+    of repeat runs. Timed metrics are compared relative to it, so a baseline
+    stays meaningful on a faster or busier machine. """
+    rng = random.Random(0)
+    values = [rng.random() for _ in range(50000)]
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        counts = dict()  # type: Dict[int, int]
+        for value in sorted(values):
+            key = int(value * 1000)
+            counts[key] = counts.get(key, 0) + 1
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def find_regressions(metrics: Dict[str, float], baseline: Dict[str, float],
+        tolerance: float) -> List[str]:
+    """ Compare metrics against a baseline. Timed metrics are first scaled by
+    how much slower calibrate() ran than when the baseline was measured.
+    :tolerance: allowed relative slowdown, e.g. 0.2 for 20%
+    :returns: one message per regressed metric """
+    slowdown = 1.0
+    if baseline.get('calibration_secs', 0) > 0 and metrics.get('calibration_secs', 0) > 0:
+        slowdown = metrics['calibration_secs'] / baseline['calibration_secs']
+    regressions = []
+    for name, higher_is_better in sorted(METRIC_DIRECTIONS.items()):
+        if name not in baseline or name not in metrics or baseline[name] <= 0:
+            continue
+        value = metrics[name]
+        if name in TIMED_METRICS:
+            value = value * slowdown if higher_is_better else value / slowdown
+        ratio = value / baseline[name]
+        if (higher_is_better and ratio < 1.0 - tolerance) or \
+                (not higher_is_better and ratio > 1.0 + tolerance):
+            regressions.append('{}: {:.4g} vs baseline {:.4g} ({:+.1f}% at baseline machine speed)'.format(
+                name, metrics[name], baseline[name], (ratio - 1.0) * 100))
+    return regressions
+
+
+if __name__ == "__main__":
+    """ Benchmark NovaFilter on a synthetic trace and check for regressions. """
+    CLI = argparse.ArgumentParser(description='NovaFilter benchmark suite')
+    CLI.add_argument('--pods', type=int, default=2)
+    CLI.add_argument('--racks', type=int, default=10, help='racks per pod')
+    CLI.add_argument('--servers', type=int, default=50, help='servers per rack')
+    CLI.add_argument('-n', '--events', type=int, default=50000,
+        help='number of create and delete events')
+    CLI.add_argument('--creates-per-tick', type=float, default=20.0)
+    CLI.add_argument('--lifetime', type=Lifetime, default=Lifetime('exp:100'))
+    CLI.add_argument('-s', '--seed', type=int, default=0)
+    CLI.add_argument('--cluster', choices=['plain', 'index', 'topology', 'vectorized', 'sharded'],
+        default='plain', help='plain: linear filters, index: --capacity-index, '
+        'topology: --topology-index, vectorized: --vectorized, sharded: --shards')
+    CLI.add_argument('--shards', type=int, default=0, help='shard processes of --cluster sharded')
+    CLI.add_argument('--weigher', choices=['random'] + sorted(WEIGHERS), default='random')
+    CLI.add_argument('--flavors', type=parse_flavors, default=DEFAULT_FLAVORS,
+        help='VM flavors as cores:ram_in_gb:weight,...')
+    CLI.add_argument('--host-subset-size', type=int, default=0)
+    CLI.add_argument('--filter-cache', type=int, default=0, metavar='FLAVORS',
+        help='cache the feasible servers of up to FLAVORS request shapes')
+    CLI.add_argument('-b', '--baseline', default=None,
+        help='Path to a baseline JSON file to compare against')
+    CLI.add_argument('--save-baseline', action='store_true', default=False,
+        help='write the measured metrics to the --baseline file instead of comparing')
+    CLI.add_argument('--tolerance', type=float, default=0.25,
+        help='allowed relative regression of each metric')
+    ARGS = CLI.parse_args()
+    glog.setLevel('WARNING')
+    if (ARGS.cluster == 'sharded') != (ARGS.shards > 0):
+        glog.error('ERROR: --cluster sharded requires a positive --shards, other clusters none.')
+        sys.exit(1)
+    if ARGS.filter_cache and ARGS.host_subset_size:
+        glog.error('ERROR: --filter-cache cannot be combined with --host-subset-size.')
+        sys.exit(1)
+    if ARGS.filter_cache and ARGS.weigher != 'random':
+        glog.error('ERROR: --filter-cache cannot be combined with --weigher {}.'.format(ARGS.weigher))
+        sys.exit(1)
+
+    random.seed(ARGS.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        topology_path = os.path.join(tmp_dir, 'topology.pn.json')
+        workload_path = os.path.join(tmp_dir, 'workload.json')
+        with open(topology_path, 'w') as ff:
+            write_topology(ff, ARGS.pods, ARGS.racks, ARGS.servers, DEFAULT_SERVER_TYPES,
+                ARGS.seed)
+        with open(workload_path, 'w') as ff:
+            write_workload(ff, ARGS.events, ARGS.creates_per_tick, ARGS.flavors,
+                ARGS.lifetime, ARGS.seed)
+        metrics = run_benchmark(topology_path, workload_path, ARGS.cluster, ARGS.weigher,
+            os.path.join(tmp_dir, 'allocs.json'), ARGS.host_subset_size, ARGS.filter_cache,
+            ARGS.shards)
+    metrics['calibration_secs'] = calibrate()
+
+    for name in sorted(metrics):
+        print('{:28s} {:.4g}'.format(name, metrics[name]))
+
+    config = {name: getattr(ARGS, name) for name in
+        ('pods', 'racks', 'servers', 'events', 'creates_per_tick', 'seed', 'cluster', 'weigher',
+        'host_subset_size', 'filter_cache')}
+    if ARGS.cluster == 'sharded':
+        config['shards'] = ARGS.shards
+    if ARGS.baseline and ARGS.save_baseline:
+        with open(ARGS.baseline, 'w') as ff:
+            json.dump({'config': config, 'machine': machine(), 'metrics': metrics}, ff,
+                indent=4, sort_keys=True)
+            ff.write('\n')
+        print('saved baseline to {}'.format(ARGS.baseline))
+    elif ARGS.baseline:
+        with open(ARGS.baseline) as ff:
+            baseline = json.load(ff)
+        if baseline['config'] != config:
+            print('WARNING baseline was measured with {}'.format(baseline['config']))
+        if baseline.get('machine') != machine():
+            print('WARNING baseline was measured on {}'.format(baseline.get('machine')))
+        regressions = find_regressions(metrics, baseline['metrics'], ARGS.tolerance)
+        for message in regressions:
+            print('REGRESSION {}'.format(message))
+        if regressions:
+            sys.exit(1)
+        print('no regressions against {}'.format(ARGS.baseline))
@@ -0,0 +1,94 @@
+import argparse
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+from schedulers.lib.synthetic import (DEFAULT_FLAVORS, DEFAULT_SERVER_TYPES, Lifetime,
+    write_topology, write_workload)
+
+RUN_SCHEDULERS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    'run_schedulers.py')
+FIRST_PLACEMENT_RE = re.compile(r'time to first placement: ([0-9.]+) ms')
+
+
+def time_run(args: List[str]) -> Tuple[float, float]:
+    """ Run run_schedulers.py with the given arguments.
+    :returns: (time to first placement reported by the run, wall time of the
+    whole process), both in milliseconds """
+    start_time = time.perf_counter()
+    proc = subprocess.run([sys.executable, RUN_SCHEDULERS] + args, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, universal_newlines=True)
+    wall_ms = (time.perf_counter() - start_time) * 1000
+    match = FIRST_PLACEMENT_RE.search(proc.stderr)
+    if proc.returncode != 0 or match is None:
+        sys.stderr.write(proc.stderr)
+        print('ERROR run_schedulers.py {} failed'.format(' '.join(args)))
+        sys.exit(1)
+    return float(match.group(1)), wall_ms
+
+
+def interpreter_ms(runs: int) -> float:
+    """ Median wall time of starting and exiting an empty interpreter. """
+    walls = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'])
+        walls.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(walls)
+
+
+if __name__ == "__main__":
+    """ Measure how long run_schedulers.py takes to place its first VM, with
+    and without the input cache. """
+    CLI = argparse.ArgumentParser(description='NovaFilter startup benchmark')
+    CLI.add_argument('--pods', type=int, default=4)
+    CLI.add_argument('--racks', type=int, default=50, help='racks per pod')
+    CLI.add_argument('--servers', type=int, default=50, help='servers per rack')
+    CLI.add_argument('-n', '--events', type=int, default=200000,
+        help='number of create and delete events')
+    CLI.add_argument('--creates-per-tick', type=float, default=40.0)
+    CLI.add_argument('-s', '--seed', type=int, default=0)
+    CLI.add_argument('-r', '--runs', type=int, default=5, help='runs per mode')
+    CLI.add_argument('--target', type=float, default=100.0,
+        help='milliseconds to the first placement that cached runs must stay under')
+    ARGS = CLI.parse_args()
+
+    random.seed(ARGS.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        topology_path = os.path.join(tmp_dir, 'topology.pn.json')
+        workload_path = os.path.join(tmp_dir, 'workload.json')
+        with open(topology_path, 'w') as ff:
+            write_topology(ff, ARGS.pods, ARGS.racks, ARGS.servers, DEFAULT_SERVER_TYPES,
+                ARGS.seed)
+        with open(workload_path, 'w') as ff:
+            write_workload(ff, ARGS.events, ARGS.creates_per_tick, DEFAULT_FLAVORS,
+                Lifetime('exp:100'), ARGS.seed)
+        args = ['-nf', '-p', topology_path, '-w', workload_path, '-s', str(ARGS.seed),
+            '--ticks', '1', '-o', os.path.join(tmp_dir, 'allocs.json'),
+            '--input-cache', os.path.join(tmp_dir, 'cache')]
+
+        results = [('uncached', [time_run(args + ['--no-input-cache'])
+            for _ in range(ARGS.runs)])]
+        # the first run writes the cache, the others read it
+        results.append(('cache write', [time_run(args)]))
+        results.append(('cached', [time_run(args) for _ in range(ARGS.runs)]))
+
+    print('{:12s} {:>22s} {:>14s}'.format('inputs', 'first placement ms', 'process ms'))
+    for mode, timings in results:
+        print('{:12s} {:22.1f} {:14.1f}'.format(mode,
+            statistics.median(first for first, _ in timings),
+            statistics.median(wall for _, wall in timings)))
+    print('{:12s} {:>22s} {:14.1f}'.format('interpreter', '-', interpreter_ms(ARGS.runs)))
+
+    cached_ms = statistics.median(first for first, _ in results[-1][1])
+    if cached_ms > ARGS.target:
+        print('REGRESSION time to first placement with cached inputs: {:.1f} ms, '
+            'target {:.1f} ms'.format(cached_ms, ARGS.target))
+        sys.exit(1)
+    print('time to first placement with cached inputs is under {:.1f} ms'.format(ARGS.target))
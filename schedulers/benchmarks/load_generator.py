@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import glog
+import json
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import schedulers.constants as const
+from schedulers.lib.misc import percentile
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.service import (ERROR_STR, ID_STR, STATS_REQUEST_STR, encode_message)
+
+
+def load_requests(workload_path: str) -> List[Dict]:
+    """ Flatten a workload into the create/delete requests of the service
+    protocol, in replay order. """
+    if workload_path.endswith(const.COLUMNAR_SUFFIX):
+        from schedulers.lib.columnar import ColumnarWorkloadReplayer
+        replayer = ColumnarWorkloadReplayer()
+    else:
+        replayer = WorkloadReplayer()
+    replayer.load_workload(workload_path)
+    requests = []
+    events = replayer.replay()
+    while len(events) > 0:
+        for req in events:
+            msg = {ID_STR: len(requests), const.TYPE_STR: req.type,
+                const.VDC_UUID_STR: req.vdc_uuid, const.VM_UUID_STR: req.vm_uuid}
+            if req.type == const.VM_CREATE_STR:
+                msg[const.CORES_STR] = req.cores
+                msg[const.RAM_STR] = req.ram
+            requests.append(msg)
+        events = replayer.replay()
+    return requests
+
+
+class Connection(object):
+    """ One client connection. Requests are pipelined; responses arrive in
+    request order and are matched by id. """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+            inflight: asyncio.Semaphore, results: 'LoadResults'):
+        self.reader = reader
+        self.writer = writer
+        self.inflight = inflight
+        self.results = results
+        self.sent = dict()  # type: Dict[int, Tuple[float, bool]]
+        self.n_sent = 0
+        self.n_received = 0
+        self.all_sent = False
+        self.done = asyncio.Event()
+
+    async def send(self, msg: Dict, intended_time: float) -> None:
+        self.sent[msg[ID_STR]] = (intended_time, msg[const.TYPE_STR] == const.VM_CREATE_STR)
+        self.n_sent += 1
+        self.writer.write(encode_message(msg))
+        await self.writer.drain()
+
+    async def read_responses(self) -> None:
+        perf_counter = time.perf_counter
+        while not (self.all_sent and self.n_received == self.n_sent):
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            self.n_received += 1
+            self.inflight.release()
+            intended_time, is_create = self.sent.pop(response[ID_STR])
+            self.results.record(response, perf_counter() - intended_time, is_create)
+        self.done.set()
+
+
+class LoadResults(object):
+
+    def __init__(self):
+        self.latencies = []  # type: List[float]
+        self.failed_vms = 0
+        self.errors = 0
+
+    def record(self, response: Dict, latency_secs: float, is_create: bool) -> None:
+        self.latencies.append(latency_secs * 10**6)
+        if ERROR_STR in response:
+            self.errors += 1
+        elif is_create and response.get(const.SERVER_STR) == const.FAILED_STR:
+            self.failed_vms += 1
+
+
+async def open_connection(host: str, port: int, path: str):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def generate_load(requests: List[Dict], host: str, port: int, path: str, rate: float,
+        n_connections: int, max_inflight: int) -> Dict:
+    """ Send the requests over n_connections connections.
+    With a positive rate, requests are sent open-loop at that many requests
+    per second, and latency is measured from the time a request was due, so
+    time spent waiting behind a slow service is counted. With rate 0,
+    requests are sent as fast as max_inflight outstanding requests allow.
+    All requests of a VM go over the same connection, so its delete is never
+    handled before its create.
+    :returns: throughput and latency report """
+    inflight = asyncio.Semaphore(max_inflight)
+    results = LoadResults()
+    connections = []
+    for _ in range(n_connections):
+        reader, writer = await open_connection(host, port, path)
+        connections.append(Connection(reader, writer, inflight, results))
+    readers = [asyncio.ensure_future(conn.read_responses()) for conn in connections]
+
+    perf_counter = time.perf_counter
+    start_time = perf_counter()
+    for i, msg in enumerate(requests):
+        if rate > 0:
+            intended_time = start_time + i / rate
+            delay = intended_time - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await inflight.acquire()
+        if rate <= 0:
+            intended_time = perf_counter()
+        conn = connections[hash(msg[const.VM_UUID_STR]) % n_connections]
+        await conn.send(msg, intended_time)
+    for conn in connections:
+        conn.all_sent = True
+        if conn.n_received == conn.n_sent:
+            conn.done.set()
+    await asyncio.wait([asyncio.ensure_future(conn.done.wait()) for conn in connections])
+    wall_secs = perf_counter() - start_time
+    for task in readers:
+        task.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+
+    # ask the service for its own view of the run
+    conn = connections[0]
+    conn.writer.write(encode_message({ID_STR: -1, const.TYPE_STR: STATS_REQUEST_STR}))
+    service_stats = json.loads(await conn.reader.readline()).get(STATS_REQUEST_STR)
+    for conn in connections:
+        conn.writer.close()
+
+    latencies = sorted(results.latencies)
+    return {'requests': len(requests), 'responses': len(latencies), 'errors': results.errors,
+        const.FAIL_VM_STR: results.failed_vms, 'wall_secs': wall_secs,
+        'requests_per_sec': len(latencies) / wall_secs if wall_secs > 0 else 0.0,
+        'p50_microsec': percentile(latencies, 50), 'p99_microsec': percentile(latencies, 99),
+        'p999_microsec': percentile(latencies, 99.9),
+        'max_microsec': latencies[-1] if latencies else 0.0,
+        'service': service_stats}
+
+
+if __name__ == "__main__":
+    """ Replay a workload against a running serve_scheduler.py and report
+    throughput and tail latency. """
+    CLI = argparse.ArgumentParser(description='Load generator for the NovaFilter service')
+
+    CLI.add_argument(
+        '-w',
+        '--workload',
+        default='./input/workload_sample.json',
+        help='Path to workload JSON file, or columnar .nfc file')
+
+    CLI.add_argument('--host', default='127.0.0.1')
+    CLI.add_argument('--port', type=int, default=8775)
+
+    CLI.add_argument(
+        '--socket',
+        default=None,
+        help='Path to the Unix socket of the service, instead of TCP')
+
+    CLI.add_argument(
+        '-r',
+        '--rate',
+        type=float,
+        default=0.0,
+        help='requests per second, or 0 to send as fast as possible')
+
+    CLI.add_argument(
+        '-c',
+        '--connections',
+        type=int,
+        default=8,
+        help='number of concurrent client connections')
+
+    CLI.add_argument(
+        '--max-inflight',
+        type=int,
+        default=1024,
+        help='maximum number of requests awaiting a response')
+
+    CLI.add_argument(
+        '-o',
+        '--output',
+        default=None,
+        help='Path to write the report to as JSON')
+
+    ARGS = CLI.parse_args()
+
+    requests = load_requests(ARGS.workload)
+    glog.info('sending {} requests'.format(len(requests)))
+    try:
+        report = asyncio.run(generate_load(requests, ARGS.host, ARGS.port, ARGS.socket,
+            ARGS.rate, ARGS.connections, ARGS.max_inflight))
+    except ConnectionError as e:
+        glog.error('ERROR: cannot reach the service: {}'.format(e))
+        sys.exit(1)
+
+    for name in sorted(report):
+        if name != 'service':
+            print('{:20s} {:.6g}'.format(name, report[name]))
+    print('service {}'.format(json.dumps(report['service'])))
+    if ARGS.output:
+        with open(ARGS.output, 'w') as ff:
+            json.dump(report, ff, indent=4, sort_keys=True)
@@ -0,0 +1,62 @@
+import argparse
+import gc
+import os
+import random
+import tempfile
+import tracemalloc
+
+from schedulers.lib.domain import Cluster
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.synthetic import DEFAULT_FLAVORS, Lifetime, write_topology, write_workload
+from schedulers.novafilter import NovaFilter
+
+
+def traced_bytes() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+if __name__ == "__main__":
+    """ Measure memory held per workload event by the replayer and by the
+    scheduler state (allocation records and working set). """
+    CLI = argparse.ArgumentParser(description='Memory per event benchmark')
+    CLI.add_argument('-n', '--events', type=int, default=500000,
+        help='number of events in the synthetic trace')
+    CLI.add_argument('--servers', type=int, default=100,
+        help='number of servers in the synthetic topology')
+    CLI.add_argument('-s', '--seed', type=int, default=0)
+    ARGS = CLI.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        workload_path = os.path.join(tmp_dir, 'workload.json')
+        topology_path = os.path.join(tmp_dir, 'topology.pn.json')
+        # long lifetimes, so that the working set keeps growing
+        with open(workload_path, 'w') as ff:
+            write_workload(ff, ARGS.events, 100.0, DEFAULT_FLAVORS, Lifetime('exp:2000'), ARGS.seed)
+        # servers large enough that every VM fits
+        with open(topology_path, 'w') as ff:
+            write_topology(ff, 1, 1, ARGS.servers, [(10.0**6, 10.0**7, 1.0)], ARGS.seed)
+
+        random.seed(ARGS.seed)
+        cluster = Cluster()
+        cluster.load(topology_path)
+        scheduler = NovaFilter(cluster, False)
+
+        tracemalloc.start()
+        start = traced_bytes()
+        replayer = WorkloadReplayer()
+        replayer.load_workload(workload_path)
+        loaded = traced_bytes()
+
+        events = replayer.replay()
+        while len(events) > 0:
+            scheduler.schedule(events)
+            events = replayer.replay()
+        scheduled = traced_bytes()
+        tracemalloc.stop()
+
+    print('events:                    {}'.format(ARGS.events))
+    print('VMs in working set:        {}'.format(len(scheduler.working_set_vms)))
+    print('workload bytes/event:      {:.1f}'.format((loaded - start) / ARGS.events))
+    print('scheduler bytes/event:     {:.1f}'.format((scheduled - loaded) / ARGS.events))
+    print('total bytes/event:         {:.1f}'.format((scheduled - start) / ARGS.events))
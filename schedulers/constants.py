@@ -34,6 +34,9 @@ RACK_STR = 'rack'
 POD_STR = 'pod'
 CLUSTER_STR = 'cluster'
 
+# suffix of memory-mappable columnar topology and workload files
+COLUMNAR_SUFFIX = '.nfc'
+
 # example: {'type': 'create', 'vdc_uuid': dep_id, 'vm_uuid': vm_id,
 # 'cores': 4, 'ram_in_gb': 8}
 EVENT_TYPE = Dict[str, Union[str, float]]
@@ -0,0 +1,52 @@
+import argparse
+import glog
+import sys
+
+from schedulers.lib.replay import write_json_lines
+
+
+if __name__ == "__main__":
+    """ Convert workload and topology files into formats that load faster. """
+    CLI = argparse.ArgumentParser(
+        description='Convert a workload or physical network JSON file into another format')
+    group = CLI.add_mutually_exclusive_group(required=True)
+
+    group.add_argument(
+        '-w',
+        '--workload',
+        help='Path to workload JSON file')
+
+    group.add_argument(
+        '-p',
+        '--physical-network',
+        help='Path to physical network JSON file. Only columnar output is supported')
+
+    CLI.add_argument(
+        '-f',
+        '--format',
+        choices=['jsonl', 'columnar'],
+        default='jsonl',
+        help='jsonl: one tick per line, for --stream-workload. columnar: '
+        'memory-mappable binary file, loaded when the file name ends with .nfc')
+
+    CLI.add_argument(
+        '-o',
+        '--output',
+        required=True,
+        help='Path to converted file')
+
+    ARGS = CLI.parse_args()
+    if ARGS.format == 'columnar':
+        from schedulers.lib.columnar import write_topology, write_workload
+        if ARGS.physical_network:
+            n_servers = write_topology(ARGS.physical_network, ARGS.output)
+            glog.info('wrote {} servers to {}'.format(n_servers, ARGS.output))
+        else:
+            n_events = write_workload(ARGS.workload, ARGS.output)
+            glog.info('wrote {} events to {}'.format(n_events, ARGS.output))
+    elif ARGS.physical_network:
+        glog.error('ERROR: physical network can only be converted to columnar format.')
+        sys.exit(1)
+    else:
+        n_ticks = write_json_lines(ARGS.workload, ARGS.output)
+        glog.info('wrote {} ticks to {}'.format(n_ticks, ARGS.output))
@@ -0,0 +1,71 @@
+import argparse
+import glog
+
+from schedulers.lib.synthetic import (DEFAULT_FLAVORS, DEFAULT_SERVER_TYPES, Lifetime,
+    parse_flavors, write_topology, write_workload)
+
+
+if __name__ == "__main__":
+    """ Generate synthetic topologies and workloads of configurable size. """
+    CLI = argparse.ArgumentParser(
+        description='Generate a synthetic physical network and/or workload')
+
+    CLI.add_argument(
+        '-p',
+        '--physical-network',
+        help='Path to write the physical network JSON file to')
+
+    CLI.add_argument('--pods', type=int, default=2)
+    CLI.add_argument('--racks', type=int, default=10, help='racks per pod')
+    CLI.add_argument('--servers', type=int, default=50, help='servers per rack')
+
+    CLI.add_argument(
+        '--server-types',
+        type=parse_flavors,
+        default=DEFAULT_SERVER_TYPES,
+        help='server capacities as cores:ram_in_gb:weight,... (default: 32:256:1)')
+
+    CLI.add_argument(
+        '-w',
+        '--workload',
+        help='Path to write the workload JSON file to')
+
+    CLI.add_argument('-n', '--events', type=int, default=100000,
+        help='number of create and delete events')
+
+    CLI.add_argument('--creates-per-tick', type=float, default=20.0,
+        help='mean number of VMs created per tick')
+
+    CLI.add_argument(
+        '--flavors',
+        type=parse_flavors,
+        default=DEFAULT_FLAVORS,
+        help='VM flavors as cores:ram_in_gb:weight,... '
+        '(default: 1:0.5:1,1:2:3,2:4:3,4:8:2,8:16:1)')
+
+    CLI.add_argument(
+        '--lifetime',
+        type=Lifetime,
+        default=Lifetime('exp:100'),
+        help='VM lifetime in ticks: exp:MEAN, uniform:LOW:HIGH, fixed:N or forever '
+        '(default: exp:100)')
+
+    CLI.add_argument('-s', '--seed', type=int, default=0)
+
+    ARGS = CLI.parse_args()
+    if not ARGS.physical_network and not ARGS.workload:
+        CLI.error('at least one of --physical-network and --workload is required')
+    if ARGS.creates_per_tick <= 0:
+        CLI.error('--creates-per-tick must be positive')
+
+    if ARGS.physical_network:
+        with open(ARGS.physical_network, 'w') as ff:
+            n_servers = write_topology(ff, ARGS.pods, ARGS.racks, ARGS.servers,
+                ARGS.server_types, ARGS.seed)
+        glog.info('wrote {} servers to {}'.format(n_servers, ARGS.physical_network))
+
+    if ARGS.workload:
+        with open(ARGS.workload, 'w') as ff:
+            n_ticks = write_workload(ff, ARGS.events, ARGS.creates_per_tick, ARGS.flavors,
+                ARGS.lifetime, ARGS.seed)
+        glog.info('wrote {} events in {} ticks to {}'.format(ARGS.events, n_ticks, ARGS.workload))
@@ -0,0 +1,163 @@
+import glog
+import json
+import sys
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+from schedulers.lib.domain import BaseServer, Cluster
+
+
+class ArrayCluster(Cluster):
+    """ Cluster whose capacities and remaining resources live in contiguous
+    NumPy arrays (one slot per server, in load order). Servers are thin views
+    over an array position, so the CPU and RAM filters can be evaluated for
+    the whole cluster with a single boolean mask. """
+
+    vectorized = True
+
+    def __init__(self):
+        super().__init__()
+        self.cores = np.zeros(0)
+        self.ram = np.zeros(0)
+        self.cores_remaining = np.zeros(0)
+        self.ram_remaining = np.zeros(0)
+        self._views = []  # type: List[ArrayServer]
+
+    def load_by_json(self, json_fname: str) -> None:
+        """ Loads datacenter topology into contiguous capacity arrays.
+        :json_fname: name of the file containing datacenter description """
+        data = None
+        with open(json_fname) as ff:
+            data = json.load(ff)
+        assert(data)
+        self.load_servers(data["Servers"])
+
+    def load_servers(self, f_servers: Dict[str, List]) -> None:
+        """ Loads servers from the parsed "Servers" section of a topology file.
+        :f_servers: {server_id: [cores, ram], ...} """
+        n_servers = len(f_servers)
+        self.cores = np.empty(n_servers, dtype=np.float64)
+        self.ram = np.empty(n_servers, dtype=np.float64)
+        ids = []
+        for pos, (server_id, props) in enumerate(f_servers.items()):
+            ids.append(server_id)
+            self.cores[pos] = props[0]
+            self.ram[pos] = props[1]
+        self._init_views(ids)
+
+    def load_by_columnar(self, fname: str) -> None:
+        """ Maps capacity arrays straight from a columnar topology file. They
+        are copy-on-write views, so the file itself is never modified.
+        :fname: name of the columnar topology file """
+        from schedulers.lib.columnar import open_topology
+        cf = open_topology(fname)
+        self.cores = cf.array('cores')
+        self.ram = cf.array('ram')
+        ids = cf.strings('ids')
+        self._init_views([ids[pos] for pos in range(len(ids))])
+
+    def _init_views(self, ids: List[str]) -> None:
+        self.cores_remaining = self.cores.copy()
+        self.ram_remaining = self.ram.copy()
+
+        self.servers = OrderedDict()
+        self._views = []
+        for pos, server_id in enumerate(ids):
+            view = ArrayServer(self, pos, server_id)
+            self.servers[server_id] = view
+            self._views.append(view)
+
+    def start_shards(self, n_shards: int) -> 'ShardRouter':
+        """ Move the remaining capacities into shared memory and start
+        n_shards processes evaluating the filters over them, see lib.sharding.
+        :return: the router of the shards """
+        if sys.version_info < (3, 8):
+            glog.error('ERROR: shards need multiprocessing.shared_memory, which requires '
+                'Python 3.8 or newer. Exit.')
+            sys.exit(1)
+        from schedulers.lib.sharding import ShardRouter
+        self.shard_router = ShardRouter(self, n_shards)
+        return self.shard_router
+
+    def cpu_mask(self, cores=0) -> np.ndarray:
+        """ Boolean mask of servers with sufficient remaining cores. """
+        return self.cores_remaining >= cores
+
+    def ram_mask(self, ram=0.0) -> np.ndarray:
+        """ Boolean mask of servers with sufficient remaining RAM. """
+        return self.ram_remaining >= ram
+
+    def select(self, mask: np.ndarray) -> 'ServerSequence':
+        """ Servers selected by the mask, in cluster order. """
+        return ServerSequence(self._views, np.flatnonzero(mask))
+
+
+class ServerSequence(object):
+    """ Read-only sequence of servers backed by an array of positions.
+    Avoids materializing a Python list when only one server is picked. """
+
+    def __init__(self, views: List['ArrayServer'], positions: np.ndarray):
+        self._views = views
+        self._positions = positions
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, i) -> 'ArrayServer':
+        return self._views[self._positions[i]]
+
+    def __iter__(self):
+        views = self._views
+        return (views[pos] for pos in self._positions)
+
+    def __contains__(self, item) -> bool:
+        if not isinstance(item, ArrayServer) or item._cluster._views is not self._views:
+            return False
+        pos = np.searchsorted(self._positions, item._pos)
+        return pos < len(self._positions) and self._positions[pos] == item._pos
+
+
+class ArrayServer(BaseServer):
+    """ Server view over one position of an ArrayCluster's arrays. It has
+    no storage of its own besides the position, the id and the observers. """
+    __slots__ = ('_cluster', '_pos', 'id', '_observers')
+
+    def __init__(self, cluster: ArrayCluster, pos: int, id):
+        self._cluster = cluster
+        self._pos = pos
+        self.id = id
+        self._observers = ()
+
+    @property
+    def cores(self):
+        return float(self._cluster.cores[self._pos])
+
+    @cores.setter
+    def cores(self, value):
+        self._cluster.cores[self._pos] = value
+
+    @property
+    def ram(self):
+        return float(self._cluster.ram[self._pos])
+
+    @ram.setter
+    def ram(self, value):
+        self._cluster.ram[self._pos] = value
+
+    @property
+    def _cores_remaining(self):
+        return float(self._cluster.cores_remaining[self._pos])
+
+    @_cores_remaining.setter
+    def _cores_remaining(self, value):
+        self._cluster.cores_remaining[self._pos] = value
+
+    @property
+    def _ram_remaining(self):
+        return float(self._cluster.ram_remaining[self._pos])
+
+    @_ram_remaining.setter
+    def _ram_remaining(self, value):
+        self._cluster.ram_remaining[self._pos] = value
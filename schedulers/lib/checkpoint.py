@@ -0,0 +1,153 @@
+import glog
+import os
+import random
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from schedulers.lib.columnar import ColumnarFile, string_arrays, write_columnar
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.weighers import WEIGHERS, make_weigher_policy
+
+# Checkpoints are columnar files (see lib.columnar) of this kind. Remaining
+# resources and the working set are stored as arrays; the replay position,
+# failure stats and RNG state as header metadata.
+KIND_CHECKPOINT = 'checkpoint'
+
+# what-if settings and the type of their values
+WHAT_IF_SETTINGS = {'weigher': str, 'cpu_mult': float, 'ram_mult': float, 'seed': int,
+    'capacity': float}
+WHAT_IF_WEIGHERS = ['random'] + sorted(WEIGHERS)
+
+
+def save_checkpoint(path: str, scheduler, replayer: WorkloadReplayer) -> None:
+    """ Snapshot the scheduler, its cluster and the replay position.
+    Allocations already recorded are not part of the snapshot. """
+    servers = scheduler.servers
+    vm_uuids, server_pos, cores, ram = scheduler.working_set_vms.export()
+    arrays = OrderedDict()
+    arrays['cores_remaining'] = np.array([s._cores_remaining for s in servers], dtype=np.float64)
+    arrays['ram_remaining'] = np.array([s._ram_remaining for s in servers], dtype=np.float64)
+    arrays['vm_server'] = np.frombuffer(server_pos, dtype=np.dtype('l')).astype(np.int64)
+    arrays['vm_cores'] = np.frombuffer(cores, dtype=np.float64)
+    arrays['vm_ram'] = np.frombuffer(ram, dtype=np.float64)
+    arrays.update(string_arrays('vm_uuids', vm_uuids))
+    version, internal_state, gauss_next = random.getstate()
+    meta = {'tick': replayer.currTick, 'n_servers': len(servers),
+        'failure_stats': scheduler.failure_stats,
+        'rng_state': [version, list(internal_state), gauss_next]}
+    write_columnar(path, KIND_CHECKPOINT, arrays, meta)
+
+
+def load_checkpoint(path: str, scheduler, replayer: WorkloadReplayer) -> None:
+    """ Restore a snapshot into a scheduler built over the same topology, and
+    move the replayer, loaded with the same workload, to the saved tick. """
+    cf = ColumnarFile(path)
+    if cf.kind != KIND_CHECKPOINT:
+        glog.error('ERROR: {} holds a {}, not a checkpoint. Exit.'.format(path, cf.kind))
+        sys.exit(1)
+    servers = scheduler.servers
+    if cf.meta['n_servers'] != len(servers):
+        glog.error('ERROR: checkpoint {} has {} servers, the topology has {}. Exit.'.format(
+            path, cf.meta['n_servers'], len(servers)))
+        sys.exit(1)
+
+    for server, cores, ram in zip(servers, cf.array('cores_remaining').tolist(),
+            cf.array('ram_remaining').tolist()):
+        server.set_remaining(cores, ram)
+    uuids = cf.strings('vm_uuids')
+    scheduler.working_set_vms.restore([uuids[i] for i in range(len(uuids))],
+        cf.array('vm_server').astype(np.dtype('l')).tobytes(),
+        cf.array('vm_cores').tobytes(), cf.array('vm_ram').tobytes())
+    scheduler.failure_stats.update(cf.meta['failure_stats'])
+    version, internal_state, gauss_next = cf.meta['rng_state']
+    random.setstate((version, tuple(internal_state), gauss_next))
+    replayer.seek(cf.meta['tick'])
+
+
+def parse_what_if(spec: str) -> Dict[str, str]:
+    """ Parse "name=value,name=value,..." describing one what-if continuation.
+    Names: weigher, cpu_mult, ram_mult, seed, capacity. The multipliers need
+    a weigher to apply to.
+    :raises ValueError: on unknown names or invalid values """
+    variant = dict()
+    for item in spec.split(','):
+        name, _, value = item.partition('=')
+        if name not in WHAT_IF_SETTINGS:
+            raise ValueError('unknown what-if setting: {}'.format(name))
+        if name == 'weigher':
+            if value not in WHAT_IF_WEIGHERS:
+                raise ValueError('unknown weigher {}, expected one of {}'.format(
+                    value, ', '.join(WHAT_IF_WEIGHERS)))
+        else:
+            try:
+                WHAT_IF_SETTINGS[name](value)
+            except ValueError:
+                raise ValueError('invalid {}: {}'.format(name, value))
+        variant[name] = value
+    if ('cpu_mult' in variant or 'ram_mult' in variant) and 'weigher' not in variant:
+        raise ValueError('cpu_mult and ram_mult require a weigher')
+    return variant
+
+
+def apply_what_if(scheduler, variant: Dict[str, str]) -> None:
+    """ Change the policy, RNG seed or server capacities of a running scheduler.
+    capacity scales every server's cores and RAM; resources in use stay in use. """
+    if 'weigher' in variant:
+        scheduler.set_weigher_policy(make_weigher_policy(variant['weigher'],
+            float(variant.get('cpu_mult', 1.0)), float(variant.get('ram_mult', 1.0))))
+    if 'seed' in variant:
+        random.seed(int(variant['seed']))
+    if 'capacity' in variant:
+        factor = float(variant['capacity'])
+        for server in scheduler.servers:
+            cores_used = server.cores - server._cores_remaining
+            ram_used = server.ram - server._ram_remaining
+            server.cores = server.cores * factor
+            server.ram = server.ram * factor
+            server.set_remaining(server.cores - cores_used, server.ram - ram_used)
+
+
+def fork_what_ifs(scheduler, variants: List[Dict[str, str]], run: Callable[[int], None],
+        processes: int = None) -> List[int]:
+    """ Branch one continuation per variant from the current in-memory state.
+    Each child is forked, so it shares the parent's memory copy-on-write,
+    applies its variant, and calls run(variant_index) to finish the replay.
+    No other thread may be running: children would inherit the locks it holds,
+    such as the logging lock, without the thread that releases them.
+    :processes: maximum number of children running at once
+    :returns: exit status of every child, in the order of variants """
+    if threading.active_count() > 1:
+        glog.error('ERROR: cannot fork what-if runs while {} threads are running. Exit.'.format(
+            threading.active_count()))
+        sys.exit(1)
+    processes = processes or os.cpu_count()
+    running = dict()  # type: Dict[int, int]
+    statuses = [0] * len(variants)
+    # the random module reseeds itself in forked children, so the state is
+    # handed over explicitly to keep continuations reproducible
+    rng_state = random.getstate()
+    for i, variant in enumerate(variants):
+        if len(running) >= processes:
+            pid, status = os.wait()
+            statuses[running.pop(pid)] = status
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                random.setstate(rng_state)
+                apply_what_if(scheduler, variant)
+                run(i)
+                status = 0
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(status)
+        running[pid] = i
+    while running:
+        pid, status = os.wait()
+        statuses[running.pop(pid)] = status
+    return statuses
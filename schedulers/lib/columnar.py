@@ -0,0 +1,210 @@
+import json
+import mmap
+import struct
+import sys
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+import schedulers.constants as const
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.workload import VMEvent
+
+# Columnar file layout:
+#   MAGIC | uint64 header length | JSON header | arrays, each 64-byte aligned
+# The header maps every array name to [dtype, byte offset, number of items].
+MAGIC = b'NFCOL\x00v1'
+ALIGNMENT = 64
+KIND_WORKLOAD = 'workload'
+KIND_TOPOLOGY = 'topology'
+
+# event type codes of the workload 'type' column
+EVENT_TYPES = [const.VM_CREATE_STR, const.VM_DELETE_STR, const.VM_UPDATE_STR]
+EVENT_TYPE_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+
+
+class StringTable(object):
+    """ Strings stored as one UTF-8 blob plus an offsets array.
+    String i is blob[offsets[i]:offsets[i + 1]]. """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return sys.intern(self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8'))
+
+    @staticmethod
+    def build(strings: List[str]) -> 'StringTable':
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return StringTable(data, offsets)
+
+
+class StringInterner(object):
+    """ Assigns consecutive ids to distinct strings. """
+
+    def __init__(self):
+        self.ids = dict()  # type: Dict[str, int]
+        self.strings = []  # type: List[str]
+
+    def intern(self, s: str) -> int:
+        sid = self.ids.get(s)
+        if sid is None:
+            sid = self.ids[s] = len(self.strings)
+            self.strings.append(s)
+        return sid
+
+
+def write_columnar(path: str, kind: str, arrays: Dict[str, np.ndarray],
+        meta: Dict = None) -> None:
+    """ Write named arrays into a columnar file.
+    :meta: small JSON-serializable values stored in the header """
+    header = {'kind': kind, 'arrays': OrderedDict(), 'meta': meta or {}}
+    offset = 0
+    for name, arr in arrays.items():
+        header['arrays'][name] = [arr.dtype.str, offset, len(arr)]
+        offset += -(-arr.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = len(MAGIC) + 8 + len(header_bytes)
+    data_start += -data_start % ALIGNMENT
+    with open(path, 'wb') as ff:
+        ff.write(MAGIC)
+        ff.write(struct.pack('<Q', len(header_bytes)))
+        ff.write(header_bytes)
+        ff.write(b'\0' * (data_start - ff.tell()))
+        for name, arr in arrays.items():
+            ff.write(np.ascontiguousarray(arr).tobytes())
+            ff.write(b'\0' * (-arr.nbytes % ALIGNMENT))
+
+
+class ColumnarFile(object):
+    """ Memory-mapped columnar file. Arrays are zero-copy views on a
+    copy-on-write mapping, so they can be modified without touching the file. """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as ff:
+            self._mmap = mmap.mmap(ff.fileno(), 0, access=mmap.ACCESS_COPY)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError('{} is not a columnar file'.format(path))
+        header_len, = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(self._mmap[header_start:header_start + header_len].decode('utf-8'))
+        self.kind = header['kind']
+        self.meta = header.get('meta', {})
+        self._arrays = header['arrays']
+        self._data_start = header_start + header_len
+        self._data_start += -self._data_start % ALIGNMENT
+
+    def array(self, name: str) -> np.ndarray:
+        dtype, offset, count = self._arrays[name]
+        return np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count,
+            offset=self._data_start + offset)
+
+    def strings(self, name: str) -> StringTable:
+        return StringTable(self.array(name + '_data'), self.array(name + '_offsets'))
+
+
+def string_arrays(name: str, strings: List[str]) -> Dict[str, np.ndarray]:
+    table = StringTable.build(strings)
+    return OrderedDict([(name + '_data', table.data), (name + '_offsets', table.offsets)])
+
+
+def write_workload(workload_path: str, output_path: str) -> int:
+    """ Convert a workload JSON file into a columnar file.
+    :returns: number of events written """
+    with open(workload_path) as ff:
+        workload = json.load(ff)
+    keys = [k for k in workload if k.startswith(WorkloadReplayer.WORKLOAD_TICK_PREFIX)]
+    keys.sort(key=WorkloadReplayer.tick_index)
+
+    interner = StringInterner()
+    tick_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    types, vdcs, vms, cores, ram = [], [], [], [], []
+    for i, tick_id in enumerate(keys):
+        for event in workload[tick_id]:
+            types.append(EVENT_TYPE_CODES[event['type']])
+            vdcs.append(interner.intern(event['vdc_uuid']))
+            vms.append(interner.intern(event['vm_uuid']))
+            cores.append(event.get('cores', 0))
+            ram.append(event.get('ram_in_gb', 0.0))
+        tick_offsets[i + 1] = len(types)
+
+    arrays = OrderedDict()
+    arrays['tick_offsets'] = tick_offsets
+    arrays['type'] = np.array(types, dtype=np.uint8)
+    arrays['vdc'] = np.array(vdcs, dtype=np.uint32)
+    arrays['vm'] = np.array(vms, dtype=np.uint32)
+    arrays['cores'] = np.array(cores, dtype=np.float64)
+    arrays['ram'] = np.array(ram, dtype=np.float64)
+    arrays.update(string_arrays('ticks', keys))
+    arrays.update(string_arrays('uuids', interner.strings))
+    write_columnar(output_path, KIND_WORKLOAD, arrays)
+    return len(types)
+
+
+def write_topology(json_fname: str, output_path: str) -> int:
+    """ Convert a datacenter topology JSON file into a columnar file.
+    :returns: number of servers written """
+    with open(json_fname) as ff:
+        f_servers = json.load(ff)["Servers"]
+    arrays = OrderedDict()
+    arrays['cores'] = np.array([props[0] for props in f_servers.values()], dtype=np.float64)
+    arrays['ram'] = np.array([props[1] for props in f_servers.values()], dtype=np.float64)
+    arrays.update(string_arrays('ids', list(f_servers.keys())))
+    write_columnar(output_path, KIND_TOPOLOGY, arrays)
+    return len(f_servers)
+
+
+def open_topology(path: str) -> ColumnarFile:
+    cf = ColumnarFile(path)
+    if cf.kind != KIND_TOPOLOGY:
+        raise ValueError('{} holds a {}, not a topology'.format(path, cf.kind))
+    return cf
+
+
+class ColumnarWorkloadReplayer(WorkloadReplayer):
+    """ WorkloadReplayer over a memory-mapped columnar workload file.
+    VMEvents are only built for the tick being replayed. """
+
+    def load_workload(self, workload_path):
+        """
+        Map columnar workload file into the replayer.
+
+        Parameters:
+        workload_path (string): path to columnar workload file
+        """
+        cf = ColumnarFile(workload_path)
+        if cf.kind != KIND_WORKLOAD:
+            raise ValueError('{} holds a {}, not a workload'.format(workload_path, cf.kind))
+        self._file = cf
+        self._tick_offsets = cf.array('tick_offsets')
+        self._type = cf.array('type')
+        self._vdc = cf.array('vdc')
+        self._vm = cf.array('vm')
+        self._cores = cf.array('cores')
+        self._ram = cf.array('ram')
+        self._uuids = cf.strings('uuids')
+        ticks = cf.strings('ticks')
+        self.keys = [ticks[i] for i in range(len(ticks))]
+
+    def replay(self):
+        """ Replay workload by ticks.
+        :returns: list of workloads within current tick """
+        if self.currTick >= len(self.keys):
+            return []
+        tick_id = self.keys[self.currTick]
+        start, end = self._tick_offsets[self.currTick], self._tick_offsets[self.currTick + 1]
+        self.currTick += 1
+        uuids = self._uuids
+        return [VMEvent(tick_id, EVENT_TYPES[t], uuids[vdc], uuids[vm], c, r)
+            for t, vdc, vm, c, r in zip(self._type[start:end].tolist(),
+                self._vdc[start:end].tolist(), self._vm[start:end].tolist(),
+                self._cores[start:end].tolist(), self._ram[start:end].tolist())]
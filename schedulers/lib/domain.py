@@ -1,19 +1,28 @@
 import sys
 import glog
 import json
+from bisect import bisect_left, insort
 from collections import OrderedDict
-from typing import Any
-import uuid as uuid_lib
+from typing import Any, Dict, List, Tuple
 
 import schedulers.constants as const
 
 
 class Cluster:
+    # True for clusters that evaluate filters over capacity arrays
+    vectorized = False
+
     def __init__(self):
         self.servers = OrderedDict()  # {server_name: server_object, ...}
+        self.capacity_index = None  # type: CapacityIndex
+        self.topology_index = None  # type: TopologyIndex
+        self.shard_router = None  # type: ShardRouter
 
     def load(self, arg: Any) -> None:
-        self.load_by_json(arg)
+        if str(arg).endswith(const.COLUMNAR_SUFFIX):
+            self.load_by_columnar(arg)
+        else:
+            self.load_by_json(arg)
 
     def load_by_json(self, json_fname: str) -> None:
         """ Loads datacenter topology into Cluster data structure.
@@ -24,20 +33,283 @@ class Cluster:
         assert(data)
 
         # parse servers
-        f_servers = data["Servers"]
+        self.load_servers(data["Servers"])
+
+    def load_servers(self, f_servers: Dict[str, List]) -> None:
+        """ Loads servers from the parsed "Servers" section of a topology file.
+        :f_servers: {server_id: [cores, ram], ...} """
         for server_id, props in f_servers.items():
             self.servers[server_id] = Server(
                 id=server_id, cores=props[0], ram=props[1])
 
+    def load_by_columnar(self, fname: str) -> None:
+        """ Loads datacenter topology from a memory-mapped columnar file
+        written by lib.columnar.write_topology.
+        :fname: name of the columnar topology file """
+        from schedulers.lib.columnar import open_topology
+        cf = open_topology(fname)
+        ids = cf.strings('ids')
+        for pos, (cores, ram) in enumerate(zip(cf.array('cores').tolist(), cf.array('ram').tolist())):
+            server_id = ids[pos]
+            self.servers[server_id] = Server(id=server_id, cores=cores, ram=ram)
 
-class Server(object):
-    def __init__(self, id, cores, ram):
-        self.id = id
-        self.cores = cores
-        self.ram = ram
+    def build_capacity_index(self) -> 'CapacityIndex':
+        """ Build a capacity index over the loaded servers. Servers keep the
+        index up to date on every allocate/free from then on.
+        :return: the newly built index """
+        self.capacity_index = CapacityIndex(list(self.servers.values()))
+        return self.capacity_index
 
-        self._cores_remaining = cores
-        self._ram_remaining = ram
+    def build_topology_index(self) -> 'TopologyIndex':
+        """ Build per-rack and per-pod capacity summaries over the loaded
+        servers. Servers keep them up to date on every allocate/free from then on.
+        :return: the newly built index """
+        self.topology_index = TopologyIndex(list(self.servers.values()))
+        return self.topology_index
+
+
+class CapacityIndex(object):
+    """ Index of servers bucketed by remaining cores.
+    Servers with at least N remaining cores are found by walking the buckets
+    from N upwards, so the cost depends on the number of core-feasible
+    servers rather than the cluster size. The largest remaining cores and RAM
+    are tracked so that requests fitting nowhere are rejected in O(1).
+    Candidates are returned in cluster order, i.e. in the same order the
+    linear filters would produce them. Each bucket keeps its server positions
+    sorted, so the buckets are merged rather than sorted.
+    RAM is not indexed beyond its maximum: the RAM filter still checks every
+    core-feasible candidate. """
+
+    def __init__(self, servers: List['Server']):
+        self._servers = servers
+        self._pos = dict()  # type: Dict[str, int]
+        # {remaining_cores: [server_position, ...], ...}, positions sorted
+        self._core_buckets = dict()  # type: Dict[float, List[int]]
+        self._core_keys = []  # type: List[float]
+        # {remaining_ram: number_of_servers, ...}
+        self._ram_counts = dict()  # type: Dict[float, int]
+        self._ram_keys = []  # type: List[float]
+
+        for pos, server in enumerate(servers):
+            self._pos[server.id] = pos
+            self._add_cores(pos, server._cores_remaining)
+            self._add_ram(server._ram_remaining)
+            server.add_observer(self)
+
+    def _add_cores(self, pos: int, cores) -> None:
+        bucket = self._core_buckets.get(cores)
+        if bucket is None:
+            bucket = self._core_buckets[cores] = []
+            insort(self._core_keys, cores)
+        insort(bucket, pos)
+
+    def _remove_cores(self, pos: int, cores) -> None:
+        bucket = self._core_buckets[cores]
+        del bucket[bisect_left(bucket, pos)]
+        if not bucket:
+            del self._core_buckets[cores]
+            del self._core_keys[bisect_left(self._core_keys, cores)]
+
+    def _add_ram(self, ram) -> None:
+        count = self._ram_counts.get(ram, 0)
+        if count == 0:
+            insort(self._ram_keys, ram)
+        self._ram_counts[ram] = count + 1
+
+    def _remove_ram(self, ram) -> None:
+        count = self._ram_counts[ram] - 1
+        if count == 0:
+            del self._ram_counts[ram]
+            del self._ram_keys[bisect_left(self._ram_keys, ram)]
+        else:
+            self._ram_counts[ram] = count
+
+    def update_cores(self, server: 'Server', old_cores) -> None:
+        """ Move the server to the bucket matching its remaining cores.
+        :server: server whose remaining cores changed
+        :old_cores: remaining cores before the change """
+        if old_cores == server._cores_remaining:
+            return
+        pos = self._pos[server.id]
+        self._remove_cores(pos, old_cores)
+        self._add_cores(pos, server._cores_remaining)
+
+    def update_ram(self, server: 'Server', old_ram) -> None:
+        """ Account for a change in the server's remaining RAM.
+        :server: server whose remaining RAM changed
+        :old_ram: remaining RAM before the change """
+        if old_ram == server._ram_remaining:
+            return
+        self._remove_ram(old_ram)
+        self._add_ram(server._ram_remaining)
+
+    def max_cores_remaining(self):
+        return self._core_keys[-1] if self._core_keys else 0
+
+    def max_ram_remaining(self):
+        return self._ram_keys[-1] if self._ram_keys else 0.0
+
+    def may_fit(self, cores=0, ram=0.0) -> bool:
+        """ O(1) check whether any single server could host the request.
+        A True answer does not guarantee that one server has both. """
+        return cores <= self.max_cores_remaining() and ram <= self.max_ram_remaining()
+
+    def cpu_candidates(self, cores=0) -> List['Server']:
+        """ Servers with at least the given number of remaining cores.
+        :cores: number of requested cores
+        :return: list of servers in cluster order """
+        keys = self._core_keys
+        start = bisect_left(keys, cores)
+        if start == len(keys):
+            return []
+        positions = []  # type: List[int]
+        for key in keys[start:]:
+            positions.extend(self._core_buckets[key])
+        if len(keys) - start > 1:
+            # one sorted run per bucket: timsort merges the b runs in O(k log b)
+            positions.sort()
+        servers = self._servers
+        return [servers[pos] for pos in positions]
+
+
+class CapacitySummary(object):
+    """ Largest and total remaining cores and RAM of a rack or a pod.
+    Values are indexed by resource: 0 for cores, 1 for RAM. """
+    __slots__ = ('name', 'members', 'parent', 'max_remaining', 'free')
+
+    def __init__(self, name: str, parent: 'CapacitySummary' = None):
+        self.name = name
+        self.members = []  # type: List[Any]  # server positions of a rack, racks of a pod
+        self.parent = parent
+        self.max_remaining = [0, 0.0]
+        self.free = [0, 0.0]
+
+    def may_fit(self, cores=0, ram=0.0) -> bool:
+        return self.max_remaining[0] - cores >= 0 and self.max_remaining[1] - ram >= 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'max_cores_remaining': self.max_remaining[0],
+            'max_ram_remaining': self.max_remaining[1],
+            'free_cores': self.free[0], 'free_ram': self.free[1]}
+
+
+class TopologyIndex(object):
+    """ Capacity summaries of every rack and pod, derived from server ids of
+    the form <pod>_<rack>_<server> (e.g. p0_r1_s2). Servers with other ids
+    share one unnamed rack.
+    The filters only visit servers of racks whose summary shows enough
+    remaining cores and RAM, in pods that do, so their cost depends on the
+    number of feasible racks rather than the cluster size. A summary's
+    maximum is recomputed from its members only when its largest member
+    shrinks. Candidates are returned in cluster order. """
+    RESOURCES = ('_cores_remaining', '_ram_remaining')
+
+    def __init__(self, servers: List['Server']):
+        self._servers = servers
+        self._pos = dict()  # type: Dict[str, int]
+        self._rack_of = []  # type: List[CapacitySummary]
+        self.pods = OrderedDict()  # type: Dict[str, CapacitySummary]
+        racks = dict()  # type: Dict[Tuple[str, str], CapacitySummary]
+
+        for pos, server in enumerate(servers):
+            pod_name, rack_name = TopologyIndex.location(server.id)
+            pod = self.pods.get(pod_name)
+            if pod is None:
+                pod = self.pods[pod_name] = CapacitySummary(pod_name)
+            rack = racks.get((pod_name, rack_name))
+            if rack is None:
+                rack = racks[(pod_name, rack_name)] = CapacitySummary(rack_name, pod)
+                pod.members.append(rack)
+            rack.members.append(pos)
+            self._pos[server.id] = pos
+            self._rack_of.append(rack)
+            for resource, attr in enumerate(TopologyIndex.RESOURCES):
+                value = getattr(server, attr)
+                for summary in (rack, pod):
+                    summary.free[resource] += value
+                    if value > summary.max_remaining[resource]:
+                        summary.max_remaining[resource] = value
+            server.add_observer(self)
+
+        # racks are visited pod by pod; only sort candidates if that is not cluster order
+        visit_order = [pos for pod in self.pods.values() for rack in pod.members
+            for pos in rack.members]
+        self._in_cluster_order = visit_order == sorted(visit_order)
+
+    @staticmethod
+    def location(server_id: str) -> Tuple[str, str]:
+        """ :returns: (pod, rack) names of a server id, e.g. p0_r1_s2 -> (p0, r1) """
+        parts = str(server_id).split('_')
+        if len(parts) < 3:
+            return '', ''
+        return parts[0], parts[1]
+
+    def update_cores(self, server: 'Server', old_cores) -> None:
+        self._update(server, 0, old_cores, server._cores_remaining)
+
+    def update_ram(self, server: 'Server', old_ram) -> None:
+        self._update(server, 1, old_ram, server._ram_remaining)
+
+    def _update(self, server: 'Server', resource: int, old_value, new_value) -> None:
+        if old_value == new_value:
+            return
+        rack = self._rack_of[self._pos[server.id]]
+        pod = rack.parent
+        rack.free[resource] += new_value - old_value
+        pod.free[resource] += new_value - old_value
+        if new_value > old_value:
+            if new_value > rack.max_remaining[resource]:
+                rack.max_remaining[resource] = new_value
+                if new_value > pod.max_remaining[resource]:
+                    pod.max_remaining[resource] = new_value
+        elif old_value == rack.max_remaining[resource]:
+            attr = TopologyIndex.RESOURCES[resource]
+            servers = self._servers
+            old_max = rack.max_remaining[resource]
+            rack.max_remaining[resource] = max(getattr(servers[pos], attr) for pos in rack.members)
+            if old_max == pod.max_remaining[resource] and rack.max_remaining[resource] < old_max:
+                pod.max_remaining[resource] = max(r.max_remaining[resource] for r in pod.members)
+
+    def candidates(self, cores=0, ram=0.0) -> List['Server']:
+        """ Servers with at least the given remaining cores and RAM.
+        :return: list of servers in cluster order """
+        servers = self._servers
+        positions = []  # type: List[int]
+        for pod in self.pods.values():
+            if not pod.may_fit(cores, ram):
+                continue
+            for rack in pod.members:
+                if not rack.may_fit(cores, ram):
+                    continue
+                for pos in rack.members:
+                    server = servers[pos]
+                    if server.has_cores_capacity(cores) and server.has_ram_capacity(ram):
+                        positions.append(pos)
+        if not self._in_cluster_order:
+            positions.sort()
+        return [servers[pos] for pos in positions]
+
+    def summary(self) -> Dict[str, Any]:
+        """ :returns: {pod: {..., 'racks': {rack: {...}, ...}}, ...} """
+        pods = OrderedDict()
+        for pod_name, pod in self.pods.items():
+            pods[pod_name] = pod.to_dict()
+            pods[pod_name]['racks'] = OrderedDict((rack.name, rack.to_dict())
+                for rack in pod.members)
+        return pods
+
+
+class BaseServer(object):
+    """ Behaviour of a server, without storage. Subclasses provide id, cores,
+    ram, _cores_remaining, _ram_remaining and _observers, either as slots
+    (Server) or as views over other storage (array_domain.ArrayServer). """
+    __slots__ = ()
+
+    def add_observer(self, observer: Any) -> None:
+        self._observers += (observer,)
+
+    def remove_observer(self, observer: Any) -> None:
+        self._observers = tuple(o for o in self._observers if o is not observer)
 
     def has_cores_capacity(self, cores=0) -> bool:
         return self._cores_remaining - cores >= 0
@@ -53,7 +325,10 @@ class Server(object):
             return const.SCHED_INSUFFICIENT_RSRC
         if not self.has_cores_capacity(cores):
             return const.SCHED_INSUFFICIENT_RSRC
+        old_cores = self._cores_remaining
         self._cores_remaining -= cores
+        for observer in self._observers:
+            observer.update_cores(self, old_cores)
         return const.SCHED_SUCCESS
 
     def allocate_ram(self, ram) -> int:
@@ -64,14 +339,20 @@ class Server(object):
             return const.SCHED_INSUFFICIENT_RSRC
         if not self.has_ram_capacity(ram):
             return const.SCHED_INSUFFICIENT_RSRC
+        old_ram = self._ram_remaining
         self._ram_remaining -= ram
+        for observer in self._observers:
+            observer.update_ram(self, old_ram)
         return const.SCHED_SUCCESS
 
     def free_cores(self, cores) -> int:
         """ Add cores back to the server after VM deallocation.
         :cores: number of cores being freed
         :return: SCHED_SUCCESS if operation succeeds, SCHED_FAIL otherwise. """
+        old_cores = self._cores_remaining
         self._cores_remaining += cores
+        for observer in self._observers:
+            observer.update_cores(self, old_cores)
         if self._cores_remaining > self.cores:
             glog.error('ERROR: invalid number of cores: {} {}'.format(
                 'Server ({}) has {} cores after freeing {} cores.'.format(self.id,
@@ -84,7 +365,10 @@ class Server(object):
         """ Add RAM back to the server after VM deallocation.
         :ram: amount of RAM being freed (in MB)
         :return: SCHED_SUCCESS if operation succeeds, SCHED_FAIL otherwise. """
+        old_ram = self._ram_remaining
         self._ram_remaining += ram
+        for observer in self._observers:
+            observer.update_ram(self, old_ram)
         if self._ram_remaining > self.ram:
             glog.error('ERROR: invalid amount of RAM: {} {}'.format(
                 'Server ({}) has {}MB RAM after freeing {}MB.'.format(self.id,
@@ -94,13 +378,45 @@ class Server(object):
         return const.SCHED_SUCCESS
 
     def reset_cores(self, cores):
+        old_cores = self._cores_remaining
         self.cores = cores
         self._cores_remaining = cores
+        for observer in self._observers:
+            observer.update_cores(self, old_cores)
 
     def reset_ram(self, ram):
+        old_ram = self._ram_remaining
         self.ram = ram
         self._ram_remaining = ram
+        for observer in self._observers:
+            observer.update_ram(self, old_ram)
+
+    def set_remaining(self, cores_remaining, ram_remaining) -> None:
+        """ Overwrite the remaining resources, e.g. when restoring a checkpoint. """
+        old_cores = self._cores_remaining
+        old_ram = self._ram_remaining
+        self._cores_remaining = cores_remaining
+        self._ram_remaining = ram_remaining
+        for observer in self._observers:
+            observer.update_cores(self, old_cores)
+            observer.update_ram(self, old_ram)
 
     def __repr__(self):
         return '{0.__class__.__name__}(id={0.id}, core_remain={0._cores_remaining}, ram_remain={0._ram_remaining})'.format(
             self)
+
+
+class Server(BaseServer):
+    __slots__ = ('id', 'cores', 'ram', '_cores_remaining', '_ram_remaining', '_observers')
+
+    def __init__(self, id, cores, ram):
+        self.id = id
+        self.cores = cores
+        self.ram = ram
+
+        self._cores_remaining = cores
+        self._ram_remaining = ram
+
+        # objects kept up to date on every change of the remaining resources,
+        # e.g. a CapacityIndex. They implement update_cores and update_ram.
+        self._observers = ()  # type: Tuple[Any, ...]
@@ -0,0 +1,107 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from schedulers.lib.domain import Server
+
+# (cores, ram) of a request
+FLAVOR_TYPE = Tuple[float, float]
+
+
+class FilterCache(object):
+    """ Feasible servers of recently requested flavors, kept up to date
+    incrementally.
+
+    The cache observes every server. Each change of a server's remaining
+    resources bumps the cache version and appends the server's position to
+    a change log, so log[v:] names the servers changed since version v.
+    Every entry keeps the sorted positions of the servers that fit its
+    flavor and the version it was last brought up to date at. On a hit only
+    the servers changed since then are re-checked. Entries are evicted in
+    least recently used order; entries lagging behind so far that the
+    changes are no longer logged are dropped and rebuilt on their next use. """
+
+    def __init__(self, servers: List[Server], max_entries: int = 64):
+        self._servers = servers
+        self._pos = {server.id: pos for pos, server in enumerate(servers)}
+        self.max_entries = max_entries
+        # {flavor: [sorted server positions, version], ...} in LRU order
+        self._entries = OrderedDict()  # type: Dict[FLAVOR_TYPE, List]
+        self._log = []  # type: List[int]
+        self._log_base = 0  # version of self._log[0]
+        self._max_log = max(1024, 2 * len(servers))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rechecked = 0
+        for server in servers:
+            server.add_observer(self)
+
+    @property
+    def version(self) -> int:
+        return self._log_base + len(self._log)
+
+    def update_cores(self, server: Server, old_cores) -> None:
+        self._changed(server)
+
+    def update_ram(self, server: Server, old_ram) -> None:
+        self._changed(server)
+
+    def _changed(self, server: Server) -> None:
+        # trimmed here rather than on lookup, which may never come, e.g.
+        # when a weigher policy finds the feasible servers itself
+        self._log.append(self._pos[server.id])
+        if len(self._log) > self._max_log:
+            self._trim()
+
+    def feasible(self, cores=0, ram=0.0) -> List[Server]:
+        """ Servers with at least the given remaining cores and RAM.
+        :return: list of servers in cluster order """
+        flavor = (cores, ram)
+        servers = self._servers
+        entry = self._entries.get(flavor)
+        if entry is None:
+            self.misses += 1
+            positions = [pos for pos, server in enumerate(servers)
+                if server.has_cores_capacity(cores) and server.has_ram_capacity(ram)]
+            self._entries[flavor] = [positions, self.version]
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(flavor)
+            positions = entry[0]
+            if entry[1] < self.version:
+                self._recheck(positions, set(self._log[entry[1] - self._log_base:]), cores, ram)
+                entry[1] = self.version
+        return [servers[pos] for pos in positions]
+
+    def _recheck(self, positions: List[int], changed, cores, ram) -> None:
+        servers = self._servers
+        self.rechecked += len(changed)
+        for pos in changed:
+            server = servers[pos]
+            fits = server.has_cores_capacity(cores) and server.has_ram_capacity(ram)
+            i = bisect_left(positions, pos)
+            present = i < len(positions) and positions[i] == pos
+            if fits and not present:
+                positions.insert(i, pos)
+            elif present and not fits:
+                del positions[i]
+
+    def _trim(self) -> None:
+        """ Forget the older half of the change log, with the entries that need it. """
+        cutoff = self.version - self._max_log // 2
+        for flavor in [flavor for flavor, entry in self._entries.items() if entry[1] < cutoff]:
+            del self._entries[flavor]
+            self.evictions += 1
+        del self._log[:cutoff - self._log_base]
+        self._log_base = cutoff
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'rechecked_per_hit': self.rechecked / self.hits if self.hits else 0.0}
@@ -0,0 +1,113 @@
+import itertools
+from typing import Iterable, Iterator, List, Sequence
+
+from schedulers.lib.domain import Server
+from schedulers.lib.workload import VMEvent
+
+
+class HostFilter(object):
+    """ Base class of the filters of a FilterChain.
+    Keeps how many hosts it has seen and passed, so that the chain can run
+    the most selective filters first. """
+    name = None  # type: str
+
+    def __init__(self):
+        self.seen = 0.0
+        self.passed = 0.0
+
+    def host_passes(self, server: Server, req: VMEvent) -> bool:
+        raise NotImplementedError
+
+    def pass_ratio(self) -> float:
+        return self.passed / self.seen if self.seen else 1.0
+
+
+class CoreFilter(HostFilter):
+    """ Same check as NovaFilter.cpu_filter. """
+    name = 'cpu'
+
+    def host_passes(self, server: Server, req: VMEvent) -> bool:
+        return server.has_cores_capacity(req.cores)
+
+
+class RamFilter(HostFilter):
+    """ Same check as NovaFilter.mem_filter. """
+    name = 'ram'
+
+    def host_passes(self, server: Server, req: VMEvent) -> bool:
+        return server.has_ram_capacity(req.ram)
+
+
+FILTERS = {host_filter.name: host_filter for host_filter in (CoreFilter, RamFilter)}
+
+
+class FilterChain(object):
+    """ Filters evaluated lazily as a chain of generators: a host is only
+    checked by a filter if it passed all filters before it, and nothing is
+    checked beyond the hosts the caller consumes.
+
+    With adaptive ordering, every reorder_interval requests the filters are
+    sorted by their observed pass ratio, most selective first, and the
+    counts are halved so that the order follows the current cluster state. """
+
+    def __init__(self, filters: List[HostFilter], adaptive: bool = False,
+            reorder_interval: int = 100):
+        self.filters = list(filters)
+        self.adaptive = adaptive
+        self.reorder_interval = reorder_interval
+        self.n_requests = 0
+
+    def passing(self, req: VMEvent, servers: Iterable[Server]) -> Iterator[Server]:
+        """ :returns: generator of the servers passing every filter, in the given order """
+        self.n_requests += 1
+        if self.adaptive and self.n_requests % self.reorder_interval == 0:
+            self.reorder()
+        hosts = iter(servers)
+        for host_filter in self.filters:
+            hosts = self._filtered(host_filter, req, hosts)
+        return hosts
+
+    def first(self, req: VMEvent, servers: Sequence[Server], count: int,
+            offset: int = 0) -> List[Server]:
+        """ Nova's host_subset_size: stop as soon as count hosts pass.
+        Servers are scanned from position offset, wrapping around.
+        :returns: up to count servers passing every filter """
+        positions = itertools.chain(range(offset, len(servers)), range(0, offset))
+        rotated = (servers[pos] for pos in positions)
+        hosts = self.passing(req, rotated)
+        subset = list(itertools.islice(hosts, count))
+        hosts.close()
+        return subset
+
+    def reorder(self) -> None:
+        self.filters.sort(key=HostFilter.pass_ratio)
+        for host_filter in self.filters:
+            host_filter.seen /= 2.0
+            host_filter.passed /= 2.0
+
+    @staticmethod
+    def _filtered(host_filter: HostFilter, req: VMEvent,
+            hosts: Iterator[Server]) -> Iterator[Server]:
+        host_passes = host_filter.host_passes
+        seen = 0
+        passed = 0
+        try:
+            for host in hosts:
+                seen += 1
+                if host_passes(host, req):
+                    passed += 1
+                    yield host
+        finally:
+            host_filter.seen += seen
+            host_filter.passed += passed
+
+
+def make_filter_chain(names: List[str], adaptive: bool = False,
+        reorder_interval: int = 100) -> FilterChain:
+    """ Build the filter chain named on the command line. Every filter must be
+    named exactly once, as a host passing the chain is placed without further checks.
+    :raises ValueError: if a filter is missing or repeated """
+    if sorted(names) != sorted(FILTERS):
+        raise ValueError('the filter chain must run each of {} once, got {}'.format(
+            ', '.join(sorted(FILTERS)), ', '.join(names)))
+    return FilterChain([FILTERS[name]() for name in names], adaptive, reorder_interval)
@@ -0,0 +1,211 @@
+import glog
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, List
+
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.workload import VMEvent
+
+# Cache file layout:
+#   MAGIC | uint64 index length | marshalled index | marshalled blobs
+# The index is a dict with the 'kind' of input and the byte offsets of the
+# blobs, which follow the index back to back. Topologies are one blob, the
+# "Servers" section. Workloads are one blob per tick, in replay order, each
+# a list of (type, vdc_uuid, vm_uuid, cores, ram) tuples; the index also
+# holds the tick keys. marshal keeps the strings interned, and loads far
+# faster than json without importing numpy.
+MAGIC = b'NFCACHE\x01'
+KIND_TOPOLOGY = 'topology'
+KIND_WORKLOAD = 'workload'
+# bumped whenever the layout changes, so older cache files are not read
+CACHE_VERSION = 1
+
+
+def default_cache_dir() -> str:
+    """ $NOVAFILTER_CACHE_DIR, else novafilter/ under $XDG_CACHE_HOME or ~/.cache """
+    if os.environ.get('NOVAFILTER_CACHE_DIR'):
+        return os.environ['NOVAFILTER_CACHE_DIR']
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'novafilter')
+
+
+def content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """ Hex digest of the file contents and the cache format version. """
+    digest = hashlib.sha256(str(CACHE_VERSION).encode('ascii'))
+    with open(path, 'rb') as ff:
+        chunk = ff.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = ff.read(chunk_size)
+    return digest.hexdigest()
+
+
+def write_cache_file(path: str, kind: str, blobs: List[bytes], index: Dict = None) -> None:
+    """ Write the blobs into a cache file. The file is written under a
+    temporary name and renamed, so concurrent runs never read a partial file.
+    :index: extra values stored in the index """
+    index = dict(index or {})
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    index['kind'] = kind
+    index['offsets'] = offsets
+    index_bytes = marshal.dumps(index)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as ff:
+            ff.write(MAGIC)
+            ff.write(struct.pack('<Q', len(index_bytes)))
+            ff.write(index_bytes)
+            for blob in blobs:
+                ff.write(blob)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class CacheFile(object):
+    """ Memory-mapped cache file. Blobs are only unmarshalled when asked for.
+    :raises ValueError, EOFError: if the file is empty, truncated or not a cache file """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as ff:
+            self._mmap = mmap.mmap(ff.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._mmap)
+        index_start = len(MAGIC) + 8
+        if size < index_start or self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError('{} is not an input cache file'.format(path))
+        index_len, = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        if index_start + index_len > size:
+            raise ValueError('{} is truncated'.format(path))
+        self.index = marshal.loads(self._mmap[index_start:index_start + index_len])
+        self.kind = self.index['kind']
+        self._offsets = self.index['offsets']
+        self._data_start = index_start + index_len
+        if self._data_start + self._offsets[-1] != size:
+            raise ValueError('{} is truncated'.format(path))
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def blob(self, i: int):
+        start = self._data_start + self._offsets[i]
+        return marshal.loads(self._mmap[start:self._data_start + self._offsets[i + 1]])
+
+
+class InputCache(object):
+    """ Parsed topologies and workloads stored on disk, keyed by the content
+    hash of the JSON file they were parsed from, so that a later run over the
+    same inputs skips JSON parsing. Columnar inputs are already fast to load
+    and are not cached. """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _path(self, source_path: str, kind: str) -> str:
+        return os.path.join(self.cache_dir, '{}.{}'.format(content_hash(source_path), kind))
+
+    def _open(self, source_path: str, kind: str, write) -> CacheFile:
+        """ Open the cache file of the source, writing it first if it is
+        missing or cannot be read, e.g. after an interrupted write.
+        :write: function(source_path, cache_path) writing the cache file
+        :returns: the cache file, or None if it could not be written """
+        path = self._path(source_path, kind)
+        if os.path.exists(path):
+            try:
+                return self._read(path, kind)
+            except (ValueError, EOFError) as e:
+                glog.warning('rewriting unreadable cache file {}: {}'.format(path, e))
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            write(source_path, path)
+        except OSError as e:
+            glog.warning('cannot cache {} in {}: {}'.format(source_path, self.cache_dir, e))
+            return None
+        glog.info('cached {} {} in {}'.format(kind, source_path, path))
+        try:
+            return self._read(path, kind)
+        except (ValueError, EOFError) as e:
+            glog.warning('cannot read back cache file {}: {}'.format(path, e))
+            return None
+
+    @staticmethod
+    def _read(path: str, kind: str) -> CacheFile:
+        cf = CacheFile(path)
+        if cf.kind != kind:
+            raise ValueError('{} holds a {}, not a {}'.format(path, cf.kind, kind))
+        return cf
+
+    def servers(self, topology_path: str) -> Dict[str, List]:
+        """ The "Servers" section of a topology JSON file.
+        :returns: {server_id: [cores, ram], ...} """
+        cf = self._open(topology_path, KIND_TOPOLOGY, write_topology_cache)
+        if cf is None:
+            with open(topology_path) as ff:
+                return json.load(ff)["Servers"]
+        return cf.blob(0)
+
+    def workload_replayer(self, workload_path: str) -> WorkloadReplayer:
+        """ Replayer over the cached form of a workload JSON file. """
+        cf = self._open(workload_path, KIND_WORKLOAD, write_workload_cache)
+        if cf is None:
+            replayer = WorkloadReplayer()
+            replayer.load_workload(workload_path)
+            return replayer
+        replayer = CachedWorkloadReplayer()
+        replayer.load_cache(cf)
+        return replayer
+
+
+def write_topology_cache(json_fname: str, cache_path: str) -> None:
+    with open(json_fname) as ff:
+        f_servers = json.load(ff)["Servers"]
+    write_cache_file(cache_path, KIND_TOPOLOGY, [marshal.dumps(f_servers)])
+
+
+def write_workload_cache(workload_path: str, cache_path: str) -> None:
+    """ Cache the ticks of a workload JSON file in the order
+    WorkloadReplayer replays them. """
+    with open(workload_path) as ff:
+        workload = json.load(ff)
+    keys = [k for k in workload if k.startswith(WorkloadReplayer.WORKLOAD_TICK_PREFIX)]
+    keys.sort(key=WorkloadReplayer.tick_index)
+    intern = sys.intern
+    blobs = [marshal.dumps([(intern(event["type"]), intern(event["vdc_uuid"]),
+        intern(event["vm_uuid"]), event.get("cores", 0), event.get("ram_in_gb", 0.0))
+        for event in workload[tick_id]]) for tick_id in keys]
+    write_cache_file(cache_path, KIND_WORKLOAD, blobs, {'keys': keys})
+
+
+class CachedWorkloadReplayer(WorkloadReplayer):
+    """ WorkloadReplayer over a workload cache file. Only the index is read
+    up front; the events of a tick are unmarshalled when it is replayed. """
+
+    def load_workload(self, workload_path):
+        """
+        Map a workload cache file into the replayer.
+
+        Parameters:
+        workload_path (string): path to the cache file
+        """
+        self.load_cache(CacheFile(workload_path))
+
+    def load_cache(self, cf: CacheFile) -> None:
+        self._file = cf
+        self.keys = [sys.intern(tick_id) for tick_id in cf.index['keys']]
+
+    def replay(self):
+        """ Replay workload by ticks.
+        :returns: list of workloads within current tick """
+        if self.currTick >= len(self.keys):
+            return []
+        tick_id = self.keys[self.currTick]
+        events = self._file.blob(self.currTick)
+        self.currTick += 1
+        return [VMEvent(tick_id, *event) for event in events]
@@ -0,0 +1,146 @@
+import json
+import math
+import time
+from typing import IO, Callable, Dict
+
+# log-linear buckets: every power of two is split into SUB_BUCKETS linear
+# buckets, which bounds the relative error of a percentile to 1/SUB_BUCKETS.
+SUB_BUCKETS = 16
+MIN_EXP = -10  # smallest bucket starts at 2**-11 microseconds
+MAX_EXP = 40   # largest bucket ends at 2**40 microseconds (~12 days)
+N_BUCKETS = (MAX_EXP - MIN_EXP + 1) * SUB_BUCKETS
+
+PERCENTILES = (('p50', 50.0), ('p99', 99.0), ('p999', 99.9))
+
+
+def bucket_index(value: float) -> int:
+    if value <= 0.0:
+        return 0
+    mantissa, exp = math.frexp(value)  # value = mantissa * 2**exp, 0.5 <= mantissa < 1
+    if exp < MIN_EXP:
+        return 0
+    if exp > MAX_EXP:
+        return N_BUCKETS - 1
+    return (exp - MIN_EXP) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+
+def bucket_upper_bound(index: int) -> float:
+    exp, sub = divmod(index, SUB_BUCKETS)
+    return math.ldexp(0.5 + (sub + 1) / (2.0 * SUB_BUCKETS), exp + MIN_EXP)
+
+
+class LogHistogram(object):
+    """ Fixed-memory histogram of latencies in microseconds. """
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def reset(self) -> None:
+        if self.count:
+            self.counts[:] = [0] * N_BUCKETS
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def percentile(self, q: float) -> float:
+        """ Upper bound of the bucket holding the q-th percentile, capped by
+        the largest recorded value. """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(math.ceil(q / 100.0 * self.count)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        stats = {'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max}
+        for name, q in PERCENTILES:
+            stats[name] = self.percentile(q)
+        return stats
+
+
+class PhaseLatency(object):
+    """ Latency histograms of one scheduler phase, for the current tick and
+    for the whole run. """
+    __slots__ = ('tick', 'run')
+
+    def __init__(self):
+        self.tick = LogHistogram()
+        self.run = LogHistogram()
+
+    def record(self, value: float) -> None:
+        index = bucket_index(value)
+        for hist in (self.tick, self.run):
+            hist.counts[index] += 1
+            hist.count += 1
+            hist.total += value
+            if value > hist.max:
+                hist.max = value
+
+
+class PhaseStats(object):
+    """ Per-phase latency histograms of the scheduling hot path.
+    Phases are timed by wrapping the methods that implement them (see
+    timed()), so nothing is timed or checked when PhaseStats is not used.
+    At the end of each tick, the tick's percentiles are written as one JSON
+    line to tick_output, if given, and the tick histograms are reset. """
+
+    def __init__(self, tick_output: IO[str] = None):
+        self.phases = dict()  # type: Dict[str, PhaseLatency]
+        self.tick_output = tick_output
+
+    def phase(self, name: str) -> PhaseLatency:
+        if name not in self.phases:
+            self.phases[name] = PhaseLatency()
+        return self.phases[name]
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """ Wrap func so that every call is recorded under the phase name. """
+        record = self.phase(name).record
+        perf_counter = time.perf_counter
+
+        def timed_func(*args, **kwargs):
+            start_time = perf_counter()
+            result = func(*args, **kwargs)
+            record((perf_counter() - start_time) * 10**6)
+            return result
+        return timed_func
+
+    def end_tick(self, tick_id: str) -> None:
+        if self.tick_output is not None:
+            line = {'tick': tick_id}
+            for name, latency in self.phases.items():
+                if latency.tick.count:
+                    line[name] = latency.tick.summary()
+            self.tick_output.write(json.dumps(line, separators=(',', ':')))
+            self.tick_output.write('\n')
+        for latency in self.phases.values():
+            latency.tick.reset()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """ Percentiles of every phase over the whole run. """
+        return {name: latency.run.summary() for name, latency in self.phases.items()
+            if latency.run.count}
+
+    def close(self) -> None:
+        """ Write the run summary as the last line of tick_output. """
+        if self.tick_output is not None:
+            self.tick_output.write(json.dumps({'run': self.summary()}, separators=(',', ':')))
+            self.tick_output.write('\n')
+            self.tick_output.close()
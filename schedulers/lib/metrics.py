@@ -0,0 +1,141 @@
+import json
+from collections import OrderedDict
+from typing import IO, Dict, List
+
+from schedulers.lib.domain import Server, TopologyIndex
+
+
+class UtilizationMetrics(object):
+    """ Running cluster utilization and fragmentation, kept up to date as an
+    observer of every server, so that each allocate/free costs O(1) and no
+    second pass over the allocations is needed.
+
+    A host is full if it has less than min_cores cores or min_ram RAM left,
+    i.e. it cannot take the smallest VM. The free cores of hosts without
+    min_ram RAM, and the free RAM of hosts without min_cores cores, are
+    stranded: free, but unusable. The fragmentation score is the stranded
+    share of the free resources, averaged over cores and RAM.
+
+    At the end of each tick one JSON line with the aggregates, and the used
+    cores and RAM of every pod, is written to tick_output. """
+
+    def __init__(self, tick_output: IO[str], min_cores=1.0, min_ram=0.5):
+        self.tick_output = tick_output
+        self.min_cores = min_cores
+        self.min_ram = min_ram
+        self._pos = dict()  # type: Dict[str, int]
+        self._pod_of = []  # type: List[int]
+        self.pods = []  # type: List[str]
+        # last seen [cores, ram, cores_remaining, ram_remaining] of every server
+        self._seen = []  # type: List[List]
+
+        self.total_cores = 0.0
+        self.total_ram = 0.0
+        self.used_cores = 0.0
+        self.used_ram = 0.0
+        self.pod_used = []  # type: List[List[float]]  # [used_cores, used_ram] per pod
+        self.full_hosts = 0
+        self.idle_hosts = 0
+        self.stranded_cores = 0.0
+        self.stranded_ram = 0.0
+
+        self.ticks = 0
+        self.peaks = OrderedDict(
+            [('cores_utilization', 0.0), ('ram_utilization', 0.0), ('full_hosts', 0),
+            ('fragmentation', 0.0)])
+
+    def attach(self, servers: List[Server]) -> None:
+        """ Start tracking the given servers. """
+        pod_index = dict()  # type: Dict[str, int]
+        for pos, server in enumerate(servers):
+            pod = TopologyIndex.location(server.id)[0]
+            if pod not in pod_index:
+                pod_index[pod] = len(self.pods)
+                self.pods.append(pod)
+                self.pod_used.append([0.0, 0.0])
+            self._pos[server.id] = pos
+            self._pod_of.append(pod_index[pod])
+            seen = [server.cores, server.ram, server._cores_remaining, server._ram_remaining]
+            self._seen.append(seen)
+            self._contribute(pos, seen, 1)
+            server.add_observer(self)
+
+    def update_cores(self, server: Server, old_cores) -> None:
+        self._account(self._pos[server.id], server)
+
+    def update_ram(self, server: Server, old_ram) -> None:
+        self._account(self._pos[server.id], server)
+
+    def _account(self, pos: int, server: Server) -> None:
+        """ Replace the server's last seen contribution to the aggregates with
+        its current one. Comparing against the last seen state, rather than
+        the old value passed to the observer, also covers set_remaining and
+        capacity changes. """
+        seen = self._seen[pos]
+        self._contribute(pos, seen, -1)
+        seen[0] = server.cores
+        seen[1] = server.ram
+        seen[2] = server._cores_remaining
+        seen[3] = server._ram_remaining
+        self._contribute(pos, seen, 1)
+
+    def _contribute(self, pos: int, seen: List, sign: int) -> None:
+        cores, ram, cores_remaining, ram_remaining = seen
+        used_cores = cores - cores_remaining
+        used_ram = ram - ram_remaining
+        self.total_cores += sign * cores
+        self.total_ram += sign * ram
+        self.used_cores += sign * used_cores
+        self.used_ram += sign * used_ram
+        pod_used = self.pod_used[self._pod_of[pos]]
+        pod_used[0] += sign * used_cores
+        pod_used[1] += sign * used_ram
+        no_cores = cores_remaining < self.min_cores
+        no_ram = ram_remaining < self.min_ram
+        if no_cores or no_ram:
+            self.full_hosts += sign
+        if used_cores == 0 and used_ram == 0:
+            self.idle_hosts += sign
+        if no_ram:
+            self.stranded_cores += sign * cores_remaining
+        if no_cores:
+            self.stranded_ram += sign * ram_remaining
+
+    def fragmentation(self) -> float:
+        free_cores = self.total_cores - self.used_cores
+        free_ram = self.total_ram - self.used_ram
+        cores_share = self.stranded_cores / free_cores if free_cores > 0 else 0.0
+        ram_share = self.stranded_ram / free_ram if free_ram > 0 else 0.0
+        return (cores_share + ram_share) / 2.0
+
+    def snapshot(self) -> Dict:
+        """ Current aggregates. """
+        cores_utilization = self.used_cores / self.total_cores if self.total_cores > 0 else 0.0
+        ram_utilization = self.used_ram / self.total_ram if self.total_ram > 0 else 0.0
+        return OrderedDict([('used_cores', self.used_cores), ('used_ram', self.used_ram),
+            ('cores_utilization', cores_utilization), ('ram_utilization', ram_utilization),
+            ('full_hosts', self.full_hosts), ('idle_hosts', self.idle_hosts),
+            ('stranded_cores', self.stranded_cores), ('stranded_ram', self.stranded_ram),
+            ('fragmentation', self.fragmentation())])
+
+    def end_tick(self, tick_id: str) -> None:
+        line = self.snapshot()
+        self.ticks += 1
+        for name, peak in self.peaks.items():
+            if line[name] > peak:
+                self.peaks[name] = line[name]
+        line['tick'] = tick_id
+        line.move_to_end('tick', last=False)
+        line['pods'] = {pod: used for pod, used in zip(self.pods, self.pod_used)}
+        self.tick_output.write(json.dumps(line, separators=(',', ':')))
+        self.tick_output.write('\n')
+
+    def summary(self) -> Dict:
+        """ Peak values over all ticks so far, and the aggregates at the end. """
+        return {'ticks': self.ticks, 'peak': dict(self.peaks), 'last': self.snapshot()}
+
+    def close(self) -> None:
+        """ Write the run summary as the last line of tick_output. """
+        self.tick_output.write(json.dumps({'run': self.summary()}, separators=(',', ':')))
+        self.tick_output.write('\n')
+        self.tick_output.close()
@@ -1,3 +1,6 @@
+from typing import Sequence
+
+
 class ProcessTimeDelta:
     def diff_in_microsecs(self, start_time, end_time):
         return (end_time - start_time) * 10**6
@@ -15,3 +18,12 @@ class DebugStats:
                 'ram_passed': -1,
                 'latency': -1,
                 'vm_uuid': ''}
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """ Nearest-rank percentile of already sorted values.
+    :q: percentile between 0 and 100 """
+    if len(sorted_values) == 0:
+        return 0.0
+    rank = int(round(q / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[rank]
@@ -0,0 +1,238 @@
+import multiprocessing
+import random
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import schedulers.constants as const
+from schedulers.lib.array_domain import ArrayCluster
+from schedulers.lib.misc import percentile
+from schedulers.lib.workload import VMEvent
+
+# (event type, vm_uuid, cores, ram) of the events one worker handles in a tick
+WORKER_EVENT_TYPE = Tuple[str, str, float, float]
+
+
+class SharedClusterState(object):
+    """ Authoritative remaining cores and RAM of every server, in shared
+    memory so that forked workers see each other's claims. A claim checks
+    and deducts the resources of one server atomically under that server's
+    lock. Locks are striped over at most max_locks locks. """
+
+    def __init__(self, cluster: ArrayCluster, ctx, max_locks: int = 1024):
+        n_servers = len(cluster.cores)
+        self._cores_buf = ctx.RawArray('d', n_servers)
+        self._ram_buf = ctx.RawArray('d', n_servers)
+        self.cores_remaining = np.frombuffer(self._cores_buf, dtype=np.float64)
+        self.ram_remaining = np.frombuffer(self._ram_buf, dtype=np.float64)
+        self.cores_remaining[:] = cluster.cores_remaining
+        self.ram_remaining[:] = cluster.ram_remaining
+        self.locks = [ctx.Lock() for _ in range(max(1, min(max_locks, n_servers)))]
+
+    def claim(self, pos: int, cores, ram) -> bool:
+        """ Deduct the resources if the server still has them.
+        :returns: True if the claim succeeded """
+        with self.locks[pos % len(self.locks)]:
+            if self.cores_remaining[pos] - cores >= 0 and self.ram_remaining[pos] - ram >= 0.0:
+                self.cores_remaining[pos] -= cores
+                self.ram_remaining[pos] -= ram
+                return True
+            return False
+
+    def release(self, pos: int, cores, ram) -> None:
+        with self.locks[pos % len(self.locks)]:
+            self.cores_remaining[pos] += cores
+            self.ram_remaining[pos] += ram
+
+
+class SchedulerWorker(object):
+    """ One scheduler worker. It filters and weighs against its own copy of
+    the cluster state, refreshed from the shared state every
+    refresh_interval requests, and claims the chosen server on the shared
+    state. A failed claim means the copy was stale: the worker refreshes
+    that server and tries again, up to max_attempts claims per request,
+    like Nova's scheduler retries. """
+
+    def __init__(self, state: SharedClusterState, view: ArrayCluster, refresh_interval: int,
+            max_attempts: int, seed: int):
+        self.state = state
+        self.view = view
+        self.refresh_interval = refresh_interval
+        self.max_attempts = max_attempts
+        self.rand = random.Random(seed)
+        self.since_refresh = refresh_interval
+        self.working_set = dict()  # type: Dict[str, Tuple[int, float, float]]
+
+        self.latencies = array('d')  # microsecs of every create
+        self.retried_latencies = array('d')  # microsecs of creates that needed more than one claim
+        self.claims = 0
+        self.conflicts = 0
+        self.retried = 0
+        self.retry_reached = 0
+        self.no_valid_host = 0
+
+    def refresh(self) -> None:
+        np.copyto(self.view.cores_remaining, self.state.cores_remaining)
+        np.copyto(self.view.ram_remaining, self.state.ram_remaining)
+        self.since_refresh = 0
+
+    def place(self, vm_uuid: str, cores, ram) -> int:
+        """ :returns: const.SCHED_SUCCESS, const.SCHED_INSUFFICIENT_RSRC if no
+        server fits, or const.SCHED_RETRY_REACHED if every claim conflicted """
+        view = self.view
+        state = self.state
+        status = const.SCHED_RETRY_REACHED
+        attempts = 0
+        while attempts < self.max_attempts:
+            if self.since_refresh >= self.refresh_interval:
+                self.refresh()
+            self.since_refresh += 1
+            feasible = np.flatnonzero(view.cpu_mask(cores) & view.ram_mask(ram))
+            if len(feasible) == 0:
+                status = const.SCHED_INSUFFICIENT_RSRC
+                break
+            pos = int(feasible[self.rand.randrange(len(feasible))])
+            attempts += 1
+            self.claims += 1
+            if state.claim(pos, cores, ram):
+                view.cores_remaining[pos] -= cores
+                view.ram_remaining[pos] -= ram
+                self.working_set[vm_uuid] = (pos, cores, ram)
+                status = const.SCHED_SUCCESS
+                break
+            self.conflicts += 1
+            view.cores_remaining[pos] = state.cores_remaining[pos]
+            view.ram_remaining[pos] = state.ram_remaining[pos]
+        if attempts > 1:
+            self.retried += 1
+        if status == const.SCHED_INSUFFICIENT_RSRC:
+            self.no_valid_host += 1
+        elif status == const.SCHED_RETRY_REACHED:
+            self.retry_reached += 1
+        return status
+
+    def delete(self, vm_uuid: str) -> None:
+        placed = self.working_set.pop(vm_uuid, None)
+        if placed is not None:
+            self.state.release(*placed)
+
+    def run(self, ticks: List[List[WORKER_EVENT_TYPE]], barrier, timeout: float = None) -> None:
+        """ Handle this worker's share of every tick. All workers finish a
+        tick before any starts the next.
+        :timeout: seconds to wait for the other workers at the end of a tick """
+        perf_counter = time.perf_counter
+        for events in ticks:
+            for event_type, vm_uuid, cores, ram in events:
+                if event_type == const.VM_CREATE_STR:
+                    start_time = perf_counter()
+                    attempts_before = self.claims
+                    self.place(vm_uuid, cores, ram)
+                    latency = (perf_counter() - start_time) * 10**6
+                    self.latencies.append(latency)
+                    if self.claims - attempts_before > 1:
+                        self.retried_latencies.append(latency)
+                else:
+                    self.delete(vm_uuid)
+            barrier.wait(timeout)
+
+    def stats(self) -> Dict:
+        return {'claims': self.claims, 'conflicts': self.conflicts, 'retried': self.retried,
+            'retry_reached': self.retry_reached, 'no_valid_host': self.no_valid_host,
+            'latencies': self.latencies, 'retried_latencies': self.retried_latencies}
+
+
+def partition_events(ticks: List[List[VMEvent]], n_workers: int) -> List[List[List[WORKER_EVENT_TYPE]]]:
+    """ Split every tick among the workers. All events of a VM go to the same
+    worker, so its delete always follows its create.
+    :returns: [worker][tick] -> events """
+    shares = [[] for _ in range(n_workers)]  # type: List[List[List[WORKER_EVENT_TYPE]]]
+    for events in ticks:
+        tick_shares = [[] for _ in range(n_workers)]  # type: List[List[WORKER_EVENT_TYPE]]
+        for req in events:
+            worker = zlib.crc32(req.vm_uuid.encode('utf-8')) % n_workers
+            tick_shares[worker].append((req.type, req.vm_uuid, req.cores, req.ram))
+        for worker, share in enumerate(tick_shares):
+            shares[worker].append(share)
+    return shares
+
+
+def _run_worker(worker: SchedulerWorker, ticks: List[List[WORKER_EVENT_TYPE]], barrier,
+        conn, timeout: float) -> None:
+    try:
+        barrier.wait(timeout)
+        worker.run(ticks, barrier, timeout)
+    except threading.BrokenBarrierError:
+        # another worker failed, or the parent gave up on the run
+        conn.close()
+        return
+    except BaseException:
+        # release the parent and the other workers waiting at the barrier
+        barrier.abort()
+        raise
+    conn.send(worker.stats())
+    conn.close()
+
+
+def simulate(f_servers: Dict[str, List], ticks: List[List[VMEvent]], n_workers: int,
+        refresh_interval: int = 1, max_attempts: int = 3, seed: int = 0,
+        timeout: float = 600.0) -> Dict:
+    """ Replay the ticks with n_workers concurrent scheduler processes
+    sharing one cluster state.
+    :f_servers: parsed "Servers" section of a topology file
+    :timeout: seconds the workers may take for one tick
+    :returns: throughput, conflict and latency statistics of the run
+    :raises RuntimeError: if a worker failed or timed out """
+    ctx = multiprocessing.get_context('fork')
+    view = ArrayCluster()
+    view.load_servers(f_servers)
+    state = SharedClusterState(view, ctx)
+    shares = partition_events(ticks, n_workers)
+    barrier = ctx.Barrier(n_workers + 1)
+
+    processes = []
+    pipes = []
+    for worker_id in range(n_workers):
+        worker = SchedulerWorker(state, view, refresh_interval, max_attempts, seed + worker_id)
+        recv_conn, send_conn = ctx.Pipe(duplex=False)
+        process = ctx.Process(target=_run_worker, args=(worker, shares[worker_id], barrier,
+            send_conn, timeout))
+        process.start()
+        send_conn.close()
+        processes.append(process)
+        pipes.append(recv_conn)
+
+    # start all workers at once, then follow them tick by tick
+    try:
+        barrier.wait(timeout)
+        start_time = time.perf_counter()
+        for _ in ticks:
+            barrier.wait(timeout)
+        wall_secs = time.perf_counter() - start_time
+        worker_stats = [conn.recv() for conn in pipes]
+    except (threading.BrokenBarrierError, EOFError):
+        for process in processes:
+            process.terminate()
+            process.join()
+        raise RuntimeError('a scheduler worker failed or took more than {} secs for a tick'.format(
+            timeout))
+    for process in processes:
+        process.join()
+
+    totals = {name: sum(stats[name] for stats in worker_stats)
+        for name in ('claims', 'conflicts', 'retried', 'retry_reached', 'no_valid_host')}
+    latencies = sorted(lat for stats in worker_stats for lat in stats['latencies'])
+    retried_latencies = sorted(lat for stats in worker_stats for lat in stats['retried_latencies'])
+    n_events = sum(len(events) for events in ticks)
+    result = dict(workers=n_workers, events=n_events, creates=len(latencies),
+        wall_secs=wall_secs, events_per_sec=n_events / wall_secs if wall_secs > 0 else 0.0,
+        conflict_rate=totals['conflicts'] / totals['claims'] if totals['claims'] else 0.0,
+        retry_rate=totals['retried'] / len(latencies) if latencies else 0.0,
+        p50_microsec=percentile(latencies, 50), p99_microsec=percentile(latencies, 99),
+        retried_p50_microsec=percentile(retried_latencies, 50),
+        retried_p99_microsec=percentile(retried_latencies, 99))
+    result.update(totals)
+    return result
@@ -0,0 +1,192 @@
+import glog
+import json
+import sys
+from array import array
+from typing import IO, Any, Dict, Iterator, List, Tuple
+
+import schedulers.constants as const
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.workload import VMEvent
+
+COMPACT_SEPARATORS = (',', ':')
+
+
+def allocation_record(vm: VMEvent, server_id: str, timedelta: float) -> Dict:
+    """ Convert an allocation into its output formatted dict.
+    :vm: the create or delete event
+    :server_id: id of the server the VM was placed on, or const.FAILED_STR
+    :timedelta: scheduling latency in microseconds """
+    if vm.type == const.VM_CREATE_STR:
+        return dict(type=vm.type, vdc_uuid=vm.vdc_uuid,
+            vm_uuid=vm.vm_uuid, cores=vm.cores, ram_in_gb=vm.ram,
+            server=server_id, elapsed_microsec=timedelta)
+    elif vm.type == const.VM_DELETE_STR:
+        # delete events do not have VM cores, ram, and some other info
+        return dict(type=vm.type, vdc_uuid=vm.vdc_uuid, vm_uuid=vm.vm_uuid,
+            server=server_id, elapsed_microsec=timedelta)
+    glog.error('ERROR: invalid event type: {}. Only supported are: create, delete. Exit.'.format(vm.type))
+    sys.exit(1)
+
+
+class AllocationLog(object):
+    """ In-memory allocation records stored column-wise: the events, the
+    server ids (shared with the Server objects) and a double array of
+    latencies. Iterating yields (vm, server_id, timedelta) in insertion order. """
+
+    def __init__(self):
+        self._vms = []  # type: List[VMEvent]
+        self._server_ids = []  # type: List[str]
+        self._timedeltas = array('d')
+
+    def __len__(self) -> int:
+        return len(self._vms)
+
+    def __iter__(self) -> Iterator[Tuple[VMEvent, str, float]]:
+        return zip(self._vms, self._server_ids, self._timedeltas)
+
+    def timedeltas(self) -> array:
+        """ Latencies of all records in microseconds. """
+        return self._timedeltas
+
+    def append(self, vm: VMEvent, server_id: str, timedelta: float) -> None:
+        self._vms.append(vm)
+        self._server_ids.append(server_id)
+        self._timedeltas.append(timedelta)
+
+
+class JsonLinesAllocationWriter(object):
+    """ Writes allocations to a JSON Lines file as they are produced.
+    Each line holds one tick, {"tick_N": [record, ...]}, and is written by
+    flush_tick() at the end of the tick, or at the latest when the next tick
+    starts, so only the current tick is kept in memory.
+    The last line holds {"failure_stats": {...}}. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'w')  # type: IO[str]
+        self._tick = None  # type: str
+        self._records = []  # type: List[Dict]
+
+    def write(self, vm: VMEvent, server_id: str, timedelta: float) -> None:
+        if vm.tick != self._tick:
+            self.flush_tick()
+            self._tick = vm.tick
+        self._records.append(allocation_record(vm, server_id, timedelta))
+
+    def flush_tick(self) -> None:
+        """ Write out the records of the current tick. """
+        if self._records:
+            self._write_line({self._tick: self._records})
+            self._file.flush()
+            self._records = []
+
+    def close(self, failure_stats: Dict) -> None:
+        self.flush_tick()
+        self._write_line({const.STATS_STR: failure_stats})
+        self._file.close()
+
+    def _write_line(self, obj: Dict) -> None:
+        self._file.write(json.dumps(obj, separators=COMPACT_SEPARATORS))
+        self._file.write('\n')
+
+
+def _line_key(line: bytes) -> str:
+    """ Key of a one-key JSON object line, {"key": value}, without decoding the value. """
+    text = line.decode('utf-8')
+    return json.decoder.scanstring(text, text.index('"') + 1)[0]
+
+
+def _lines(src: IO[bytes]) -> Iterator[Tuple[str, int, bool, bytes]]:
+    """ (key, offset, recurring, line) of every non-blank line of a stream.
+    A line recurs if its key may have appeared before, other than on the
+    line just before it: a tick not after all earlier ticks, or another key
+    seen before. Ticks normally increase, so recurring lines are rare, and
+    telling them apart takes constant memory. """
+    last_key = None
+    last_recurring = False
+    last_tick = -1
+    other_keys = set()
+    offset = 0
+    for line in src:
+        if line.strip():
+            key = _line_key(line)
+            if key == last_key:
+                recurring = last_recurring
+            else:
+                tick = None
+                if key.startswith(WorkloadReplayer.WORKLOAD_TICK_PREFIX):
+                    try:
+                        tick = WorkloadReplayer.tick_index(key)
+                    except ValueError:
+                        pass
+                if tick is None:
+                    recurring = key in other_keys
+                    other_keys.add(key)
+                else:
+                    recurring = tick <= last_tick
+                    last_tick = max(tick, last_tick)
+            yield key, offset, recurring, line
+            last_key = key
+            last_recurring = recurring
+        offset += len(line)
+
+
+def _merge(value: Any, line_value: Any) -> Any:
+    if isinstance(value, list) and isinstance(line_value, list):
+        value.extend(line_value)
+        return value
+    return line_value
+
+
+def json_lines_to_allocs(jsonl_path: str, output_path: str) -> None:
+    """ Convert a JsonLinesAllocationWriter stream into the allocs.json layout
+    written by NovaFilter.output_allocations, one tick at a time. The records
+    of a tick spread over several lines, e.g. a tick id reused by the
+    scheduling service, are merged into one entry where it first appears.
+    Other values appearing more than once keep their last value.
+    Adjacent lines of a tick are merged as they are read. Only the offsets
+    of the lines of a tick appearing again after other ticks are kept, so
+    memory is bounded by the largest tick and these rare lines. """
+    # first pass: only the key of every line is decoded, to find recurring lines
+    recurring = dict()  # type: Dict[str, List[int]]
+    with open(jsonl_path, 'rb') as src:
+        for key, offset, is_recurring, _ in _lines(src):
+            if is_recurring:
+                recurring.setdefault(key, []).append(offset)
+
+    with open(jsonl_path, 'rb') as src, open(jsonl_path, 'rb') as lookup, \
+            open(output_path, 'w') as dst:
+        first = True
+
+        def write(key, value):
+            nonlocal first
+            for offset in recurring.pop(key, ()):
+                lookup.seek(offset)
+                value = _merge(value, json.loads(lookup.readline().decode('utf-8'))[key])
+            dst.write('\n    ' if first else ',\n    ')
+            first = False
+            dst.write(json.dumps(key))
+            dst.write(': ')
+            # same as nesting the value one level deep with json.dump(indent=4)
+            dst.write(json.dumps(value, indent=4).replace('\n', '\n    '))
+
+        dst.write('{')
+        group_key = None
+        group_value = None
+        for key, _, is_recurring, line in _lines(src):
+            if key != group_key or is_recurring:
+                if group_key is not None:
+                    write(group_key, group_value)
+                    group_key = None
+                if is_recurring:
+                    # written with the first appearance of the key, unless
+                    # this is it, i.e. a tick that came late
+                    if key in recurring:
+                        write(key, None)
+                    continue
+                group_key = key
+                group_value = None
+            group_value = _merge(group_value, json.loads(line.decode('utf-8'))[key])
+        if group_key is not None:
+            write(group_key, group_value)
+        dst.write('}' if first else '\n}')
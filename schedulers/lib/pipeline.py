@@ -0,0 +1,229 @@
+import glog
+import multiprocessing
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from schedulers.lib.output import JsonLinesAllocationWriter
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.workload import VMEvent
+
+# The pipeline runs the workload decoding and the allocation output in their
+# own processes, so they overlap with scheduling instead of taking turns with
+# it. Processes rather than threads, since decoding and serializing JSON hold
+# the GIL. Stages exchange whole ticks over bounded queues as plain tuples:
+# (tick_id, [(type, vdc_uuid, vm_uuid, cores, ram), ...]) from the decoder,
+# [(tick, type, vdc_uuid, vm_uuid, cores, ram, server_id, timedelta), ...]
+# to the writer.
+DECODED_TICK_TYPE = Tuple[str, List[Tuple]]
+
+# a stage is reported as the bottleneck if the scheduler found the queue
+# from it empty, or the queue to it full, at least this often
+BOTTLENECK_RATIO = 0.5
+
+
+class QueueStats(object):
+    """ Depth of a pipeline queue and time the scheduler blocked on it,
+    sampled by the scheduler on every get or put. """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self.samples = 0
+        self.depth_sum = 0
+        self.empty = 0
+        self.full = 0
+        self.wait_secs = 0.0
+
+    def sample(self, queue) -> None:
+        try:
+            depth = queue.qsize()
+        except NotImplementedError:
+            # macOS has no sem_getvalue; the wait times still tell the story
+            return
+        self.samples += 1
+        self.depth_sum += depth
+        if depth == 0:
+            self.empty += 1
+        elif depth >= self.maxsize:
+            self.full += 1
+
+    def to_dict(self) -> Dict[str, float]:
+        samples = self.samples or 1
+        return {'mean_depth': self.depth_sum / samples, 'max_depth': self.maxsize,
+            'empty_ratio': self.empty / samples, 'full_ratio': self.full / samples,
+            'wait_secs': self.wait_secs}
+
+
+def pipeline_summary(input_stats: QueueStats, output_stats: QueueStats,
+        wall_secs: float) -> Dict:
+    """ Queue metrics of a pipelined run, and the stage limiting it.
+    The scheduler is the bottleneck if it rarely waits for either queue.
+    :output_stats: None if the output was not pipelined """
+    wait_secs = input_stats.wait_secs
+    summary = {'wall_secs': wall_secs, 'input_queue': input_stats.to_dict()}
+    bottleneck = 'schedule'
+    if output_stats is not None:
+        wait_secs += output_stats.wait_secs
+        summary['output_queue'] = output_stats.to_dict()
+        if summary['output_queue']['full_ratio'] >= BOTTLENECK_RATIO:
+            bottleneck = 'output'
+    if summary['input_queue']['empty_ratio'] >= BOTTLENECK_RATIO:
+        bottleneck = 'decode'
+    summary['schedule_secs'] = max(0.0, wall_secs - wait_secs)
+    summary['bottleneck'] = bottleneck
+    return summary
+
+
+def _decode_ticks(replayer: WorkloadReplayer, queue) -> None:
+    """ Decoder process: replay every remaining tick into the queue, followed
+    by None. A failing replayer sends its exit status instead. """
+    status = 1
+    try:
+        events = replayer.replay()
+        while len(events) > 0:
+            queue.put((events[0].tick, [(req.type, req.vdc_uuid, req.vm_uuid, req.cores, req.ram)
+                for req in events]))
+            events = replayer.replay()
+        status = None
+    except SystemExit as e:
+        status = e.code or 1
+    finally:
+        queue.put(status)
+
+
+class PrefetchingReplayer(object):
+    """ Replays another replayer's ticks, decoded ahead in a separate process.
+    Up to depth decoded ticks wait in a bounded queue. The decoder is forked
+    on the first replay(), so the wrapped replayer may be seeked before. """
+
+    def __init__(self, replayer: WorkloadReplayer, depth: int = 8):
+        self.replayer = replayer
+        self.depth = depth
+        self.currTick = replayer.currTick
+        self.stats = QueueStats('input', depth)
+        self._queue = None
+        self._process = None
+        self._done = False
+
+    @property
+    def keys(self) -> List[str]:
+        """ All ticks if the wrapped replayer knows them up front, else empty. """
+        return self.replayer.keys
+
+    def seek(self, tick: int) -> None:
+        if self._process is not None:
+            glog.error('ERROR: cannot seek a replay that has already started. Exit.')
+            sys.exit(1)
+        self.replayer.seek(tick)
+        self.currTick = self.replayer.currTick
+
+    def _start(self) -> None:
+        ctx = multiprocessing.get_context('fork')
+        self._queue = ctx.Queue(self.depth)
+        self._process = ctx.Process(target=_decode_ticks, args=(self.replayer, self._queue))
+        self._process.daemon = True
+        self._process.start()
+
+    def replay(self) -> List[VMEvent]:
+        """ Replay workload by ticks.
+        :returns: list of workloads within current tick """
+        if self._done:
+            return []
+        if self._process is None:
+            self._start()
+        self.stats.sample(self._queue)
+        start_time = time.perf_counter()
+        item = self._queue.get()
+        self.stats.wait_secs += time.perf_counter() - start_time
+        if not isinstance(item, tuple):
+            self._done = True
+            self.close()
+            if item is not None:
+                glog.error('ERROR: workload decoder exited with status {}. Exit.'.format(item))
+                sys.exit(1)
+            return []
+        tick_id, events = item
+        tick_id = sys.intern(tick_id)
+        intern = sys.intern
+        self.currTick += 1
+        return [VMEvent(tick_id, intern(req_type), intern(vdc_uuid), intern(vm_uuid), cores, ram)
+            for req_type, vdc_uuid, vm_uuid, cores, ram in events]
+
+    def close(self) -> None:
+        """ Stop the decoder, which may still be decoding ticks no one will replay. """
+        if self._process is not None:
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process.join()
+            self._process = None
+
+
+def _write_allocations(path: str, queue) -> None:
+    """ Writer process: write every tick of records from the queue until the
+    failure stats arrive. """
+    writer = JsonLinesAllocationWriter(path)
+    while True:
+        item = queue.get()
+        if isinstance(item, dict):
+            writer.close(item)
+            return
+        for tick, req_type, vdc_uuid, vm_uuid, cores, ram, server_id, timedelta in item:
+            writer.write(VMEvent(tick, req_type, vdc_uuid, vm_uuid, cores, ram), server_id,
+                timedelta)
+        writer.flush_tick()
+
+
+class PipelinedAllocationWriter(object):
+    """ Output sink handing every tick of allocations to a process that writes
+    them with JsonLinesAllocationWriter, so serialization stays off the
+    scheduling path. Up to depth ticks wait in a bounded queue.
+
+    The writer only finishes once close() hands it the failure stats. If the
+    run exits without closing the sink, e.g. on an error, the writer is a
+    daemon and is terminated, leaving the ticks written so far. """
+
+    def __init__(self, path: str, depth: int = 8):
+        self.path = path
+        self.stats = QueueStats('output', depth)
+        ctx = multiprocessing.get_context('fork')
+        self._queue = ctx.Queue(depth)
+        # close() waits for the writer to read everything, so there is no need
+        # to wait at exit for queued ticks that a terminated writer never reads
+        self._queue.cancel_join_thread()
+        self._process = ctx.Process(target=_write_allocations, args=(path, self._queue))
+        self._process.daemon = True
+        self._process.start()
+        self._tick = None  # type: str
+        self._records = []  # type: List[Tuple]
+
+    def write(self, vm: VMEvent, server_id: str, timedelta: float) -> None:
+        if vm.tick != self._tick:
+            self.flush_tick()
+            self._tick = vm.tick
+        self._records.append((vm.tick, vm.type, vm.vdc_uuid, vm.vm_uuid, vm.cores, vm.ram,
+            server_id, timedelta))
+
+    def flush_tick(self) -> None:
+        """ Hand the records of the current tick over to the writer. """
+        self._put(self._records)
+        self._records = []
+
+    def _put(self, item) -> None:
+        if not item:
+            return
+        self.stats.sample(self._queue)
+        start_time = time.perf_counter()
+        self._queue.put(item)
+        self.stats.wait_secs += time.perf_counter() - start_time
+
+    def close(self, failure_stats: Dict) -> None:
+        """ Hand over the last tick and the failure stats, and wait until the
+        writer has written them. """
+        self.flush_tick()
+        self._queue.put(dict(failure_stats))
+        self._process.join()
+        if self._process.exitcode != 0:
+            glog.error('ERROR: allocation writer exited with status {}. Exit.'.format(
+                self._process.exitcode))
+            sys.exit(1)
@@ -0,0 +1,259 @@
+import json
+import os
+import signal
+import time
+from typing import IO, Callable, Dict, List, Tuple
+
+from schedulers.lib.replay import WorkloadReplayer
+
+# frames more than this deep below the scheduler's entry point are dropped
+MAX_DEPTH = 128
+# the overhead is checked, and the interval adapted, every this many samples
+ADAPT_SAMPLES = 50
+# root frame of samples outside every scheduling phase
+NO_PHASE = 'other'
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+def parse_tick_range(spec: str) -> Tuple[int, int]:
+    """ 'START:END' -> (START, END), either may be omitted.
+    :returns: (first tick number, tick number after the last), None if open """
+    start, sep, end = spec.partition(':')
+    if not sep:
+        raise ValueError('expected START:END, got {}'.format(spec))
+    start = int(start) if start else None
+    end = int(end) if end else None
+    if start is not None and end is not None and end <= start:
+        raise ValueError('empty tick range {}'.format(spec))
+    return start, end
+
+
+def frame_name(code) -> str:
+    """ Name of a function in a flamegraph, e.g. place_vm (novafilter.py:230) """
+    return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename),
+        code.co_firstlineno)
+
+
+class SamplingProfiler(object):
+    """ Statistical profiler of the scheduling hot path.
+
+    From the first tick in the profiled range on, a SIGPROF timer interrupts
+    the process every interval seconds of CPU time, and while the scheduler
+    handles a profiled tick the stack below its entry point is counted.
+    Stacks are attributed to the innermost scheduling phase they pass
+    through (see attach), so samples can be compared with PhaseStats. The
+    samples of a tick share its CPU time, as the kernel may deliver fewer
+    signals than asked for. The timer keeps running between ticks, since
+    ticks are often shorter than the interval, and is stopped after the
+    profiled range.
+
+    The time spent taking samples is measured. Whenever it exceeds
+    max_overhead of the profiled time, the interval is doubled, so the
+    profiler can stay enabled on long replays. Only the main thread is
+    sampled, and SIGPROF must not be used by anything else. """
+
+    def __init__(self, output: IO[str], output_format: str = 'collapsed',
+            interval: float = 0.002, max_overhead: float = 0.02,
+            first_tick: int = None, end_tick: int = None):
+        """
+        :output: file receiving the profile when the profiler is closed
+        :output_format: 'collapsed' for one 'frame;frame;... value' line per
+        stack, as read by flamegraph.pl, or 'speedscope' for one profile per tick
+        :interval: seconds of CPU time between samples
+        :max_overhead: largest fraction of the profiled time spent sampling
+        :first_tick, end_tick: profile ticks numbered first_tick up to,
+        excluding, end_tick; None for no bound
+        """
+        if output_format not in ('collapsed', 'speedscope'):
+            raise ValueError('unknown profile format {}'.format(output_format))
+        self.output = output
+        self.output_format = output_format
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.first_tick = first_tick
+        self.end_tick = end_tick
+
+        self._root = None
+        self._phases = dict()  # type: Dict[object, str]  # code object -> phase
+        # (tick_id, CPU secs, {stack: samples}) of every profiled tick with
+        # samples; stacks are tuples of code objects, innermost first
+        self.ticks = []  # type: List[Tuple[str, float, Dict[Tuple, int]]]
+        self._samples = None  # type: Dict[Tuple, int]
+        self._tick_id = None  # type: str
+        self._armed = False
+        self._start_time = 0.0
+        self._start_cpu_time = 0.0
+        self._previous_handler = None
+        self._installed = False
+
+        self.samples = 0
+        self.sample_secs = 0.0
+        self.profiled_secs = 0.0
+        self.profiled_ticks = 0
+        # samples, sample_secs and profiled_secs at the last overhead check
+        self._checked = (0, 0.0, 0.0)
+
+    def attach(self, root: Callable, phases: List[Tuple[Callable, str]]) -> None:
+        """ Profile the stacks below root, attributing them to the given phases.
+        :root: the scheduler's entry point, called once per tick
+        :phases: (function or method, phase name) pairs """
+        self._root = _code(root)
+        for func, phase in phases:
+            self._phases[_code(func)] = phase
+
+    def in_range(self, tick_id: str) -> bool:
+        if self.first_tick is None and self.end_tick is None:
+            return True
+        tick = WorkloadReplayer.tick_index(tick_id)
+        return ((self.first_tick is None or tick >= self.first_tick) and
+            (self.end_tick is None or tick < self.end_tick))
+
+    def _arm(self) -> None:
+        if not self._installed:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+            self._installed = True
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self._armed = True
+
+    def _disarm(self) -> None:
+        if self._armed:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            self._armed = False
+
+    def start_tick(self, tick_id: str) -> None:
+        """ Start sampling, if tick_id is in the profiled range. """
+        if not self.in_range(tick_id):
+            if self.end_tick is not None and WorkloadReplayer.tick_index(tick_id) >= self.end_tick:
+                self._disarm()
+            return
+        self._tick_id = tick_id
+        self._samples = dict()
+        if not self._armed:
+            self._arm()
+        self._start_time = time.perf_counter()
+        self._start_cpu_time = time.process_time()
+
+    def stop_tick(self) -> None:
+        """ Stop sampling the current tick, and adapt the interval to the overhead. """
+        if self._samples is None:
+            return
+        samples = self._samples
+        self._samples = None
+        cpu_secs = time.process_time() - self._start_cpu_time
+        self.profiled_secs += time.perf_counter() - self._start_time
+        self.profiled_ticks += 1
+        if samples:
+            self.ticks.append((self._tick_id, cpu_secs, samples))
+        checked_samples, sample_secs, profiled_secs = self._checked
+        if self.samples - checked_samples >= ADAPT_SAMPLES:
+            if (self.sample_secs - sample_secs >
+                    self.max_overhead * (self.profiled_secs - profiled_secs)):
+                self.interval *= 2
+                self._arm()
+            self._checked = (self.samples, self.sample_secs, self.profiled_secs)
+
+    def _sample(self, signum, frame) -> None:
+        samples = self._samples
+        if samples is None:
+            # between ticks
+            return
+        start_time = time.perf_counter()
+        stack = []
+        root = self._root
+        while frame is not None and len(stack) < MAX_DEPTH:
+            code = frame.f_code
+            stack.append(code)
+            if code is root:
+                break
+            frame = frame.f_back
+        stack = tuple(stack)
+        samples[stack] = samples.get(stack, 0) + 1
+        self.samples += 1
+        self.sample_secs += time.perf_counter() - start_time
+
+    def overhead(self) -> float:
+        """ Fraction of the profiled time spent taking samples. """
+        return self.sample_secs / self.profiled_secs if self.profiled_secs > 0 else 0.0
+
+    def phase_of(self, stack: Tuple) -> str:
+        for code in stack:
+            if code in self._phases:
+                return self._phases[code]
+        return NO_PHASE
+
+    def summary(self) -> Dict:
+        """ Samples per phase, and the cost of taking them. """
+        phases = dict()  # type: Dict[str, int]
+        for _, _, samples in self.ticks:
+            for stack, count in samples.items():
+                phase = self.phase_of(stack)
+                phases[phase] = phases.get(phase, 0) + count
+        return {'ticks': self.profiled_ticks, 'samples': self.samples,
+            'interval_ms': self.interval * 1000, 'profiled_secs': self.profiled_secs,
+            'sample_secs': self.sample_secs, 'overhead': self.overhead(),
+            'phases': {phase: count / (self.samples or 1) for phase, count in phases.items()}}
+
+    def write_collapsed(self) -> None:
+        """ One line per distinct stack over all profiled ticks, rooted at its
+        phase. Values are estimated microseconds of CPU time. """
+        values = dict()  # type: Dict[str, float]
+        for _, cpu_secs, samples in self.ticks:
+            sample_usecs = cpu_secs * 10**6 / sum(samples.values())
+            for stack, count in samples.items():
+                line = ';'.join([self.phase_of(stack)] +
+                    [frame_name(code) for code in reversed(stack)])
+                values[line] = values.get(line, 0.0) + count * sample_usecs
+        for line in sorted(values):
+            self.output.write('{} {}\n'.format(line, int(round(values[line]))))
+
+    def write_speedscope(self) -> None:
+        """ A speedscope file with one sampled profile per profiled tick,
+        weighted in milliseconds. """
+        frames = []  # type: List[Dict]
+        frame_index = dict()  # type: Dict[object, int]
+
+        def index(key, name, code=None):
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frame = {'name': name}
+                if code is not None:
+                    frame['file'] = code.co_filename
+                    frame['line'] = code.co_firstlineno
+                frames.append(frame)
+            return frame_index[key]
+
+        profiles = []
+        for tick_id, cpu_secs, samples in self.ticks:
+            sample_msecs = cpu_secs * 1000 / sum(samples.values())
+            stacks = []
+            weights = []
+            for stack, count in samples.items():
+                phase = self.phase_of(stack)
+                stacks.append([index(('phase', phase), phase)] +
+                    [index(code, frame_name(code), code) for code in reversed(stack)])
+                weights.append(count * sample_msecs)
+            profiles.append({'type': 'sampled', 'name': tick_id, 'unit': 'milliseconds',
+                'startValue': 0, 'endValue': sum(weights), 'samples': stacks,
+                'weights': weights})
+        json.dump({'$schema': SPEEDSCOPE_SCHEMA, 'name': 'novafilter',
+            'shared': {'frames': frames}, 'profiles': profiles}, self.output,
+            separators=(',', ':'))
+
+    def close(self) -> None:
+        """ Stop sampling, restore the SIGPROF handler and write the profile. """
+        self.stop_tick()
+        self._disarm()
+        if self._installed:
+            signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+            self._installed = False
+        if self.output_format == 'speedscope':
+            self.write_speedscope()
+        else:
+            self.write_collapsed()
+        self.output.close()
+
+
+def _code(func: Callable):
+    """ Code object of a function or bound method. """
+    return getattr(func, '__func__', func).__code__
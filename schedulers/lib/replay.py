@@ -1,4 +1,8 @@
+import glog
 import json
+import sys
+from typing import IO, Any, Iterator, List, Tuple
+
 from schedulers.lib.workload import VMEvent
 
 class WorkloadReplayer(object):
@@ -22,13 +26,33 @@ class WorkloadReplayer(object):
             # extract objects that have keys with a "tick_" prefix
             keys = list(filter(lambda k: k.startswith(WorkloadReplayer.WORKLOAD_TICK_PREFIX), keys))
             # sort keys in monotonically increasing order. the keys have timestamp suffix. e.g. tick_123456
-            keys = sorted(keys, key=lambda k: int(k[len(WorkloadReplayer.WORKLOAD_TICK_PREFIX):]))
+            keys = sorted(keys, key=WorkloadReplayer.tick_index)
             self.keys = keys
             for tick_id, events in workload.items():
-                self.workload[tick_id] = []
-                for event in events:
-                    self.workload[tick_id].append(VMEvent(tick_id, event["type"], event["vdc_uuid"],
-                        event["vm_uuid"], event.get("cores", 0), event.get("ram_in_gb", 0.0)))
+                self.workload[tick_id] = self.make_events(tick_id, events)
+
+    def clone(self) -> 'WorkloadReplayer':
+        """ New replayer over the same loaded workload, starting from the first
+        tick. Events are shared, not copied. """
+        replayer = WorkloadReplayer()
+        replayer.keys = self.keys
+        replayer.workload = self.workload
+        return replayer
+
+    @staticmethod
+    def make_events(tick_id: str, events: List[dict]) -> List[VMEvent]:
+        """ Convert the parsed JSON events of one tick into VMEvents.
+        UUIDs are interned so that a VM's create and delete events, and all VMs
+        of a VDC, share one string. """
+        tick_id = sys.intern(tick_id)
+        return [VMEvent(tick_id, sys.intern(event["type"]), sys.intern(event["vdc_uuid"]),
+                sys.intern(event["vm_uuid"]), event.get("cores", 0),
+                event.get("ram_in_gb", 0.0)) for event in events]
+
+    @staticmethod
+    def tick_index(tick_id: str) -> int:
+        """ Numeric suffix of a tick key. e.g. tick_123456 -> 123456 """
+        return int(tick_id[len(WorkloadReplayer.WORKLOAD_TICK_PREFIX):])
 
     def replay(self):
         """ Replay workload by ticks. 
@@ -40,3 +64,168 @@ class WorkloadReplayer(object):
         else:
             return []
 
+    def seek(self, tick: int) -> None:
+        """ Continue the replay from the tick at index tick of self.keys. """
+        self.currTick = tick
+
+
+
+class StreamingWorkloadReplayer(WorkloadReplayer):
+    """ WorkloadReplayer that parses the workload file one tick at a time as
+    replay() is called, so memory stays bounded by the largest tick.
+
+    Two formats are understood:
+    - line-delimited (.jsonl/.ndjson): one {"tick_N": [...]} object per line
+    - the regular workload JSON, parsed incrementally
+
+    Unlike WorkloadReplayer, ticks are not sorted after loading; they must
+    appear in the file in increasing order. The ticks are not known up
+    front, so self.keys stays empty and self.currTick counts the ticks
+    replayed so far. """
+    LINE_DELIMITED_SUFFIXES = ('.jsonl', '.ndjson')
+
+    def __init__(self):
+        super().__init__()
+        self._file = None  # type: IO[str]
+        self._ticks = iter(())  # type: Iterator[Tuple[str, Any]]
+
+    def load_workload(self, workload_path):
+        """
+        Open workload file for incremental replay.
+
+        Parameters:
+        workload_path (string): path to workload file
+        """
+        self.close()
+        self._file = open(workload_path)
+        if workload_path.endswith(StreamingWorkloadReplayer.LINE_DELIMITED_SUFFIXES):
+            items = iter_json_lines_items(self._file)
+        else:
+            items = iter_json_object_items(self._file)
+        self._ticks = self._tick_items(items)
+
+    def _tick_items(self, items: Iterator[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+        last_index = None
+        for tick_id, events in items:
+            if not tick_id.startswith(WorkloadReplayer.WORKLOAD_TICK_PREFIX):
+                continue
+            index = WorkloadReplayer.tick_index(tick_id)
+            if last_index is not None and index <= last_index:
+                glog.error('ERROR: tick {} appears after tick_{}. Streamed workloads '
+                    'must list ticks in increasing order. Exit.'.format(tick_id, last_index))
+                sys.exit(1)
+            last_index = index
+            yield tick_id, events
+
+    def replay(self):
+        """ Parse and replay the next tick.
+        :returns: list of workloads within current tick """
+        for tick_id, events in self._ticks:
+            self.currTick += 1
+            return self.make_events(tick_id, events)
+        self.close()
+        return []
+
+    def seek(self, tick: int) -> None:
+        """ Continue the replay from the tick-th tick. Ticks can only be
+        skipped forwards, by parsing them. """
+        if tick < self.currTick:
+            glog.error('ERROR: cannot seek a streamed workload back to tick {} from tick {}. '
+                'Exit.'.format(tick, self.currTick))
+            sys.exit(1)
+        while self.currTick < tick and len(self.replay()) > 0:
+            pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def iter_json_lines_items(fp: IO[str]) -> Iterator[Tuple[str, Any]]:
+    """ Yield (key, value) pairs from a file holding one JSON object per line. """
+    for line in fp:
+        line = line.strip()
+        if line:
+            for item in json.loads(line).items():
+                yield item
+
+
+def iter_json_object_items(fp: IO[str], chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Any]]:
+    """ Incrementally yield (key, value) pairs of the top-level JSON object in
+    fp. Only one value is held in memory at a time, plus a read buffer. """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill(read_size):
+        nonlocal buf, pos, eof
+        chunk = fp.read(read_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def next_char():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                return buf[pos] if pos < len(buf) else ''
+            fill(chunk_size)
+
+    def decode():
+        nonlocal pos
+        read_size = chunk_size
+        while True:
+            next_char()
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                value, end = None, len(buf)
+            # a value ending at the buffer end may be truncated, e.g. a number
+            if end < len(buf) or eof:
+                pos = end
+                return value
+            fill(read_size)
+            read_size *= 2
+
+    def expect(chars):
+        nonlocal pos
+        char = next_char()
+        if char not in chars:
+            raise ValueError('malformed workload: expected one of {!r} but found {!r}'.format(
+                chars, char))
+        pos += 1
+        return char
+
+    expect('{')
+    if next_char() == '}':
+        return
+    while True:
+        key = decode()
+        expect(':')
+        value = decode()
+        yield key, value
+        if expect(',}') == '}':
+            return
+
+
+def write_json_lines(workload_path: str, output_path: str) -> int:
+    """ Convert a workload JSON file into the line-delimited format, one tick
+    per line, without loading the whole workload. Ticks keep their order in
+    the source file.
+    :returns: number of ticks written """
+    with open(workload_path) as src, open(output_path, 'w') as dst:
+        n_ticks = 0
+        for tick_id, events in iter_json_object_items(src):
+            if not tick_id.startswith(WorkloadReplayer.WORKLOAD_TICK_PREFIX):
+                continue
+            dst.write(json.dumps({tick_id: events}, separators=(',', ':')))
+            dst.write('\n')
+            n_ticks += 1
+    return n_ticks
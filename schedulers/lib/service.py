@@ -0,0 +1,258 @@
+import asyncio
+import glog
+import json
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import schedulers.constants as const
+from schedulers.lib.latency import LogHistogram
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.workload import VMEvent
+
+# Wire protocol: one JSON object per line, over TCP or a Unix socket.
+# requests:
+#   {"id": 1, "type": "create", "vdc_uuid": "vdc1", "vm_uuid": "vm1", "cores": 2, "ram_in_gb": 4}
+#   {"id": 2, "type": "delete", "vdc_uuid": "vdc1", "vm_uuid": "vm1"}
+#   {"id": 3, "type": "stats"}
+# responses, in request order on every connection:
+#   {"id": 1, "server": "p0_r0_s0"}   ("failed" if the VM could not be placed)
+#   {"id": 3, "stats": {...}}
+#   {"id": 4, "error": "..."}
+ID_STR = 'id'
+ERROR_STR = 'error'
+STATS_REQUEST_STR = 'stats'
+COMPACT_SEPARATORS = (',', ':')
+
+
+def encode_message(msg: Dict) -> bytes:
+    return json.dumps(msg, separators=COMPACT_SEPARATORS).encode('utf-8') + b'\n'
+
+
+def parse_request(msg: Dict) -> VMEvent:
+    """ Build the VMEvent of a create or delete request.
+    :raises ValueError: if the request is malformed """
+    req_type = msg.get(const.TYPE_STR)
+    vm_uuid = msg.get(const.VM_UUID_STR)
+    if not isinstance(vm_uuid, str):
+        raise ValueError('missing vm_uuid')
+    vdc_uuid = sys.intern(str(msg.get(const.VDC_UUID_STR, '')))
+    if req_type == const.VM_CREATE_STR:
+        cores = msg.get(const.CORES_STR)
+        ram = msg.get(const.RAM_STR)
+        if not isinstance(cores, (int, float)) or not isinstance(ram, (int, float)) \
+                or cores <= 0 or ram <= 0:
+            raise ValueError('cores and ram_in_gb must be positive numbers')
+        return VMEvent(None, const.VM_CREATE_STR, vdc_uuid, sys.intern(vm_uuid), cores, ram)
+    elif req_type == const.VM_DELETE_STR:
+        return VMEvent(None, const.VM_DELETE_STR, vdc_uuid, sys.intern(vm_uuid))
+    raise ValueError('unknown request type: {}'.format(req_type))
+
+
+class ResultSink(object):
+    """ NovaFilter output sink resolving the future of every handled request
+    with the server it was placed on or deleted from. Records are forwarded
+    to the downstream sink, if any. """
+
+    def __init__(self, downstream=None):
+        self.downstream = downstream
+        self.pending = dict()  # type: Dict[VMEvent, asyncio.Future]
+
+    def write(self, vm: VMEvent, server_id: str, timedelta: float) -> None:
+        future = self.pending.pop(vm, None)
+        if future is not None and not future.done():
+            future.set_result({const.SERVER_STR: server_id})
+        if self.downstream is not None:
+            self.downstream.write(vm, server_id, timedelta)
+
+    def flush_tick(self) -> None:
+        if self.downstream is not None:
+            self.downstream.flush_tick()
+
+    def close(self, failure_stats: Dict) -> None:
+        if self.downstream is not None:
+            self.downstream.close(failure_stats)
+
+
+class SchedulingService(object):
+    """ Serves a NovaFilter scheduler to concurrent clients.
+    Requests are put on one bounded queue. A single batcher task takes the
+    first queued request, waits `window` seconds for more to arrive, and
+    hands everything queued, up to max_batch requests, to
+    NovaFilter.schedule as one tick. When the queue is full, connections are
+    not read until the scheduler catches up, so clients are pushed back by
+    TCP flow control instead of the service buffering without bound. """
+
+    def __init__(self, scheduler, window: float = 0.001, max_batch: int = 1024,
+            queue_size: int = 4096):
+        """
+        :scheduler: NovaFilter to serve. Its output sink is wrapped in a ResultSink
+        :window: seconds to wait for more requests after the first one of a batch
+        :max_batch: maximum number of requests scheduled together
+        :queue_size: maximum number of queued requests
+        """
+        self.scheduler = scheduler
+        self.sink = ResultSink(scheduler.output_sink)
+        scheduler.output_sink = self.sink
+        self.window = window
+        self.max_batch = max_batch
+        self.queue_size = queue_size
+        self.queue = None  # type: asyncio.Queue
+        self._stopped = None  # type: asyncio.Event
+
+        self.n_requests = 0
+        self.n_errors = 0
+        self.n_batches = 0
+        self.n_scheduled = 0
+        self.batch_latency = LogHistogram()  # microsecs spent in schedule() per batch
+
+    def stats(self) -> Dict[str, Any]:
+        return {'requests': self.n_requests, 'errors': self.n_errors, 'batches': self.n_batches,
+            'mean_batch_size': self.n_scheduled / self.n_batches
+                if self.n_batches else 0.0,
+            'queued': self.queue.qsize() if self.queue is not None else 0,
+            'vms': len(self.scheduler.working_set_vms),
+            'batch_latency_microsec': self.batch_latency.summary(),
+            const.STATS_STR: dict(self.scheduler.failure_stats)}
+
+    async def serve(self, host: str = None, port: int = None, path: str = None) -> None:
+        """ Serve on a Unix socket if path is given, on TCP host:port otherwise,
+        until stop() is called. """
+        self.queue = asyncio.Queue(self.queue_size)
+        self._stopped = asyncio.Event()
+        batcher = asyncio.ensure_future(self._batcher())
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        for sock in server.sockets:
+            glog.info('listening on {}'.format(sock.getsockname()))
+        try:
+            await self._stopped.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            batcher.cancel()
+
+    def stop(self) -> None:
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter) -> None:
+        """ Read requests of one client and queue them. Responses are written
+        by a separate task in request order, so clients may pipeline. """
+        loop = asyncio.get_running_loop()
+        responses = asyncio.Queue(self.queue_size)
+        responder = asyncio.ensure_future(self._respond(responses, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                future = loop.create_future()
+                try:
+                    msg = json.loads(line)
+                    req_id = msg.get(ID_STR)
+                except (ValueError, AttributeError):
+                    msg, req_id = None, None
+                await responses.put((req_id, future))
+                self.n_requests += 1
+                if msg is None or not isinstance(msg, dict):
+                    self._reject(future, 'malformed request')
+                elif msg.get(const.TYPE_STR) == STATS_REQUEST_STR:
+                    future.set_result({STATS_REQUEST_STR: self.stats()})
+                else:
+                    try:
+                        req = parse_request(msg)
+                    except ValueError as e:
+                        self._reject(future, str(e))
+                        continue
+                    await self.queue.put((req, future))
+        finally:
+            await responses.put(None)
+            await responder
+            writer.close()
+
+    async def _respond(self, responses: asyncio.Queue, writer: asyncio.StreamWriter) -> None:
+        connected = True
+        while True:
+            item = await responses.get()
+            if item is None:
+                return
+            req_id, future = item
+            result = await future
+            if not connected:
+                continue
+            result[ID_STR] = req_id
+            writer.write(encode_message(result))
+            try:
+                await writer.drain()
+            except ConnectionError:
+                connected = False
+
+    def _reject(self, future: asyncio.Future, message: str) -> None:
+        self.n_errors += 1
+        future.set_result({ERROR_STR: message})
+
+    async def _batcher(self) -> None:
+        queue = self.queue
+        while True:
+            items = [await queue.get()]
+            if self.window > 0 and queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.window)
+            while len(items) < self.max_batch and not queue.empty():
+                items.append(queue.get_nowait())
+            try:
+                self.schedule_batch(items)
+            except (Exception, SystemExit) as e:
+                # NovaFilter exits on requests it cannot handle; the batch
+                # fails, but the service goes on with the next one
+                glog.error('ERROR: scheduling a batch of {} requests failed: {!r}'.format(
+                    len(items), e))
+                self._fail_batch(items)
+
+    def _fail_batch(self, items: List[Tuple[VMEvent, asyncio.Future]]) -> None:
+        """ Reject the requests of a failed batch that were not answered yet. """
+        for req, future in items:
+            self.sink.pending.pop(req, None)
+            if not future.done():
+                self._reject(future, 'scheduling failed')
+
+    def schedule_batch(self, items: List[Tuple[VMEvent, asyncio.Future]]) -> None:
+        """ Schedule coalesced requests as one tick. Creates of VMs that exist
+        and deletes of VMs that do not are rejected here, since NovaFilter
+        treats them as fatal errors of the workload. """
+        tick_id = sys.intern('{}{}'.format(WorkloadReplayer.WORKLOAD_TICK_PREFIX, self.n_batches))
+        working_set = self.scheduler.working_set_vms
+        added, removed = set(), set()
+        events = []
+        for req, future in items:
+            vm_uuid = req.vm_uuid
+            exists = vm_uuid in added or (vm_uuid in working_set and vm_uuid not in removed)
+            if req.type == const.VM_CREATE_STR:
+                if exists:
+                    self._reject(future, 'VM {} already exists'.format(vm_uuid))
+                    continue
+                added.add(vm_uuid)
+                removed.discard(vm_uuid)
+            else:
+                if not exists:
+                    self._reject(future, 'VM {} not found'.format(vm_uuid))
+                    continue
+                removed.add(vm_uuid)
+                added.discard(vm_uuid)
+            req.tick = tick_id
+            self.sink.pending[req] = future
+            events.append(req)
+        if not events:
+            return
+
+        start_time = time.perf_counter()
+        self.scheduler.schedule(events)
+        self.batch_latency.record((time.perf_counter() - start_time) * 10**6)
+        self.n_batches += 1
+        self.n_scheduled += len(events)
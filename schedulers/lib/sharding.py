@@ -0,0 +1,144 @@
+import atexit
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+import numpy as np
+
+from schedulers.lib.array_domain import ArrayCluster, ServerSequence
+from schedulers.lib.domain import TopologyIndex
+
+
+def partition_servers(server_ids: List[str], n_shards: int) -> List[np.ndarray]:
+    """ Split the servers into at most n_shards groups of similar size. Whole
+    pods are kept together if there are enough pods, else whole racks, else
+    servers are split individually. Groups follow cluster order, so that the
+    servers of a topology written pod by pod form contiguous ranges.
+    :server_ids: ids in cluster order
+    :returns: sorted server positions of every non-empty group """
+    pods = OrderedDict()  # type: Dict[str, List[int]]
+    racks = OrderedDict()  # type: Dict[tuple, List[int]]
+    for pos, server_id in enumerate(server_ids):
+        location = TopologyIndex.location(server_id)
+        pods.setdefault(location[0], []).append(pos)
+        racks.setdefault(location, []).append(pos)
+    if len(pods) >= n_shards:
+        units = list(pods.values())
+    elif len(racks) >= n_shards:
+        units = list(racks.values())
+    else:
+        units = [[pos] for pos in range(len(server_ids))]
+
+    groups = [[] for _ in range(n_shards)]  # type: List[List[int]]
+    assigned = 0
+    for unit in units:
+        # the shard whose share of the cluster the unit starts in
+        groups[min(n_shards - 1, assigned * n_shards // len(server_ids))].extend(unit)
+        assigned += len(unit)
+    return [np.array(sorted(group), dtype=np.int64) for group in groups if group]
+
+
+def _serve_shard(conn, cores_remaining: np.ndarray, ram_remaining: np.ndarray,
+        positions: np.ndarray, results: np.ndarray) -> None:
+    """ Shard process: answer (cores, ram) queries with the number of feasible
+    servers of the shard, whose positions are written to results. """
+    contiguous = len(positions) == positions[-1] - positions[0] + 1
+    start = int(positions[0])
+    stop = int(positions[-1]) + 1
+    while True:
+        query = conn.recv()
+        if query is None:
+            break
+        cores, ram = query
+        if contiguous:
+            mask = (cores_remaining[start:stop] >= cores) & (ram_remaining[start:stop] >= ram)
+            feasible = np.flatnonzero(mask)
+            feasible += start
+        else:
+            mask = (cores_remaining[positions] >= cores) & (ram_remaining[positions] >= ram)
+            feasible = positions[mask]
+        results[:len(feasible)] = feasible
+        conn.send(len(feasible))
+    conn.close()
+
+
+class ShardRouter(object):
+    """ Runs the CPU and RAM filters of an ArrayCluster in shard processes.
+
+    The remaining cores and RAM arrays of the cluster are moved into a
+    shared memory block, so the scheduler process keeps reading and updating
+    them in place and every shard sees each allocate/free without copies.
+    Every shard owns a group of servers, see partition_servers. A query is
+    sent to all shards at once; each writes the positions of its feasible
+    servers into its own slice of a shared result array, and the slices are
+    merged in cluster order. The scheduler only changes the arrays between
+    queries, so shards never read a half-applied update. """
+
+    def __init__(self, cluster: ArrayCluster, n_shards: int):
+        n_servers = len(cluster.cores_remaining)
+        # remaining cores, remaining RAM and result positions, 8 bytes per server each
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, 3 * 8 * n_servers))
+        self._cores_remaining = np.ndarray(n_servers, dtype=np.float64, buffer=self._shm.buf)
+        self._ram_remaining = np.ndarray(n_servers, dtype=np.float64, buffer=self._shm.buf,
+            offset=8 * n_servers)
+        self._results = np.ndarray(n_servers, dtype=np.int64, buffer=self._shm.buf,
+            offset=16 * n_servers)
+        self._cores_remaining[:] = cluster.cores_remaining
+        self._ram_remaining[:] = cluster.ram_remaining
+        cluster.cores_remaining = self._cores_remaining
+        cluster.ram_remaining = self._ram_remaining
+        self._cluster = cluster
+
+        self.shards = partition_servers(list(cluster.servers), n_shards)
+        positions = np.concatenate(self.shards) if self.shards else np.zeros(0, dtype=np.int64)
+        # merged results only need sorting if the shards are not consecutive ranges
+        self._in_cluster_order = bool(np.all(positions[1:] > positions[:-1]))
+
+        ctx = multiprocessing.get_context('fork')
+        self._conns = []
+        self._offsets = []
+        self._processes = []
+        offset = 0
+        for shard in self.shards:
+            conn, shard_conn = ctx.Pipe()
+            process = ctx.Process(target=_serve_shard, args=(shard_conn, self._cores_remaining,
+                self._ram_remaining, shard, self._results[offset:offset + len(shard)]))
+            process.daemon = True
+            process.start()
+            shard_conn.close()
+            self._conns.append(conn)
+            self._offsets.append(offset)
+            self._processes.append(process)
+            offset += len(shard)
+        atexit.register(self.close)
+
+    def feasible(self, cores=0, ram=0.0) -> ServerSequence:
+        """ Servers with at least the given remaining cores and RAM.
+        :return: sequence of servers in cluster order """
+        for conn in self._conns:
+            conn.send((cores, ram))
+        results = self._results
+        parts = [results[offset:offset + conn.recv()]
+            for conn, offset in zip(self._conns, self._offsets)]
+        positions = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+        if not self._in_cluster_order:
+            positions.sort()
+        return ServerSequence(self._cluster._views, positions)
+
+    def close(self) -> None:
+        """ Stop the shards and move the cluster state back to private memory. """
+        if self._shm is None:
+            return
+        for conn in self._conns:
+            conn.send(None)
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._cluster.cores_remaining = self._cores_remaining.copy()
+        self._cluster.ram_remaining = self._ram_remaining.copy()
+        self._cores_remaining = self._ram_remaining = self._results = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+        atexit.unregister(self.close)
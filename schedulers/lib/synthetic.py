@@ -0,0 +1,133 @@
+import heapq
+import json
+import random
+from typing import IO, List, Tuple
+
+import schedulers.constants as const
+
+# (cores, ram_in_gb, weight) choices of VM flavors and server types
+FLAVOR_TYPE = Tuple[float, float, float]
+
+DEFAULT_FLAVORS = [(1.0, 0.5, 1.0), (1.0, 2.0, 3.0), (2.0, 4.0, 3.0),
+    (4.0, 8.0, 2.0), (8.0, 16.0, 1.0)]
+DEFAULT_SERVER_TYPES = [(32.0, 256.0, 1.0)]
+
+
+def parse_flavors(spec: str) -> List[FLAVOR_TYPE]:
+    """ Parse "cores:ram:weight,cores:ram:weight,..." """
+    flavors = []
+    for item in spec.split(','):
+        cores, ram, weight = item.split(':')
+        flavors.append((float(cores), float(ram), float(weight)))
+    return flavors
+
+
+# lifetime distribution -> number of parameters
+LIFETIME_PARAMS = {'exp': 1, 'uniform': 2, 'fixed': 1, 'forever': 0}
+
+
+class Lifetime(object):
+    """ Distribution of VM lifetimes in ticks.
+    Specs: "exp:MEAN", "uniform:LOW:HIGH", "fixed:N" or "forever". """
+
+    def __init__(self, spec: str):
+        parts = spec.split(':')
+        self.kind = parts[0]
+        self.params = [float(p) for p in parts[1:]]
+        if self.kind not in LIFETIME_PARAMS:
+            raise ValueError('unknown lifetime distribution: {}'.format(spec))
+        if len(self.params) != LIFETIME_PARAMS[self.kind]:
+            raise ValueError('{} lifetimes take {} parameters: {}'.format(
+                self.kind, LIFETIME_PARAMS[self.kind], spec))
+        if self.kind == 'exp' and self.params[0] <= 0:
+            raise ValueError('mean lifetime must be positive: {}'.format(spec))
+        if self.kind == 'uniform' and self.params[0] > self.params[1]:
+            raise ValueError('empty lifetime range: {}'.format(spec))
+
+    def sample(self, rand: random.Random) -> int:
+        """ :returns: lifetime in ticks (at least 1), or -1 for VMs that are never deleted """
+        if self.kind == 'exp':
+            return max(1, int(round(rand.expovariate(1.0 / self.params[0]))))
+        elif self.kind == 'uniform':
+            return max(1, rand.randint(int(self.params[0]), int(self.params[1])))
+        elif self.kind == 'fixed':
+            return max(1, int(self.params[0]))
+        return -1
+
+
+def write_topology(ff: IO[str], pods: int, racks_per_pod: int, servers_per_rack: int,
+        server_types: List[FLAVOR_TYPE], seed: int = 0) -> int:
+    """ Write a topology in the "Servers" schema, with servers named
+    p<pod>_r<rack>_s<server>. Servers are written one by one so that
+    topologies with millions of hosts are never held in memory.
+    :returns: number of servers written """
+    rand = random.Random(seed)
+    types = [(cores, ram) for cores, ram, _ in server_types]
+    weights = [weight for _, _, weight in server_types]
+    n_servers = 0
+    ff.write('{"Servers": {')
+    for pod in range(pods):
+        for rack in range(racks_per_pod):
+            for server in range(servers_per_rack):
+                cores, ram = rand.choices(types, weights)[0]
+                ff.write('{}"p{}_r{}_s{}": [{}, {}]'.format(', ' if n_servers else '',
+                    pod, rack, server, json.dumps(cores), json.dumps(ram)))
+                n_servers += 1
+    ff.write('}}, "Comments": "synthetic topology: {} pods x {} racks x {} servers"}}\n'.format(
+        pods, racks_per_pod, servers_per_rack))
+    return n_servers
+
+
+def write_workload(ff: IO[str], n_events: int, creates_per_tick: float,
+        flavors: List[FLAVOR_TYPE], lifetime: Lifetime, seed: int = 0) -> int:
+    """ Write a workload in the tick format, tick by tick. Every tick creates
+    a Poisson-distributed number of VMs with the given mean, and deletes the
+    VMs whose lifetime ended. Ticks without events are skipped, because an
+    empty tick ends the replay.
+    :returns: number of ticks written """
+    rand = random.Random(seed)
+    shapes = [(cores, ram) for cores, ram, _ in flavors]
+    weights = [weight for _, _, weight in flavors]
+    expiring = []  # heap of (delete tick, vm number, vdc number)
+    n_written = 0
+    n_vms = 0
+    n_ticks = 0
+    tick = 0
+    ff.write('{')
+    while n_written < n_events:
+        events = []
+        while expiring and expiring[0][0] <= tick and n_written + len(events) < n_events:
+            _, vm, vdc = heapq.heappop(expiring)
+            events.append({const.TYPE_STR: const.VM_DELETE_STR,
+                const.VDC_UUID_STR: 'vdc{}'.format(vdc),
+                const.VM_UUID_STR: 'vdc{}-vm{}'.format(vdc, vm)})
+        for _ in range(_poisson(rand, creates_per_tick)):
+            if n_written + len(events) >= n_events:
+                break
+            n_vms += 1
+            vdc = n_vms // 4
+            cores, ram = rand.choices(shapes, weights)[0]
+            events.append({const.TYPE_STR: const.VM_CREATE_STR,
+                const.VDC_UUID_STR: 'vdc{}'.format(vdc),
+                const.VM_UUID_STR: 'vdc{}-vm{}'.format(vdc, n_vms),
+                const.CORES_STR: cores, const.RAM_STR: ram})
+            life = lifetime.sample(rand)
+            if life > 0:
+                heapq.heappush(expiring, (tick + life, n_vms, vdc))
+        if events:
+            ff.write('{}\n"tick_{}": {}'.format(',' if n_ticks else '', tick, json.dumps(events)))
+            n_written += len(events)
+            n_ticks += 1
+        tick += 1
+    ff.write('\n}\n')
+    return n_ticks
+
+
+def _poisson(rand: random.Random, mean: float) -> int:
+    """ Poisson sample by counting exponential inter-arrival times. """
+    count = 0
+    total = rand.expovariate(1.0)
+    while total < mean:
+        count += 1
+        total += rand.expovariate(1.0)
+    return count
@@ -0,0 +1,336 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Sequence, Tuple
+
+from schedulers.lib.domain import Server
+from schedulers.lib.workload import VMEvent
+
+
+class SortedServers(object):
+    """ Servers sorted by weigher key, found by the remaining cores and RAM
+    they have.
+
+    Keys are kept in blocks of up to 2 * load consecutive keys, next to the
+    remaining cores and RAM of their servers. Every block knows the largest
+    remaining cores and RAM among its servers, and a max segment tree over
+    the blocks finds the next block that may fit a request in O(log n), so
+    runs of servers that are too small are skipped without visiting them.
+    Adding or removing a key costs a bisection, an O(load) list update and
+    an O(log n) tree update; only splitting a full block or dropping an
+    empty one shifts the blocks after it, in O(n / load).
+    Keys end with the server position. """
+    NO_CAPACITY = float('-inf')
+
+    def __init__(self, entries: List[Tuple[Tuple, float, float]], load: int = 128):
+        """ :entries: (key, remaining cores, remaining RAM) of every server """
+        self.load = load
+        entries = sorted(entries)
+        self._keys = []  # type: List[List[Tuple]]
+        self._cores = []  # type: List[List[float]]
+        self._ram = []  # type: List[List[float]]
+        for start in range(0, len(entries), load):
+            chunk = entries[start:start + load]
+            self._keys.append([entry[0] for entry in chunk])
+            self._cores.append([entry[1] for entry in chunk])
+            self._ram.append([entry[2] for entry in chunk])
+        self._build()
+
+    def _build(self) -> None:
+        """ Rebuild the first keys and the segment tree of all blocks. """
+        self._firsts = [keys[0] for keys in self._keys]
+        size = 1
+        while size < len(self._keys):
+            size *= 2
+        self._size = size
+        self._max_cores = [SortedServers.NO_CAPACITY] * (2 * size)
+        self._max_ram = [SortedServers.NO_CAPACITY] * (2 * size)
+        for b in range(len(self._keys)):
+            self._max_cores[size + b] = max(self._cores[b])
+            self._max_ram[size + b] = max(self._ram[b])
+        self._update_parents(size, 2 * size - 1)
+
+    def _update_parents(self, first: int, last: int) -> None:
+        """ Recompute all tree nodes above the nodes first to last. """
+        max_cores = self._max_cores
+        max_ram = self._max_ram
+        first //= 2
+        last //= 2
+        while first > 0:
+            for i in range(first, last + 1):
+                left_cores, right_cores = max_cores[2 * i], max_cores[2 * i + 1]
+                left_ram, right_ram = max_ram[2 * i], max_ram[2 * i + 1]
+                max_cores[i] = left_cores if left_cores > right_cores else right_cores
+                max_ram[i] = left_ram if left_ram > right_ram else right_ram
+            first //= 2
+            last //= 2
+
+    def _split(self, b: int) -> None:
+        """ Split block b in halves, shifting the blocks after it. """
+        keys = self._keys[b]
+        half = len(keys) // 2
+        self._keys.insert(b + 1, keys[half:])
+        self._cores.insert(b + 1, self._cores[b][half:])
+        self._ram.insert(b + 1, self._ram[b][half:])
+        del keys[half:], self._cores[b][half:], self._ram[b][half:]
+        self._firsts.insert(b + 1, self._keys[b + 1][0])
+        n = len(self._keys)
+        if n > self._size:
+            self._build()
+            return
+        size = self._size
+        for max_values, values in ((self._max_cores, self._cores), (self._max_ram, self._ram)):
+            max_values[size + b + 2:size + n] = max_values[size + b + 1:size + n - 1]
+            max_values[size + b] = max(values[b])
+            max_values[size + b + 1] = max(values[b + 1])
+        self._update_parents(size + b, size + n - 1)
+
+    def _delete(self, b: int) -> None:
+        """ Delete the empty block b, shifting the blocks after it. """
+        del self._keys[b], self._cores[b], self._ram[b], self._firsts[b]
+        n = len(self._keys)
+        size = self._size
+        for max_values in (self._max_cores, self._max_ram):
+            max_values[size + b:size + n] = max_values[size + b + 1:size + n + 1]
+            max_values[size + n] = SortedServers.NO_CAPACITY
+        self._update_parents(size + b, size + n)
+
+    def _raise(self, b: int, cores, ram) -> None:
+        """ Update the tree after a server was added to block b. """
+        max_cores = self._max_cores
+        max_ram = self._max_ram
+        i = self._size + b
+        while i > 0 and (max_cores[i] < cores or max_ram[i] < ram):
+            if max_cores[i] < cores:
+                max_cores[i] = cores
+            if max_ram[i] < ram:
+                max_ram[i] = ram
+            i //= 2
+
+    def _lower(self, b: int, cores, ram) -> None:
+        """ Update the tree after a server was removed from block b. """
+        max_cores = self._max_cores
+        max_ram = self._max_ram
+        i = self._size + b
+        if cores < max_cores[i] and ram < max_ram[i]:
+            # the largest remaining cores and RAM are on other servers
+            return
+        max_cores[i] = max(self._cores[b])
+        max_ram[i] = max(self._ram[b])
+        i //= 2
+        while i > 0:
+            left_cores, right_cores = max_cores[2 * i], max_cores[2 * i + 1]
+            left_ram, right_ram = max_ram[2 * i], max_ram[2 * i + 1]
+            cores = left_cores if left_cores > right_cores else right_cores
+            ram = left_ram if left_ram > right_ram else right_ram
+            if cores == max_cores[i] and ram == max_ram[i]:
+                break
+            max_cores[i] = cores
+            max_ram[i] = ram
+            i //= 2
+
+    def _block(self, key: Tuple) -> int:
+        """ Index of the block key belongs to. """
+        return max(0, bisect_right(self._firsts, key) - 1)
+
+    def add(self, key: Tuple, cores, ram) -> None:
+        if not self._keys:
+            self._keys, self._cores, self._ram = [[key]], [[cores]], [[ram]]
+            self._build()
+            return
+        b = self._block(key)
+        keys = self._keys[b]
+        i = bisect_left(keys, key)
+        keys.insert(i, key)
+        self._cores[b].insert(i, cores)
+        self._ram[b].insert(i, ram)
+        self._firsts[b] = keys[0]
+        if len(keys) > 2 * self.load:
+            self._split(b)
+        else:
+            self._raise(b, cores, ram)
+
+    def remove(self, key: Tuple) -> None:
+        b = self._block(key)
+        keys = self._keys[b]
+        i = bisect_left(keys, key)
+        cores = self._cores[b].pop(i)
+        ram = self._ram[b].pop(i)
+        del keys[i]
+        if not keys:
+            self._delete(b)
+        else:
+            self._firsts[b] = keys[0]
+            self._lower(b, cores, ram)
+
+    def _next_block(self, b: int, cores, ram) -> int:
+        """ Index of the first block after b whose largest remaining cores and
+        RAM may fit the request, or -1. The block returned may still not fit,
+        as its largest cores and RAM can belong to different servers. """
+        max_cores = self._max_cores
+        max_ram = self._max_ram
+        i = self._size + b
+        # up to the first right sibling that may fit
+        while i > 1:
+            if i % 2 == 0 and max_cores[i + 1] >= cores and max_ram[i + 1] >= ram:
+                i += 1
+                break
+            i //= 2
+        else:
+            return -1
+        # down to its leftmost block that may fit
+        while i < self._size:
+            i *= 2
+            if max_cores[i] < cores or max_ram[i] < ram:
+                i += 1
+        return i - self._size
+
+    def iter_fitting(self, start_key: Tuple, cores, ram):
+        """ Keys from start_key on of the servers with at least the given
+        remaining cores and RAM, in key order. """
+        if not self._keys:
+            return
+        b = self._block(start_key)
+        i = bisect_left(self._keys[b], start_key)
+        while b >= 0:
+            if self._max_cores[self._size + b] >= cores and self._max_ram[self._size + b] >= ram:
+                block_cores = self._cores[b]
+                block_ram = self._ram[b]
+                keys = self._keys[b]
+                for j in range(i, len(keys)):
+                    if block_cores[j] >= cores and block_ram[j] >= ram:
+                        yield keys[j]
+            b = self._next_block(b, cores, ram)
+            i = 0
+
+
+class Weigher(object):
+    """ Base class of weighing policies.
+    A weigher orders servers by a key computed from the server's own state;
+    the feasible server with the smallest key wins. Keys end with the server
+    position so that ties are broken by cluster order.
+
+    The weigher keeps all servers in SortedServers. It is registered as an
+    observer of every server, so the order is updated on allocate/free, and
+    best() finds the winner by skipping to the first feasible server in key
+    order instead of filtering the whole cluster first. """
+    name = None  # type: str
+
+    def __init__(self):
+        self._servers = []  # type: List[Server]
+        self._pos = dict()  # type: Dict[str, int]
+        self._keys = []  # type: List[Tuple]
+        self._sorted = SortedServers([])
+
+    def attach(self, servers: List[Server]) -> None:
+        """ Start tracking the given servers. """
+        self._servers = servers
+        self._pos = {server.id: pos for pos, server in enumerate(servers)}
+        self._keys = [self.key(server, pos) for pos, server in enumerate(servers)]
+        self._sorted = SortedServers([(key, server._cores_remaining, server._ram_remaining)
+            for key, server in zip(self._keys, servers)])
+        for server in servers:
+            server.add_observer(self)
+
+    def key(self, server: Server, pos: int) -> Tuple:
+        """ Sort key of the server. Smaller is better. """
+        raise NotImplementedError
+
+    def start(self, req: VMEvent) -> Tuple:
+        """ Smallest key a feasible server may have. """
+        return ()
+
+    def update_cores(self, server: Server, old_cores) -> None:
+        self._update(server)
+
+    def update_ram(self, server: Server, old_ram) -> None:
+        self._update(server)
+
+    def _update(self, server: Server) -> None:
+        # the remaining cores and RAM stored next to the key change even if the key does not
+        pos = self._pos[server.id]
+        self._sorted.remove(self._keys[pos])
+        key = self._keys[pos] = self.key(server, pos)
+        self._sorted.add(key, server._cores_remaining, server._ram_remaining)
+
+    def best(self, req: VMEvent) -> Server:
+        """ The top-weighted server with enough cores and RAM for the request.
+        :returns: the server, or None if no server fits """
+        for key in self._sorted.iter_fitting(self.start(req), req.cores, req.ram):
+            return self._servers[key[-1]]
+        return None
+
+    def top(self, req: VMEvent, count: int) -> List[Server]:
+        """ The count top-weighted servers with enough cores and RAM, as
+        Nova's host_subset_size picks from.
+        :returns: up to count servers, best first """
+        servers = self._servers
+        hosts = []  # type: List[Server]
+        for key in self._sorted.iter_fitting(self.start(req), req.cores, req.ram):
+            hosts.append(servers[key[-1]])
+            if len(hosts) == count:
+                break
+        return hosts
+
+    def select(self, req: VMEvent, servers: Sequence[Server]) -> Server:
+        """ The top-weighted server among already filtered servers.
+        Picks the same server as best() when given all feasible servers. """
+        keys = self._keys
+        pos = self._pos
+        return min(servers, key=lambda server: keys[pos[server.id]])
+
+
+class BestFitWeigher(Weigher):
+    """ Packs VMs onto the servers with the fewest remaining cores, then the
+    least remaining RAM. """
+    name = 'pack'
+
+    def key(self, server: Server, pos: int) -> Tuple:
+        return (server._cores_remaining, server._ram_remaining, pos)
+
+    def start(self, req: VMEvent) -> Tuple:
+        return (req.cores,)
+
+
+class WorstFitWeigher(Weigher):
+    """ Spreads VMs onto the servers with the most remaining cores, then the
+    most remaining RAM. """
+    name = 'spread'
+
+    def key(self, server: Server, pos: int) -> Tuple:
+        return (-server._cores_remaining, -server._ram_remaining, pos)
+
+
+class WeightedSumWeigher(Weigher):
+    """ Nova-style RAM and CPU weighers combined with multipliers.
+    weight = cpu_multiplier * free cores fraction + ram_multiplier * free RAM fraction
+    Positive multipliers spread, negative multipliers stack. Unlike Nova, which
+    normalizes weights over the filtered hosts, free resources are normalized
+    by each server's own capacity so weights do not depend on the request. """
+    name = 'weighted'
+
+    def __init__(self, cpu_multiplier: float = 1.0, ram_multiplier: float = 1.0):
+        super().__init__()
+        self.cpu_multiplier = cpu_multiplier
+        self.ram_multiplier = ram_multiplier
+
+    def key(self, server: Server, pos: int) -> Tuple:
+        weight = 0.0
+        if server.cores > 0:
+            weight += self.cpu_multiplier * server._cores_remaining / server.cores
+        if server.ram > 0:
+            weight += self.ram_multiplier * server._ram_remaining / server.ram
+        return (-weight, pos)
+
+
+WEIGHERS = {weigher.name: weigher for weigher in
+    (BestFitWeigher, WorstFitWeigher, WeightedSumWeigher)}
+
+
+def make_weigher_policy(name: str, cpu_multiplier: float = 1.0,
+        ram_multiplier: float = 1.0) -> Weigher:
+    """ Build the weigher named on the command line.
+    :returns: the weigher, or None for the default random selection """
+    if name == WeightedSumWeigher.name:
+        return WeightedSumWeigher(cpu_multiplier, ram_multiplier)
+    elif name in WEIGHERS:
+        return WEIGHERS[name]()
+    return None
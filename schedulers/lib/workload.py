@@ -1,4 +1,12 @@
+from array import array
+from typing import Dict, List, Tuple, Union
+
+import schedulers.constants as const
+
+
 class VMEvent(object):
+    __slots__ = ('tick', 'type', 'vdc_uuid', 'vm_uuid', 'cores', 'ram')
+
     def __init__(self, tick, type, vdc_uuid, vm_uuid, cores=0, ram=0.0):
         self.tick = tick
         self.type = type
@@ -10,3 +18,87 @@ class VMEvent(object):
     def __str__(self):
         return "VMEvent: type={}, vdc_uuid={}, vm_uuid={}, cores={}, ram={}".format(
                 self.type, self.vdc_uuid, self.vm_uuid, self.cores, self.ram)
+
+
+class WorkingSet(object):
+    """ Currently allocated VMs keyed by UUID.
+    Each VM maps to an integer handle into parallel arrays holding the
+    position of its server and its cores and RAM, so neither the create event
+    nor a per-VM tuple has to be kept alive. Handles of removed VMs are reused.
+    A server position of -1 marks a VM that failed to be placed. """
+    FAILED_POS = -1
+
+    def __init__(self, servers: List):
+        self._servers = servers
+        self._positions = {server.id: pos for pos, server in enumerate(servers)}
+        self._handles = dict()  # type: Dict[str, int]
+        self._server_pos = array('l')
+        self._cores = array('d')
+        self._ram = array('d')
+        self._free_handles = []  # type: List[int]
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def __contains__(self, vm_uuid: str) -> bool:
+        return vm_uuid in self._handles
+
+    def add(self, vm_uuid: str, server, cores, ram) -> None:
+        """ Record an allocated VM.
+        :server: the Server the VM was placed on, or const.FAILED_STR """
+        if server == const.FAILED_STR:
+            pos = WorkingSet.FAILED_POS
+        else:
+            pos = self._positions[server.id]
+        handle = self._handles.get(vm_uuid)
+        if handle is None:
+            if self._free_handles:
+                handle = self._free_handles.pop()
+            else:
+                handle = len(self._server_pos)
+                self._server_pos.append(0)
+                self._cores.append(0.0)
+                self._ram.append(0.0)
+            self._handles[vm_uuid] = handle
+        self._server_pos[handle] = pos
+        self._cores[handle] = cores
+        self._ram[handle] = ram
+
+    def get(self, vm_uuid: str, default=None) -> Union[Tuple, None]:
+        """ :returns: (server or const.FAILED_STR, cores, ram) of the VM """
+        handle = self._handles.get(vm_uuid)
+        if handle is None:
+            return default
+        pos = self._server_pos[handle]
+        server = const.FAILED_STR if pos == WorkingSet.FAILED_POS else self._servers[pos]
+        return server, self._cores[handle], self._ram[handle]
+
+    def pop(self, vm_uuid: str, default=None) -> Union[Tuple, None]:
+        """ Remove the VM. :returns: same as get() """
+        entry = self.get(vm_uuid, default)
+        handle = self._handles.pop(vm_uuid, None)
+        if handle is not None:
+            self._free_handles.append(handle)
+        return entry
+
+    def items(self):
+        """ Iterate over (vm_uuid, (server or const.FAILED_STR, cores, ram)). """
+        for vm_uuid in self._handles:
+            yield vm_uuid, self.get(vm_uuid)
+
+    def export(self) -> Tuple[List[str], array, array, array]:
+        """ :returns: VM uuids and the matching server positions, cores and RAM
+        as compact arrays, in insertion order """
+        vm_uuids = list(self._handles)
+        handles = [self._handles[vm_uuid] for vm_uuid in vm_uuids]
+        return (vm_uuids, array('l', [self._server_pos[h] for h in handles]),
+            array('d', [self._cores[h] for h in handles]),
+            array('d', [self._ram[h] for h in handles]))
+
+    def restore(self, vm_uuids: List[str], server_pos, cores, ram) -> None:
+        """ Replace the contents with the output of export(). """
+        self._handles = {vm_uuid: handle for handle, vm_uuid in enumerate(vm_uuids)}
+        self._server_pos = array('l', server_pos)
+        self._cores = array('d', cores)
+        self._ram = array('d', ram)
+        self._free_handles = []
@@ -4,32 +4,82 @@ import random
 import sys
 import glog
 
+from bisect import bisect_left
 from collections import OrderedDict
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
 
 import schedulers.constants as const
 from schedulers.lib.domain import Cluster, Server
-from schedulers.lib.workload import VMEvent
+from schedulers.lib.workload import VMEvent, WorkingSet
 from schedulers.lib.misc import ProcessTimeDelta, DebugStats
-
-# example: {vm_uuid: (server_obj, req)}
-WORKING_SET_VM_TYPE = Dict[str, Tuple[Server, VMEvent]]
+from schedulers.lib.output import (AllocationLog, JsonLinesAllocationWriter,
+    allocation_record, json_lines_to_allocs)
+from schedulers.lib.weighers import Weigher
+
+if TYPE_CHECKING:
+    # optional components, imported by the branches using them
+    from schedulers.lib.filter_cache import FilterCache
+    from schedulers.lib.filters import FilterChain
+    from schedulers.lib.latency import PhaseStats
+    from schedulers.lib.metrics import UtilizationMetrics
+    from schedulers.lib.profiler import SamplingProfiler
 
 class NovaFilter(object):
     """ NovaFilter implements OpenStack Nova's Filter-Weigher based scheduling.
     It allocates CPU and RAM. """
 
-    def __init__(self, cluster: Cluster, debug: bool):
+    def __init__(self, cluster: Cluster, debug: bool,
+            output_sink: JsonLinesAllocationWriter = None,
+            weigher_policy: Weigher = None, batch: bool = False,
+            phase_stats: 'PhaseStats' = None, filter_chain: 'FilterChain' = None,
+            host_subset_size: int = 0, filter_cache_size: int = 0,
+            metrics: 'UtilizationMetrics' = None, profiler: 'SamplingProfiler' = None):
         """ Initialize NovaFilter scheduler.
         :cluster: datacenter topology to place the VMs onto
         :debug: flag to enable debug stat collection
+        :output_sink: if given, allocations are streamed to it instead of
+        being kept in self.allocations. It is flushed at the end of every tick
+        :weigher_policy: if given, replaces the random server selection
+        :batch: schedule each tick as a unit, see schedule_batch
+        :phase_stats: if given, the latency of every scheduling phase is recorded in it
+        :filter_chain: if given, replaces the CPU and RAM filters
+        :host_subset_size: if positive, the server is chosen among the first
+        host_subset_size feasible servers, see select_server
+        :filter_cache_size: if positive, the feasible servers of up to this many
+        flavors are cached, see lib.filter_cache
+        :metrics: if given, cluster utilization is tracked in it and written out every tick
+        :profiler: if given, the scheduling of every tick it covers is sampled by it
         """
         self.cluster = cluster
         self.servers = list(self.cluster.servers.values())
+        self.weigher_policy = weigher_policy
+        if self.weigher_policy is not None:
+            self.weigher_policy.attach(self.servers)
+        self.server_pos = {server.id: pos for pos, server in enumerate(self.servers)}
         self.timedelta_obj = ProcessTimeDelta()
 
         self.debug = debug
         glog.info('running with debug = {}'.format(self.debug))
+        # debug stats are collected per event, so debug runs are never batched
+        self.batch = batch and not debug
+        if batch and debug:
+            glog.warning('batch scheduling is disabled in debug mode')
+        # the debug stats count the servers passing the CPU and RAM filters over the whole cluster
+        self.filter_chain = None if debug else filter_chain
+        self.host_subset_size = 0 if debug else host_subset_size
+        if debug and (filter_chain is not None or host_subset_size > 0):
+            glog.warning('filter chains and host subsets are disabled in debug mode')
+        if self.host_subset_size > 0 and self.filter_chain is None:
+            from schedulers.lib.filters import CoreFilter, RamFilter, make_filter_chain
+            self.filter_chain = make_filter_chain([CoreFilter.name, RamFilter.name])
+        self.filter_cache = None  # type: FilterCache
+        if filter_cache_size > 0 and not debug:
+            if self.weigher_policy is not None:
+                # the weigher policy finds feasible servers without the filters
+                glog.warning('the filter cache is disabled with a weigher policy')
+            else:
+                from schedulers.lib.filter_cache import FilterCache
+                self.filter_cache = FilterCache(self.servers, filter_cache_size)
         if self.debug:
             self.debug_stats = OrderedDict()
             self.debug_stats_obj = DebugStats()
@@ -38,22 +88,71 @@ class NovaFilter(object):
         self.failure_stats = {const.FAIL_VM_STR: 0, const.FAIL_CORES_STR: 0,
                 const.FAIL_RAM_STR: 0}
 
-        # Dictionary of current VM allocations
-        self.working_set_vms = dict()  # type: WORKING_SET_VM_TYPE
+        # current VM allocations. example: {vm_uuid: (server_obj, cores, ram)}
+        self.working_set_vms = WorkingSet(self.servers)
 
         # properties of the VM currently being allocated
         self.curr_req_vm = None  # type: VMEvent
 
-        # self.allocations holds all allocated vm events as a list of dictionaries
-        # Example:
-        # {
-        #     vm: lib.workload.VMEvent,
-        #     server_id: string,
-        #     timedelta: datetime.timedelta
-        # }
-        self.allocations = []
+        # self.allocations holds all allocated vm events as
+        # (vm: lib.workload.VMEvent, server_id: string, timedelta: float) records
+        self.allocations = AllocationLog()
+        self.output_sink = output_sink
         self.start_time = None
 
+        # attached before instrument_phases wraps the phase methods
+        self.profiler = profiler
+        if self.profiler is not None:
+            self.profiler.attach(self.schedule, self.profiled_phases())
+
+        self.phase_stats = phase_stats
+        if self.phase_stats is not None:
+            self.instrument_phases(self.phase_stats)
+
+        self.metrics = metrics
+        if self.metrics is not None:
+            self.metrics.attach(self.servers)
+
+    def set_weigher_policy(self, weigher_policy: Weigher) -> None:
+        """ Switch to another weighing policy, e.g. in a what-if continuation.
+        :weigher_policy: the new policy, or None for random selection """
+        if self.weigher_policy is not None:
+            for server in self.servers:
+                server.remove_observer(self.weigher_policy)
+        self.weigher_policy = weigher_policy
+        if self.weigher_policy is not None:
+            self.weigher_policy.attach(self.servers)
+
+    def phase_methods(self) -> List[Tuple[str, str]]:
+        """ (method, phase) of the methods implementing each scheduling phase. """
+        phases = [('cpu_filter', 'cpu_filter'), ('indexed_cpu_filter', 'cpu_filter'),
+            ('mem_filter', 'mem_filter'), ('vectorized_filter', 'vectorized_filter'),
+            ('sharded_filter', 'sharded_filter'),
+            ('topology_filter', 'topology_filter'), ('chain_filter', 'filter_chain'),
+            ('cached_filter', 'filter_cache'),
+            ('weigher', 'weigher'), ('weigher_best', 'weigher'), ('weigher_top', 'weigher')]
+        if self.batch:
+            phases += [('claim_resources', 'place_vm'), ('release_resources', 'deallocate')]
+        else:
+            phases += [('place_vm', 'place_vm'), ('deallocate_vm', 'deallocate')]
+        return phases
+
+    def instrument_phases(self, phase_stats: 'PhaseStats') -> None:
+        """ Replace the methods implementing each scheduling phase with timed
+        wrappers, so uninstrumented runs pay nothing for phase timing. """
+        for method, phase in self.phase_methods():
+            setattr(self, method, phase_stats.timed(phase, getattr(self, method)))
+
+    def profiled_phases(self) -> List[Tuple]:
+        """ (function, phase) pairs the profiler attributes samples by: the
+        timed phases, and the working set and allocation output, which are
+        part of several phases. """
+        phases = [(getattr(self, method), phase) for method, phase in self.phase_methods()]
+        phases += [(func, 'working_set') for func in vars(WorkingSet).values()
+            if callable(func)]
+        phases.append((self.record_allocation, 'output'))
+        return phases
+
     def collect_debug_stats(self):
         tick_val = self.curr_req_vm.tick
         if tick_val in self.debug_stats:
@@ -67,6 +166,16 @@ class NovaFilter(object):
                 'ram_passed': self.debug_stats_obj.stat['ram_passed'],
                 'vm_uuid': self.debug_stats_obj.stat['vm_uuid']}]
 
+    def record_allocation(self, req: VMEvent, server_id: str, timedelta: float) -> None:
+        """ Add a handled create/delete event to the output.
+        :req: the handled event
+        :server_id: id of the server involved, or const.FAILED_STR
+        :timedelta: handling latency in microseconds """
+        if self.output_sink is not None:
+            self.output_sink.write(req, server_id, timedelta)
+        else:
+            self.allocations.append(req, server_id, timedelta)
+
     def place_vm(self, req: VMEvent, current_server: Server):
         """ Place the VM on the give server. Also do CPU and RAM bookkeeping.
         :req: properties of to-be-allocated VM
@@ -74,21 +183,12 @@ class NovaFilter(object):
         :returns: status of the allocation. It is always const.SCHED_SUCCESS
         since current_server was already checked to have sufficient resources
         to accommodate the VM. """
-        self.working_set_vms[req.vm_uuid] = (current_server, req)
-        if current_server.allocate_cores(req.cores) != const.SCHED_SUCCESS:
-            glog.error('ERROR: failed to deduct {} cores from server {}'.format(
-                req.cores, current_server))
-            sys.exit(1)
-        if current_server.allocate_ram(req.ram) != const.SCHED_SUCCESS:
-            glog.error('ERROR: failed to deduct {} RAM from server {}'.format(
-                req.ram, current_server))
-            sys.exit(1)
+        self.claim_resources(req, current_server)
 
         # add the scheduled VM to the output
         end_time = time.process_time()
         timedelta = self.timedelta_obj.diff_in_microsecs(self.start_time, end_time)
-        alloc = dict(server_id=current_server.id, vm=req, timedelta=timedelta)
-        self.allocations.append(alloc)
+        self.record_allocation(req, current_server.id, timedelta)
 
         if self.debug:
             self.debug_stats_obj.stat['vm_uuid'] = req.vm_uuid
@@ -96,6 +196,28 @@ class NovaFilter(object):
         #glog.debug('successfully allocated VM: {}'.format(req))
         return const.SCHED_SUCCESS
 
+    def claim_resources(self, req: VMEvent, current_server: Server) -> None:
+        """ Add the VM to the working set and deduct its CPU and RAM from the server.
+        :req: properties of to-be-allocated VM
+        :current_server: server already checked to fit the VM """
+        self.working_set_vms.add(req.vm_uuid, current_server, req.cores, req.ram)
+        if current_server.allocate_cores(req.cores) != const.SCHED_SUCCESS:
+            glog.error('ERROR: failed to deduct {} cores from server {}'.format(
+                req.cores, current_server))
+            sys.exit(1)
+        if current_server.allocate_ram(req.ram) != const.SCHED_SUCCESS:
+            glog.error('ERROR: failed to deduct {} RAM from server {}'.format(
+                req.ram, current_server))
+            sys.exit(1)
+
+    def fail_vm(self, req: VMEvent) -> None:
+        """ Add the VM that could not be placed to the working set and failure_stats.
+        :req: properties of to-be-allocated VM """
+        self.working_set_vms.add(req.vm_uuid, const.FAILED_STR, req.cores, req.ram)
+        self.failure_stats[const.FAIL_VM_STR] += 1
+        self.failure_stats[const.FAIL_CORES_STR] += req.cores
+        self.failure_stats[const.FAIL_RAM_STR] += req.ram
+
     def cpu_filter(self, req: VMEvent, servers: List[Server]) -> List[Server]:
         """ Filter out servers without sufficient cores.
         :req: properties of to-be-allocated VM
@@ -110,27 +232,107 @@ class NovaFilter(object):
         :returns: list of servers that satisfy the requirement """
         return [server for server in servers if server.has_ram_capacity(req.ram)]
 
-    def weigher(self, req: VMEvent, servers: List[Server]) -> int:
+    def indexed_cpu_filter(self, req: VMEvent) -> List[Server]:
+        """ Same as cpu_filter over all servers, but looked up in the cluster's
+        capacity index. Requests that fit nowhere are rejected in O(1).
+        :req: properties of to-be-allocated VM
+        :returns: list of servers that satisfy the requirement, in cluster order """
+        index = self.cluster.capacity_index
+        # in debug mode the number of cpu-feasible servers is still reported
+        if not self.debug and not index.may_fit(req.cores, req.ram):
+            return []
+        return index.cpu_candidates(req.cores)
+
+    def cached_filter(self, req: VMEvent) -> List[Server]:
+        """ CPU and RAM filters answered from self.filter_cache, which only
+        re-checks the servers changed since the flavor was last requested.
+        :req: properties of to-be-allocated VM
+        :returns: list of servers that satisfy both requirements, in cluster order """
+        return self.filter_cache.feasible(req.cores, req.ram)
+
+    def chain_filter(self, req: VMEvent) -> List[Server]:
+        """ Run self.filter_chain over the cluster. With a host subset size,
+        the scan starts at a random server and stops once that many servers
+        pass, as Nova's host_subset_size does.
+        :req: properties of to-be-allocated VM
+        :returns: list of servers that pass every filter """
+        if self.host_subset_size > 0:
+            return self.filter_chain.first(req, self.servers, self.host_subset_size,
+                random.randrange(len(self.servers)))
+        return list(self.filter_chain.passing(req, self.servers))
+
+    def topology_filter(self, req: VMEvent) -> List[Server]:
+        """ CPU and RAM filters evaluated only over the racks and pods whose
+        capacity summaries show room for the request. Requires the cluster's
+        topology index.
+        :req: properties of to-be-allocated VM
+        :returns: list of servers that satisfy both requirements, in cluster order """
+        return self.cluster.topology_index.candidates(req.cores, req.ram)
+
+    def sharded_filter(self, req: VMEvent) -> Sequence[Server]:
+        """ CPU and RAM filters evaluated by the shard processes of the
+        cluster, each over its own servers. Requires an ArrayCluster with
+        started shards, see ArrayCluster.start_shards.
+        :req: properties of to-be-allocated VM
+        :returns: sequence of servers that satisfy both requirements, in cluster order """
+        return self.cluster.shard_router.feasible(req.cores, req.ram)
+
+    def vectorized_filter(self, req: VMEvent) -> Sequence[Server]:
+        """ CPU and RAM filters evaluated together as one boolean mask over
+        the cluster's capacity arrays. Requires an ArrayCluster.
+        :req: properties of to-be-allocated VM
+        :returns: sequence of servers that satisfy both requirements """
+        cpu_mask = self.cluster.cpu_mask(req.cores)
+        passed_servers = self.cluster.select(cpu_mask & self.cluster.ram_mask(req.ram))
+        if self.debug:
+            cpu_passed = int(cpu_mask.sum())
+            self.debug_stats_obj.stat['cpu_passed'] = cpu_passed
+            if cpu_passed > 0:
+                self.debug_stats_obj.stat['ram_passed'] = len(passed_servers)
+        return passed_servers
+
+    def weigher(self, req: VMEvent, servers: Sequence[Server]) -> Server:
         """ Choose a server among many servers according to weighing policy.
-        Policy is the random server selection policy.
+        Policy is self.weigher_policy if set, random server selection otherwise.
         :req: properties of to-be-allocated VM
         :servers: list of servers to-be-filtered
         :returns: the selected server. """
         # defensive programming: make sure none of the servers are const.FAILED_STR
         assert(const.FAILED_STR not in servers)
+        if self.weigher_policy is not None:
+            return self.weigher_policy.select(req, servers)
         return random.choice(servers)
 
-    def allocate_vm(self, req: VMEvent) -> None:
-        """ Place the VM on a server.
-        :req: properties of to-be-allocated VM """
-        #glog.debug('started allocating VM: {}'.format(req))
-        if self.debug:
-            self.debug_stats_obj.reset()
+    def weigher_best(self, req: VMEvent) -> Server:
+        """ The weigher policy's best feasible server. The policy both filters
+        and weighs when it picks the server directly. """
+        return self.weigher_policy.best(req)
 
-        self.curr_req_vm = req
+    def weigher_top(self, req: VMEvent, n: int) -> List[Server]:
+        """ The weigher policy's n top-weighted feasible servers. """
+        return self.weigher_policy.top(req, n)
 
-        self.start_time = time.process_time()
-        passed_servers = self.cpu_filter(req, self.servers)
+    def filter_servers(self, req: VMEvent) -> Sequence[Server]:
+        """ Run the CPU and RAM filters over the cluster.
+        :req: properties of to-be-allocated VM
+        :returns: servers that satisfy both requirements """
+        if self.filter_cache is not None:
+            return self.cached_filter(req)
+        if self.filter_chain is not None:
+            return self.chain_filter(req)
+        if self.cluster.vectorized:
+            # shards only report the servers passing both filters, so debug runs skip them
+            if self.cluster.shard_router is not None and not self.debug:
+                return self.sharded_filter(req)
+            return self.vectorized_filter(req)
+        # debug runs report how many servers pass each filter, so they skip the pruning
+        if self.cluster.topology_index is not None and not self.debug:
+            return self.topology_filter(req)
+
+        if self.cluster.capacity_index is not None:
+            passed_servers = self.indexed_cpu_filter(req)
+        else:
+            passed_servers = self.cpu_filter(req, self.servers)
         if self.debug:
             self.debug_stats_obj.stat['cpu_passed'] = len(passed_servers)
 
@@ -138,9 +340,40 @@ class NovaFilter(object):
             passed_servers = self.mem_filter(req, passed_servers)
             if self.debug:
                 self.debug_stats_obj.stat['ram_passed'] = len(passed_servers)
+        return passed_servers
 
+    def select_server(self, req: VMEvent) -> Server:
+        """ Filter and weigh the servers for the request.
+        With a host subset size, the weigher policy picks at random among its
+        host_subset_size top-weighted feasible servers, and random selection
+        picks among the first host_subset_size feasible servers found.
+        :req: properties of to-be-allocated VM
+        :returns: the selected server, or None if no server fits """
+        if self.weigher_policy is not None and not self.debug:
+            # the policy finds its top-weighted feasible servers directly. In
+            # debug mode the filters run anyway to report how many servers pass.
+            if self.host_subset_size > 0:
+                hosts = self.weigher_top(req, self.host_subset_size)
+                return random.choice(hosts) if hosts else None
+            return self.weigher_best(req)
+        passed_servers = self.filter_servers(req)
         if len(passed_servers) > 0:
-            selected_server = self.weigher(req, passed_servers)
+            return self.weigher(req, passed_servers)
+        return None
+
+    def allocate_vm(self, req: VMEvent) -> None:
+        """ Place the VM on a server.
+        :req: properties of to-be-allocated VM """
+        #glog.debug('started allocating VM: {}'.format(req))
+        if self.debug:
+            self.debug_stats_obj.reset()
+
+        self.curr_req_vm = req
+
+        self.start_time = time.process_time()
+        selected_server = self.select_server(req)
+
+        if selected_server is not None:
             status = self.place_vm(req, selected_server)
             if status == const.SCHED_SUCCESS:
                 if self.debug:
@@ -148,48 +381,45 @@ class NovaFilter(object):
                 return
 
         end_time = time.process_time()
-        # add the failed VM to the output
-        self.working_set_vms[req.vm_uuid] = (const.FAILED_STR, req)
+        # add the failed VM to the output and update failure_stats
+        self.fail_vm(req)
         timedelta = self.timedelta_obj.diff_in_microsecs(self.start_time, end_time)
-        alloc = dict(server_id=const.FAILED_STR, vm=req, timedelta=timedelta)
-        self.allocations.append(alloc)
-        # update failure_stats
-        self.failure_stats[const.FAIL_VM_STR] += 1
-        self.failure_stats[const.FAIL_CORES_STR] += req.cores
-        self.failure_stats[const.FAIL_RAM_STR] += req.ram
+        self.record_allocation(req, const.FAILED_STR, timedelta)
+
+    def release_resources(self, req: VMEvent) -> str:
+        """ Remove the VM from the working set and give its CPU and RAM back.
+        :req: VM deallocation request
+        :returns: id of the server the VM was on, or const.FAILED_STR """
+        placed_server, allocated_cores, allocated_ram = self.working_set_vms.pop(
+            req.vm_uuid, (None, None, None))
+        if not placed_server:
+            glog.error('to-be-deallocated VM is not found: {}. Exit.'.format(req))
+            sys.exit(1)
+        if placed_server == const.FAILED_STR:
+            return const.FAILED_STR
+
+        # free up CPU and RAM
+        if placed_server.free_cores(allocated_cores) != const.SCHED_SUCCESS:
+            glog.error('ERROR: failed to add {} cores back to server {}'.format(
+                allocated_cores, placed_server))
+            sys.exit(1)
+
+        if placed_server.free_ram(allocated_ram) != const.SCHED_SUCCESS:
+            glog.error('ERROR: failed to add {} ram back to server {}'.format(
+                allocated_ram, placed_server))
+            sys.exit(1)
+        return placed_server.id
 
     def deallocate_vm(self, req: VMEvent) -> None:
         """ Deallocate already allocated VM.
         :req: VM deallocation request """
         start_time = time.process_time()
-        placed_server, allocated_vm = self.working_set_vms.get(req.vm_uuid, (None, None))
-        if placed_server and allocated_vm:
-            if placed_server == const.FAILED_STR:
-                end_time = time.process_time()
-                timedelta = self.timedelta_obj.diff_in_microsecs(start_time, end_time)
-                alloc = dict(server_id=const.FAILED_STR, vm=req, timedelta=timedelta)
-            else:
-                # free up CPU and RAM
-                if placed_server.free_cores(allocated_vm.cores) != const.SCHED_SUCCESS:
-                    glog.error('ERROR: failed to add {} cores back to server {}'.format(
-                        allocated_vm.cores, placed_server))
-                    sys.exit(1)
-
-                if placed_server.free_ram(allocated_vm.ram) != const.SCHED_SUCCESS:
-                    glog.error('ERROR: failed to add {} ram back to server {}'.format(
-                        allocated_vm.ram, placed_server))
-                    sys.exit(1)
-
-                # add the scheduled VM to the output
-                end_time = time.process_time()
-                timedelta = self.timedelta_obj.diff_in_microsecs(start_time, end_time)
-                alloc = dict(server_id=placed_server.id, vm=req, timedelta=timedelta)
-            self.allocations.append(alloc)
-            self.working_set_vms.pop(req.vm_uuid)
-        else:
-            glog.error('to-be-deallocated VM is not found: {}. Exit.'.format(allocated_vm))
-            sys.exit(1)
+        server_id = self.release_resources(req)
 
+        # add the deallocated VM to the output
+        end_time = time.process_time()
+        timedelta = self.timedelta_obj.diff_in_microsecs(start_time, end_time)
+        self.record_allocation(req, server_id, timedelta)
         return None
 
     def schedule(self, events: List[VMEvent]) -> int:
@@ -197,6 +427,26 @@ class NovaFilter(object):
         :events: list of VM allocate and deallocate events
         :returns: status code of the scheduler. const.SCHED_SUCCESS if
         full workload is complete. const.SCHED_FAIL otherwise. """
+        if self.profiler is not None and len(events) > 0:
+            self.profiler.start_tick(events[0].tick)
+        if self.batch:
+            status = self.schedule_batch(events)
+        else:
+            status = self.schedule_sequential(events)
+        if self.profiler is not None:
+            self.profiler.stop_tick()
+        if self.output_sink is not None:
+            self.output_sink.flush_tick()
+        if self.phase_stats is not None and len(events) > 0:
+            self.phase_stats.end_tick(events[0].tick)
+        if self.metrics is not None and len(events) > 0:
+            self.metrics.end_tick(events[0].tick)
+        return status
+
+    def schedule_sequential(self, events: List[VMEvent]) -> int:
+        """ Handle a list of (de)allocation requests one by one.
+        :events: list of VM allocate and deallocate events
+        :returns: status code of the scheduler """
         # process each allocate/deallocate VM event
         for req in events:
             # process VM create and delete events within this VDC
@@ -210,9 +460,87 @@ class NovaFilter(object):
 
         return const.SCHED_SUCCESS
 
-    def output_allocations(self, output_path: str) -> None:
+    def schedule_batch(self, events: List[VMEvent]) -> int:
+        """ Handle one tick of (de)allocation requests as a unit.
+        Deletes of VMs that existed before this tick are moved to the front
+        of the tick, and the other events follow in their original order.
+        The result, including the order in which the events are recorded, is
+        the same as handling the reordered tick one by one. The filters run
+        once per flavor (cores, ram) and tick: the list of feasible servers of
+        every flavor seen so far is kept and only the server a VM was placed
+        on is re-checked. A delete within the rest of the tick frees capacity
+        and drops those lists.
+        Every event of the tick is reported with the latency of the whole tick.
+        :events: list of VM allocate and deallocate events of one tick
+        :returns: status code of the scheduler """
+        start_time = time.process_time()
+        created = {req.vm_uuid for req in events if req.type == const.VM_CREATE_STR}
+        early_deletes = [req for req in events
+            if req.type == const.VM_DELETE_STR and req.vm_uuid not in created]
+        handled = []  # [(req, server_id), ...] in processing order
+
+        for req in early_deletes:
+            handled.append((req, self.release_resources(req)))
+
+        candidates = dict()  # {(cores, ram): [server_position, ...], ...}
+        for req in events:
+            if req.type == const.VM_CREATE_STR:
+                self.curr_req_vm = req
+                server = self._batch_select(req, candidates)
+                if server is None:
+                    self.fail_vm(req)
+                    handled.append((req, const.FAILED_STR))
+                    continue
+                self.claim_resources(req, server)
+                handled.append((req, server.id))
+                self._batch_update(server, candidates)
+            elif req.type == const.VM_DELETE_STR:
+                if req.vm_uuid in created:
+                    handled.append((req, self.release_resources(req)))
+                    candidates.clear()
+            else:
+                glog.error('ERROR: unknown request type {}. Exit.'.format(req))
+                sys.exit(1)
+
+        end_time = time.process_time()
+        timedelta = self.timedelta_obj.diff_in_microsecs(start_time, end_time)
+        for req, server_id in handled:
+            self.record_allocation(req, server_id, timedelta)
+        return const.SCHED_SUCCESS
+
+    def _batch_select(self, req: VMEvent, candidates: Dict) -> Server:
+        """ Pick a server for the request from the flavor's cached candidates.
+        :returns: the selected server, or None if none fits """
+        if self.weigher_policy is not None or self.host_subset_size > 0:
+            # host subsets start at a random server, so they are not cached
+            return self.select_server(req)
+        flavor = (req.cores, req.ram)
+        positions = candidates.get(flavor)
+        if positions is None:
+            server_pos = self.server_pos
+            positions = [server_pos[server.id] for server in self.filter_servers(req)]
+            candidates[flavor] = positions
+        if len(positions) == 0:
+            return None
+        # same random draw as weigher() over the filtered servers
+        return self.servers[random.choice(positions)]
+
+    def _batch_update(self, server: Server, candidates: Dict) -> None:
+        """ Drop the server from the cached candidates it no longer fits. """
+        pos = self.server_pos[server.id]
+        for (cores, ram), positions in candidates.items():
+            if server.has_cores_capacity(cores) and server.has_ram_capacity(ram):
+                continue
+            i = bisect_left(positions, pos)
+            if i < len(positions) and positions[i] == pos:
+                del positions[i]
+
+    def output_allocations(self, output_path: str, convert_stream: bool = False) -> None:
         """ Flush the current allocations to a JSON file
         :output_path: name of the JSON file name to output
+        :convert_stream: when allocations were streamed to self.output_sink,
+        also convert the stream into output_path. Otherwise only the stream is
+        completed and output_path just names the debug stats file.
         The format looks like:
         {
             "tick_0": [ {'type': 'create', 'vdc_uuid': 'vdc1', 'vm_uuid': 'vm1', 'cores': 2.0, 'ram_in_gb': 0.75, 'server': 'p0_t0_s0'}, ...],
@@ -223,33 +551,22 @@ class NovaFilter(object):
         """
         glog.info('total resource stats for failed VMs: {}'.format(self.failure_stats))
 
-        data = OrderedDict()  # grouping allocated vms by tick
-        for alloc in self.allocations:
-            # extract info from dict
-            vm = alloc['vm']
-            server_id = alloc['server_id']
-            if vm.type == const.VM_CREATE_STR:
-                # convert to output formatted dict
-                alloc_vm = dict(type=vm.type, vdc_uuid=vm.vdc_uuid,
-                    vm_uuid=vm.vm_uuid, cores=vm.cores, ram_in_gb=vm.ram,
-                    server=server_id, elapsed_microsec=alloc['timedelta'])
-
-            elif vm.type == const.VM_DELETE_STR:
-                # delete events do not have VM cores, ram, and some other info
-                alloc_vm = dict(type=vm.type, vdc_uuid=vm.vdc_uuid, vm_uuid=vm.vm_uuid,
-                    server=server_id, elapsed_microsec=alloc['timedelta'])
-            else:
-                glog.error('ERROR: invalid event type: {}. Only supported are: create, delete. Exit.'.format(vm.type))
-                sys.exit(1)
-            if vm.tick not in data:
-                data[vm.tick] = []
-            data[vm.tick].append(alloc_vm)
+        if self.output_sink is not None:
+            self.output_sink.close(self.failure_stats)
+            if convert_stream:
+                json_lines_to_allocs(self.output_sink.path, output_path)
+        else:
+            data = OrderedDict()  # grouping allocated vms by tick
+            for vm, server_id, timedelta in self.allocations:
+                if vm.tick not in data:
+                    data[vm.tick] = []
+                data[vm.tick].append(allocation_record(vm, server_id, timedelta))
 
-        # add failure stats to the output
-        data[const.STATS_STR] = self.failure_stats
+            # add failure stats to the output
+            data[const.STATS_STR] = self.failure_stats
 
-        with open(output_path, 'w') as outfile:
-            json.dump(data, outfile, indent=4)
+            with open(output_path, 'w') as outfile:
+                json.dump(data, outfile, indent=4)
 
         # output debug_stats
         if self.debug:
@@ -257,4 +574,3 @@ class NovaFilter(object):
             with open(debug_fname, 'w') as ds_file:
                 json.dump(self.debug_stats, ds_file, indent=4)
             glog.info('wrote debugging output to {}'.format(debug_fname))
-
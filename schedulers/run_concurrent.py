@@ -0,0 +1,120 @@
+import argparse
+import csv
+import glog
+import json
+import sys
+
+import schedulers.constants as const
+from schedulers.lib.optimistic import simulate
+from schedulers.lib.replay import WorkloadReplayer
+
+RESULT_FIELDS = ['workers', 'events', 'creates', 'wall_secs', 'events_per_sec', 'speedup',
+    'claims', 'conflicts', 'conflict_rate', 'retried', 'retry_rate', 'retry_reached',
+    'no_valid_host', 'p50_microsec', 'p99_microsec', 'retried_p50_microsec',
+    'retried_p99_microsec']
+
+
+if __name__ == "__main__":
+    """ Simulate concurrent scheduler workers racing on a shared cluster state. """
+    CLI = argparse.ArgumentParser(
+        description='Simulate N optimistic-concurrency scheduler workers. Workers run '
+        'the CPU and RAM filters over the whole cluster and pick a feasible server at random; '
+        'weighers, filter chains and indexes are not supported')
+
+    CLI.add_argument(
+        '-p',
+        '--physical-network',
+        default='./input/2pod_4rack_8servers.pn.json',
+        help='Path to physical network JSON file')
+
+    CLI.add_argument(
+        '-w',
+        '--workload',
+        default='./input/workload_sample.json',
+        help='Path to workload JSON file, or columnar .nfc file')
+
+    CLI.add_argument(
+        '-n',
+        '--workers',
+        nargs='+',
+        type=int,
+        default=[1, 2, 4, 8],
+        help='numbers of scheduler worker processes to simulate')
+
+    CLI.add_argument(
+        '--refresh-interval',
+        type=int,
+        default=1,
+        help='requests a worker schedules between refreshes of its view of the cluster')
+
+    CLI.add_argument(
+        '--max-attempts',
+        type=int,
+        default=3,
+        help='claims per request before giving up with SCHED_RETRY_REACHED')
+
+    CLI.add_argument(
+        '-s',
+        '--seed',
+        type=int,
+        default=0,
+        help='seed for the random number generators of the workers')
+
+    CLI.add_argument(
+        '--tick-timeout',
+        type=float,
+        default=600.0,
+        help='seconds the workers may take for one tick before the run is aborted')
+
+    CLI.add_argument(
+        '-o',
+        '--output',
+        default=None,
+        help='Path to result table CSV file')
+
+    ARGS = CLI.parse_args()
+    if ARGS.max_attempts < 1 or ARGS.refresh_interval < 1 or min(ARGS.workers) < 1 or \
+            ARGS.tick_timeout <= 0:
+        glog.error('ERROR: workers, --refresh-interval, --max-attempts and --tick-timeout '
+            'must be positive.')
+        sys.exit(1)
+
+    with open(ARGS.physical_network) as ff:
+        f_servers = json.load(ff)["Servers"]
+    if ARGS.workload.endswith(const.COLUMNAR_SUFFIX):
+        from schedulers.lib.columnar import ColumnarWorkloadReplayer
+        rp = ColumnarWorkloadReplayer()
+    else:
+        rp = WorkloadReplayer()
+    rp.load_workload(ARGS.workload)
+    ticks = []
+    events = rp.replay()
+    while len(events) > 0:
+        ticks.append(events)
+        events = rp.replay()
+
+    rows = []
+    for n_workers in ARGS.workers:
+        glog.info('simulating {} workers'.format(n_workers))
+        try:
+            row = simulate(f_servers, ticks, n_workers, ARGS.refresh_interval,
+                ARGS.max_attempts, ARGS.seed, ARGS.tick_timeout)
+        except RuntimeError as e:
+            glog.error('ERROR: {}. Exit.'.format(e))
+            sys.exit(1)
+        rows.append(row)
+    base_rate = rows[0]['events_per_sec']
+    for row in rows:
+        row['speedup'] = row['events_per_sec'] / base_rate if base_rate > 0 else 0.0
+
+    widths = [max(len(name), 10) for name in RESULT_FIELDS]
+    print(' '.join('{:>{}s}'.format(name, width) for name, width in zip(RESULT_FIELDS, widths)))
+    for row in rows:
+        print(' '.join('{:>{}.6g}'.format(row[name], width)
+            for name, width in zip(RESULT_FIELDS, widths)))
+    if ARGS.output:
+        with open(ARGS.output, 'w', newline='') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        glog.info('See {} file for simulation results'.format(ARGS.output))
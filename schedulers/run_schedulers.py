@@ -1,12 +1,18 @@
+import time
+# taken before any other import, so that the reported time to the first
+# placement includes the imports
+START_TIME = time.perf_counter()
+
 import argparse
 import glog
+import os
+import random
 import sys
-import threading
-import time
 
 import schedulers.constants as const
-from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.replay import WorkloadReplayer, StreamingWorkloadReplayer
 from schedulers.lib.domain import Cluster
+from schedulers.lib.weighers import WEIGHERS, make_weigher_policy
 
 from schedulers.novafilter import NovaFilter
 
@@ -19,24 +25,57 @@ def _print_tick_index(replayer: WorkloadReplayer, output_freq_in_secs: int) -> N
     """
     time.sleep(5) # sleep for couple second for proper logging order
     while True:
-        glog.info('--- processing tick # %d out of total %d ticks ---',
-                replayer.currTick, len(replayer.keys))
+        # streamed workloads do not know their ticks up front
+        if replayer.keys:
+            glog.info('--- processing tick # %d out of total %d ticks ---',
+                    replayer.currTick, len(replayer.keys))
+        else:
+            glog.info('--- processing tick # %d ---', replayer.currTick)
         time.sleep(output_freq_in_secs)
 
 
-def runner(scheduler, replayer):
-    """ Run the scheduler until completion. """
+def _log_first_placement(scheduler) -> None:
+    """ Log the time from the start of this script to the first recorded
+    allocation. The scheduler's record_allocation is wrapped until then. """
+    record_allocation = scheduler.record_allocation
+
+    def record_first(req, server_id, timedelta):
+        del scheduler.record_allocation
+        glog.info('time to first placement: {:.1f} ms'.format(
+            (time.perf_counter() - START_TIME) * 1000))
+        record_allocation(req, server_id, timedelta)
+
+    scheduler.record_allocation = record_first
+
+
+def runner(scheduler, replayer, until_tick=None, progress=True):
+    """ Run the scheduler until completion.
+    :until_tick: if given, stop once this many ticks have been replayed
+    :progress: print the replay progress on a separate thread """
+    if until_tick is not None and replayer.currTick >= until_tick:
+        return
     replayed_workload = replayer.replay()
-    t1 = threading.Thread(target=_print_tick_index, args=(replayer, 1))
-    t1.daemon = True
-    t1.start()
+    if progress:
+        import threading
+        t1 = threading.Thread(target=_print_tick_index, args=(replayer, 1))
+        t1.daemon = True
+        t1.start()
     glog.info('running {}'.format(scheduler.__class__.__name__))
     while len(replayed_workload) > 0:
         scheduler.schedule(replayed_workload)
+        if until_tick is not None and replayer.currTick >= until_tick:
+            glog.info('stopped after tick # {}'.format(replayer.currTick))
+            return
         replayed_workload = replayer.replay()
     glog.info("Full workload completed")
 
 
+def what_if_output_path(output_path: str, index: int) -> str:
+    """ allocs.json -> allocs.whatif<index>.json """
+    root, ext = os.path.splitext(output_path)
+    return '{}.whatif{}{}'.format(root, index, ext)
+
+
 if __name__ == "__main__":
     """ Main driver file to run different schedulers. """
     CLI = argparse.ArgumentParser(
@@ -54,13 +93,13 @@ if __name__ == "__main__":
         '-p',
         '--physical-network',
         default='./input/2pod_4rack_8servers.pn.json',
-        help='Path to physical network JSON file')
+        help='Path to physical network JSON file, or columnar .nfc file')
 
     CLI.add_argument(
         '-w',
         '--workload',
         default='./input/workload_sample.json',
-        help='Path to workload JSON file')
+        help='Path to workload JSON file, or columnar .nfc file')
 
     CLI.add_argument(
         '-o',
@@ -75,21 +114,427 @@ if __name__ == "__main__":
         default=False,
         help='enable debug stats output')
 
+    CLI.add_argument(
+        '-s',
+        '--seed',
+        type=int,
+        default=None,
+        help='seed for the random number generator used by the weigher')
+
+    CLI.add_argument(
+        '--capacity-index',
+        action='store_true',
+        default=False,
+        help='look up feasible servers in a capacity index instead of scanning all servers')
+
+    CLI.add_argument(
+        '--topology-index',
+        action='store_true',
+        default=False,
+        help='keep per-rack and per-pod capacity summaries and filter only the '
+        'racks that can fit the request')
+
+    CLI.add_argument(
+        '--vectorized',
+        action='store_true',
+        default=False,
+        help='keep cluster state in NumPy arrays and evaluate filters as one mask')
+
+    CLI.add_argument(
+        '--shards',
+        type=int,
+        default=0,
+        help='keep cluster state in shared memory and evaluate the filters in this '
+        'many processes, each over a group of pods. Implies --vectorized. '
+        'Requires Python 3.8 or newer')
+
+    CLI.add_argument(
+        '--weigher',
+        choices=['random'] + sorted(WEIGHERS),
+        default='random',
+        help='server weighing policy. pack: best fit, spread: worst fit, '
+        'weighted: free CPU and RAM fractions scaled by the multipliers below')
+
+    CLI.add_argument(
+        '--cpu-weight-multiplier',
+        type=float,
+        default=1.0,
+        help='multiplier of the free cores fraction for --weigher weighted')
+
+    CLI.add_argument(
+        '--ram-weight-multiplier',
+        type=float,
+        default=1.0,
+        help='multiplier of the free RAM fraction for --weigher weighted')
+
+    CLI.add_argument(
+        '--filters',
+        nargs='+',
+        default=None,
+        help='run these filters, each of cpu and ram once, in this order, as a lazy '
+        'filter chain')
+
+    CLI.add_argument(
+        '--adaptive-filters',
+        action='store_true',
+        default=False,
+        help='reorder the filter chain by observed selectivity, most selective first')
+
+    CLI.add_argument(
+        '--host-subset-size',
+        type=int,
+        default=0,
+        help='choose among the first N feasible servers found from a random '
+        'starting server, or among the N top-weighted ones with --weigher')
+
+    CLI.add_argument(
+        '--filter-cache',
+        type=int,
+        default=0,
+        metavar='FLAVORS',
+        help='cache the feasible servers of up to FLAVORS (cores, ram) request shapes, '
+        'updating them only for servers that changed')
+
+    CLI.add_argument(
+        '--batch',
+        action='store_true',
+        default=False,
+        help='schedule each tick as a unit: deletes of VMs created in earlier ticks '
+        'first, filters evaluated once per flavor. Allocations are written in that '
+        'order, and with per-tick instead of per-event latency')
+
+    CLI.add_argument(
+        '--phase-stats',
+        default=None,
+        help='Path to a JSON Lines file receiving p50/p99/p999 latency of each '
+        'scheduling phase per tick, followed by the whole run')
+
+    CLI.add_argument(
+        '--metrics',
+        default=None,
+        help='Path to a JSON Lines file receiving cluster utilization, full and idle '
+        'hosts, stranded resources and per-pod usage after every tick')
+
+    CLI.add_argument(
+        '--metrics-min-flavor',
+        default='1:0.5',
+        metavar='CORES:RAM',
+        help='smallest VM for --metrics: hosts that cannot fit it count as full, '
+        'and their remaining resources as stranded')
+
+    CLI.add_argument(
+        '--profile',
+        default=None,
+        help='Path to a sampling profile of the scheduling hot path, attributed to '
+        'scheduling phases. Written as a speedscope file with one profile per tick '
+        'if the path ends in .json, else as collapsed stacks for flamegraph.pl')
+
+    CLI.add_argument(
+        '--profile-ticks',
+        default=None,
+        metavar='START:END',
+        help='only profile the ticks tick_START up to, excluding, tick_END. '
+        'Either bound may be omitted')
+
+    CLI.add_argument(
+        '--profile-interval',
+        type=float,
+        default=2.0,
+        metavar='MS',
+        help='milliseconds of CPU time between --profile samples')
+
+    CLI.add_argument(
+        '--profile-max-overhead',
+        type=float,
+        default=0.02,
+        metavar='FRACTION',
+        help='double the --profile interval whenever sampling takes more than this '
+        'fraction of the profiled time')
+
+    CLI.add_argument(
+        '--stream-workload',
+        action='store_true',
+        default=False,
+        help='parse the workload one tick at a time while replaying. Ticks must be '
+        'in increasing order. .jsonl/.ndjson files are read as one tick per line')
+
+    CLI.add_argument(
+        '--input-cache',
+        default=None,
+        metavar='DIR',
+        help='directory caching parsed JSON topologies and workloads by content hash. '
+        'Defaults to $NOVAFILTER_CACHE_DIR, else ~/.cache/novafilter')
+
+    CLI.add_argument(
+        '--no-input-cache',
+        action='store_true',
+        default=False,
+        help='always parse the JSON inputs, without reading or writing the input cache')
+
+    CLI.add_argument(
+        '--ticks',
+        type=int,
+        default=None,
+        help='stop after replaying this many ticks')
+
+    CLI.add_argument(
+        '--stream-output',
+        default=None,
+        help='Path to a JSON Lines file that allocations are written to tick by '
+        'tick instead of being kept in memory until the end of the run')
+
+    CLI.add_argument(
+        '--pipeline-depth',
+        type=int,
+        default=0,
+        help='decode up to this many ticks ahead in a separate process, and with '
+        '--stream-output write allocations from another one, while scheduling')
+
+    CLI.add_argument(
+        '--convert-stream',
+        action='store_true',
+        default=False,
+        help='after the run, also convert the --stream-output file into the '
+        'allocation output JSON file')
+
+    CLI.add_argument(
+        '--checkpoint',
+        default=None,
+        help='Path to a checkpoint file written after --checkpoint-tick ticks')
+
+    CLI.add_argument(
+        '--checkpoint-tick',
+        type=int,
+        default=None,
+        help='number of ticks to replay before writing --checkpoint')
+
+    CLI.add_argument(
+        '--restore',
+        default=None,
+        help='Path to a checkpoint to continue from. The topology and workload '
+        'must be the ones it was taken with. Only allocations made after the '
+        'checkpoint are written to the output')
+
+    CLI.add_argument(
+        '--what-if',
+        nargs='+',
+        default=None,
+        metavar='SPEC',
+        help='fork one continuation per SPEC after --fork-tick ticks, e.g. '
+        '"weigher=pack" "weigher=weighted,cpu_mult=-1" "seed=3" "capacity=1.5". '
+        'Continuation i writes its output to <output>.whatif<i>.json')
+
+    CLI.add_argument(
+        '--fork-tick',
+        type=int,
+        default=None,
+        help='number of ticks to replay before forking the --what-if continuations')
+
     ARGS = CLI.parse_args()
     scheduler = None
 
-    cluster = Cluster()
-    cluster.load(ARGS.physical_network)
-    rp = WorkloadReplayer()
-    rp.load_workload(ARGS.workload)
+    if ARGS.filter_cache and (ARGS.filters or ARGS.adaptive_filters or ARGS.host_subset_size):
+        glog.error('ERROR: --filter-cache cannot be combined with a filter chain or host subset.')
+        sys.exit(1)
+    if ARGS.filter_cache and ARGS.weigher != 'random':
+        glog.error('ERROR: --filter-cache cannot be combined with --weigher {}.'.format(ARGS.weigher))
+        sys.exit(1)
+    if ARGS.checkpoint and ARGS.checkpoint_tick is None:
+        glog.error('ERROR: --checkpoint requires --checkpoint-tick.')
+        sys.exit(1)
+    if ARGS.what_if and (ARGS.stream_output or ARGS.phase_stats):
+        glog.error('ERROR: --what-if cannot be combined with --stream-output or --phase-stats.')
+        sys.exit(1)
+    if ARGS.shards < 0:
+        glog.error('ERROR: --shards must not be negative.')
+        sys.exit(1)
+    if ARGS.shards and (ARGS.what_if or ARGS.filter_cache or ARGS.filters or
+            ARGS.adaptive_filters or ARGS.host_subset_size):
+        glog.error('ERROR: --shards cannot be combined with --what-if, --filter-cache, '
+            'a filter chain or host subset.')
+        sys.exit(1)
+    if ARGS.metrics and ARGS.what_if:
+        glog.error('ERROR: --metrics cannot be combined with --what-if.')
+        sys.exit(1)
+    if ARGS.profile and ARGS.what_if:
+        glog.error('ERROR: --profile cannot be combined with --what-if.')
+        sys.exit(1)
+    if ARGS.profile:
+        import signal
+        if not hasattr(signal, 'setitimer'):
+            glog.error('ERROR: --profile requires signal.setitimer, which this platform lacks.')
+            sys.exit(1)
+    if ARGS.profile_interval <= 0:
+        glog.error('ERROR: --profile-interval must be positive.')
+        sys.exit(1)
+    if ARGS.pipeline_depth < 0:
+        glog.error('ERROR: --pipeline-depth must not be negative.')
+        sys.exit(1)
+    if ARGS.pipeline_depth and ARGS.what_if:
+        glog.error('ERROR: --pipeline-depth cannot be combined with --what-if.')
+        sys.exit(1)
+    if ARGS.what_if and not hasattr(os, 'fork'):
+        glog.error('ERROR: --what-if requires os.fork, which this platform lacks.')
+        sys.exit(1)
+    if ARGS.checkpoint or ARGS.restore or ARGS.what_if:
+        from schedulers.lib.checkpoint import (fork_what_ifs, load_checkpoint, parse_what_if,
+            save_checkpoint)
+        try:
+            what_ifs = [parse_what_if(spec) for spec in ARGS.what_if or []]
+        except ValueError as e:
+            glog.error('ERROR: invalid --what-if: {}'.format(e))
+            sys.exit(1)
+
+    input_cache = None
+    if not ARGS.no_input_cache:
+        from schedulers.lib.input_cache import InputCache, default_cache_dir
+        input_cache = InputCache(ARGS.input_cache or default_cache_dir())
+
+    if ARGS.seed is not None:
+        random.seed(ARGS.seed)
+
+    if ARGS.vectorized or ARGS.shards:
+        from schedulers.lib.array_domain import ArrayCluster
+        cluster = ArrayCluster()
+    else:
+        cluster = Cluster()
+    if input_cache is not None and not ARGS.physical_network.endswith(const.COLUMNAR_SUFFIX):
+        cluster.load_servers(input_cache.servers(ARGS.physical_network))
+    else:
+        cluster.load(ARGS.physical_network)
+    if ARGS.capacity_index:
+        cluster.build_capacity_index()
+    if ARGS.topology_index:
+        cluster.build_topology_index()
+    if ARGS.shards:
+        cluster.start_shards(ARGS.shards)
+    if ARGS.workload.endswith(const.COLUMNAR_SUFFIX):
+        from schedulers.lib.columnar import ColumnarWorkloadReplayer
+        rp = ColumnarWorkloadReplayer()
+        rp.load_workload(ARGS.workload)
+    elif ARGS.stream_workload:
+        rp = StreamingWorkloadReplayer()
+        rp.load_workload(ARGS.workload)
+    elif input_cache is not None:
+        rp = input_cache.workload_replayer(ARGS.workload)
+    else:
+        rp = WorkloadReplayer()
+        rp.load_workload(ARGS.workload)
+    if ARGS.pipeline_depth:
+        from schedulers.lib.pipeline import (PipelinedAllocationWriter, PrefetchingReplayer,
+            pipeline_summary)
+        rp = PrefetchingReplayer(rp, ARGS.pipeline_depth)
 
     if ARGS.novafilter:
-        scheduler = NovaFilter(cluster, ARGS.debug)
+        sink = None
+        if ARGS.stream_output and ARGS.pipeline_depth:
+            sink = PipelinedAllocationWriter(ARGS.stream_output, ARGS.pipeline_depth)
+        elif ARGS.stream_output:
+            from schedulers.lib.output import JsonLinesAllocationWriter
+            sink = JsonLinesAllocationWriter(ARGS.stream_output)
+        weigher_policy = make_weigher_policy(ARGS.weigher, ARGS.cpu_weight_multiplier,
+            ARGS.ram_weight_multiplier)
+        phase_stats = None
+        if ARGS.phase_stats:
+            from schedulers.lib.latency import PhaseStats
+            phase_stats = PhaseStats(open(ARGS.phase_stats, 'w'))
+        metrics = None
+        if ARGS.metrics:
+            from schedulers.lib.metrics import UtilizationMetrics
+            try:
+                min_cores, min_ram = (float(value) for value in ARGS.metrics_min_flavor.split(':'))
+            except ValueError:
+                glog.error('ERROR: invalid --metrics-min-flavor: {}'.format(
+                    ARGS.metrics_min_flavor))
+                sys.exit(1)
+            metrics = UtilizationMetrics(open(ARGS.metrics, 'w'), min_cores, min_ram)
+        profiler = None
+        if ARGS.profile:
+            from schedulers.lib.profiler import SamplingProfiler, parse_tick_range
+            first_tick = end_tick = None
+            if ARGS.profile_ticks:
+                try:
+                    first_tick, end_tick = parse_tick_range(ARGS.profile_ticks)
+                except ValueError as e:
+                    glog.error('ERROR: invalid --profile-ticks: {}'.format(e))
+                    sys.exit(1)
+            profiler = SamplingProfiler(open(ARGS.profile, 'w'),
+                'speedscope' if ARGS.profile.endswith('.json') else 'collapsed',
+                ARGS.profile_interval / 1000, ARGS.profile_max_overhead, first_tick, end_tick)
+        filter_chain = None
+        if ARGS.filters or ARGS.adaptive_filters:
+            from schedulers.lib.filters import CoreFilter, RamFilter, make_filter_chain
+            try:
+                filter_chain = make_filter_chain(ARGS.filters or [CoreFilter.name, RamFilter.name],
+                    ARGS.adaptive_filters)
+            except ValueError as e:
+                glog.error('ERROR: invalid --filters: {}'.format(e))
+                sys.exit(1)
+        scheduler = NovaFilter(cluster, ARGS.debug, output_sink=sink,
+            weigher_policy=weigher_policy, batch=ARGS.batch, phase_stats=phase_stats,
+            filter_chain=filter_chain, host_subset_size=ARGS.host_subset_size,
+            filter_cache_size=ARGS.filter_cache, metrics=metrics, profiler=profiler)
     else:
         glog.error('ERROR: invalid option.')
         sys.exit(1)
 
-    runner(scheduler, rp)
+    _log_first_placement(scheduler)
+    if ARGS.restore:
+        load_checkpoint(ARGS.restore, scheduler, rp)
+        glog.info('restored {} at tick # {}'.format(ARGS.restore, rp.currTick))
+    # forked what-if runs would inherit the progress thread's locks, but not the thread
+    if ARGS.checkpoint:
+        runner(scheduler, rp, until_tick=ARGS.checkpoint_tick, progress=not ARGS.what_if)
+        save_checkpoint(ARGS.checkpoint, scheduler, rp)
+        glog.info('checkpoint at tick # {} written to {}'.format(rp.currTick, ARGS.checkpoint))
+
+    if ARGS.what_if:
+        runner(scheduler, rp, until_tick=ARGS.fork_tick, progress=False)
+
+        def run_what_if(index):
+            runner(scheduler, rp, until_tick=ARGS.ticks, progress=False)
+            output_path = what_if_output_path(ARGS.output, index)
+            scheduler.output_allocations(output_path)
+            glog.info('See {} file for allocation results of what-if {}'.format(
+                output_path, index))
+
+        glog.info('forking {} what-if runs at tick # {}'.format(len(what_ifs), rp.currTick))
+        statuses = fork_what_ifs(scheduler, what_ifs, run_what_if)
+        if any(statuses):
+            glog.error('ERROR: {} what-if runs failed.'.format(sum(1 for s in statuses if s)))
+            sys.exit(1)
+        sys.exit(0)
+
+    start_time = time.perf_counter()
+    runner(scheduler, rp, until_tick=ARGS.ticks, progress=not ARGS.checkpoint)
+    run_secs = time.perf_counter() - start_time
+    if cluster.shard_router is not None:
+        cluster.shard_router.close()
+    if scheduler.phase_stats is not None:
+        for phase, stats in sorted(scheduler.phase_stats.summary().items()):
+            glog.info('{} latency in microsecs: {}'.format(phase, stats))
+        scheduler.phase_stats.close()
+    if scheduler.metrics is not None:
+        glog.info('utilization peaks: {}'.format(scheduler.metrics.summary()['peak']))
+        scheduler.metrics.close()
+    if scheduler.profiler is not None:
+        glog.info('profile: {}'.format(scheduler.profiler.summary()))
+        scheduler.profiler.close()
+        glog.info('See {} file for the profile'.format(ARGS.profile))
+    if scheduler.filter_cache is not None:
+        glog.info('filter cache stats: {}'.format(scheduler.filter_cache.stats()))
     glog.info("Writing output to the file ...")
-    scheduler.output_allocations(ARGS.output)
-    glog.info('See {} file for allocation results'.format(ARGS.output))
+    scheduler.output_allocations(ARGS.output, convert_stream=ARGS.convert_stream)
+    if ARGS.pipeline_depth:
+        rp.close()
+        output_stats = None
+        if sink is not None:
+            # the run only ends once the writer has caught up
+            output_stats = sink.stats
+            run_secs = time.perf_counter() - start_time
+        glog.info('pipeline stats: {}'.format(pipeline_summary(rp.stats, output_stats,
+            run_secs)))
+    if ARGS.stream_output and not ARGS.convert_stream:
+        glog.info('See {} file for allocation results'.format(ARGS.stream_output))
+    else:
+        glog.info('See {} file for allocation results'.format(ARGS.output))
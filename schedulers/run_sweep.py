@@ -0,0 +1,201 @@
+import argparse
+import csv
+import glog
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from typing import Dict, List, Tuple
+
+import schedulers.constants as const
+from schedulers.lib.domain import Cluster
+from schedulers.lib.misc import percentile
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.weighers import WEIGHERS, make_weigher_policy
+
+from schedulers.novafilter import NovaFilter
+
+CLUSTER_MODES = ['plain', 'index', 'topology', 'vectorized']
+
+# parsed inputs shared by all runs of this process.
+# {physical network path: {server_id: [cores, ram], ...}, ...}
+_TOPOLOGIES = dict()  # type: Dict[str, Dict[str, List]]
+# {workload path: WorkloadReplayer, ...}
+_WORKLOADS = dict()  # type: Dict[str, WorkloadReplayer]
+
+# one grid point: (physical network, workload, seed, weigher, cluster mode, batch)
+RUN_TYPE = Tuple[str, str, int, str, str, bool]
+
+RESULT_FIELDS = ['physical_network', 'workload', 'seed', 'weigher', 'cluster', 'batch',
+    'events', const.FAIL_VM_STR, const.FAIL_CORES_STR, const.FAIL_RAM_STR,
+    'wall_secs', 'events_per_sec', 'latency_of', 'p50_microsec', 'p99_microsec',
+    'p999_microsec']
+
+
+def load_inputs(physical_networks: List[str], workloads: List[str]) -> None:
+    """ Parse every input once. Workers started with fork inherit the parsed
+    inputs copy-on-write instead of parsing them again. """
+    for pn in physical_networks:
+        if pn not in _TOPOLOGIES:
+            with open(pn) as ff:
+                _TOPOLOGIES[pn] = json.load(ff)["Servers"]
+    for workload in workloads:
+        if workload not in _WORKLOADS:
+            replayer = WorkloadReplayer()
+            replayer.load_workload(workload)
+            _WORKLOADS[workload] = replayer
+
+
+def _init_worker(physical_networks: List[str], workloads: List[str]) -> None:
+    glog.setLevel('WARNING')
+    load_inputs(physical_networks, workloads)
+
+
+def tick_latencies(allocations) -> List[float]:
+    """ Latency of every tick of a batched run, whose records all carry it. """
+    latencies = []
+    tick = None
+    for vm, _, timedelta in allocations:
+        if vm.tick != tick:
+            tick = vm.tick
+            latencies.append(timedelta)
+    return latencies
+
+
+def run_one(run: RUN_TYPE) -> Dict:
+    """ Replay one grid point from the shared parsed inputs.
+    :returns: a row of the result table """
+    pn, workload, seed, weigher, cluster_mode, batch = run
+    random.seed(seed)
+    if cluster_mode == 'vectorized':
+        from schedulers.lib.array_domain import ArrayCluster
+        cluster = ArrayCluster()
+    else:
+        cluster = Cluster()
+    cluster.load_servers(_TOPOLOGIES[pn])
+    if cluster_mode == 'index':
+        cluster.build_capacity_index()
+    elif cluster_mode == 'topology':
+        cluster.build_topology_index()
+    scheduler = NovaFilter(cluster, False, weigher_policy=make_weigher_policy(weigher),
+        batch=batch)
+    replayer = _WORKLOADS[workload].clone()
+
+    start_time = time.perf_counter()
+    events = replayer.replay()
+    while len(events) > 0:
+        scheduler.schedule(events)
+        events = replayer.replay()
+    wall_secs = time.perf_counter() - start_time
+
+    n_events = len(scheduler.allocations)
+    if batch:
+        # every event of a batched tick is reported with the latency of the
+        # whole tick, so the percentiles are over ticks rather than events
+        latencies = sorted(tick_latencies(scheduler.allocations))
+    else:
+        latencies = sorted(scheduler.allocations.timedeltas())
+    row = dict(physical_network=pn, workload=workload, seed=seed, weigher=weigher,
+        cluster=cluster_mode, batch=batch, events=n_events, wall_secs=wall_secs,
+        events_per_sec=n_events / wall_secs if wall_secs > 0 else 0.0,
+        latency_of='tick' if batch else 'event', p50_microsec=percentile(latencies, 50), p99_microsec=percentile(latencies, 99),
+        p999_microsec=percentile(latencies, 99.9))
+    row.update(scheduler.failure_stats)
+    return row
+
+
+def sweep(runs: List[RUN_TYPE], processes: int) -> List[Dict]:
+    """ Run the grid on a process pool.
+    :returns: result rows in the order of runs """
+    physical_networks = sorted({run[0] for run in runs})
+    workloads = sorted({run[1] for run in runs})
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # parse in the parent so that forked workers share the inputs
+        load_inputs(physical_networks, workloads)
+        ctx = multiprocessing.get_context('fork')
+    else:
+        ctx = multiprocessing.get_context()
+    with ctx.Pool(processes, initializer=_init_worker,
+            initargs=(physical_networks, workloads)) as pool:
+        return pool.map(run_one, runs, chunksize=1)
+
+
+if __name__ == "__main__":
+    """ Run NovaFilter over a grid of inputs and options. """
+    CLI = argparse.ArgumentParser(
+        description='Sweep NovaFilter over topologies, workloads, seeds and options')
+
+    CLI.add_argument(
+        '-p',
+        '--physical-networks',
+        nargs='+',
+        default=['./input/2pod_4rack_8servers.pn.json'],
+        help='Paths to physical network JSON files')
+
+    CLI.add_argument(
+        '-w',
+        '--workloads',
+        nargs='+',
+        default=['./input/workload_sample.json'],
+        help='Paths to workload JSON files')
+
+    CLI.add_argument(
+        '-s',
+        '--seeds',
+        nargs='+',
+        type=int,
+        default=[0],
+        help='seeds for the random number generator')
+
+    CLI.add_argument(
+        '--weighers',
+        nargs='+',
+        choices=['random'] + sorted(WEIGHERS),
+        default=['random'],
+        help='server weighing policies')
+
+    CLI.add_argument(
+        '--clusters',
+        nargs='+',
+        choices=CLUSTER_MODES,
+        default=['plain'],
+        help='plain: linear filters, index: --capacity-index, topology: --topology-index, '
+        'vectorized: --vectorized')
+
+    CLI.add_argument(
+        '--batch-modes',
+        nargs='+',
+        choices=['off', 'on'],
+        default=['off'],
+        help='run without and/or with --batch')
+
+    CLI.add_argument(
+        '-j',
+        '--processes',
+        type=int,
+        default=os.cpu_count(),
+        help='number of worker processes')
+
+    CLI.add_argument(
+        '-o',
+        '--output',
+        default='sweep.csv',
+        help='Path to result table CSV file. The latency percentiles are per '
+        'event, or per tick in batched runs, as the latency_of column says')
+
+    ARGS = CLI.parse_args()
+    runs = list(itertools.product(ARGS.physical_networks, ARGS.workloads, ARGS.seeds,
+        ARGS.weighers, ARGS.clusters, [mode == 'on' for mode in ARGS.batch_modes]))
+    glog.info('running {} configurations on {} processes'.format(len(runs), ARGS.processes))
+
+    start_time = time.perf_counter()
+    rows = sweep(runs, ARGS.processes)
+    glog.info('sweep completed in {:.2f} secs'.format(time.perf_counter() - start_time))
+
+    with open(ARGS.output, 'w', newline='') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    glog.info('See {} file for sweep results'.format(ARGS.output))
@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import glog
+import json
+import random
+import signal
+
+from schedulers.lib.domain import Cluster
+from schedulers.lib.output import JsonLinesAllocationWriter
+from schedulers.lib.service import SchedulingService
+from schedulers.lib.weighers import WEIGHERS, make_weigher_policy
+
+from schedulers.novafilter import NovaFilter
+
+
+async def serve(service: SchedulingService, host: str, port: int, path: str) -> None:
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, service.stop)
+        except NotImplementedError:
+            pass
+    await service.serve(host, port, path)
+
+
+if __name__ == "__main__":
+    """ Run NovaFilter as a long-running service. See lib.service for the protocol. """
+    CLI = argparse.ArgumentParser(description='Serve NovaFilter over a socket')
+
+    CLI.add_argument(
+        '-p',
+        '--physical-network',
+        default='./input/2pod_4rack_8servers.pn.json',
+        help='Path to physical network JSON file')
+
+    CLI.add_argument(
+        '-s',
+        '--seed',
+        type=int,
+        default=None,
+        help='seed for the random number generator')
+
+    CLI.add_argument(
+        '--capacity-index',
+        action='store_true',
+        default=False,
+        help='look up CPU-feasible servers in an index bucketed by remaining cores')
+
+    CLI.add_argument(
+        '--topology-index',
+        action='store_true',
+        default=False,
+        help='filter only the racks and pods whose capacity summaries fit the request')
+
+    CLI.add_argument(
+        '--vectorized',
+        action='store_true',
+        default=False,
+        help='evaluate the CPU and RAM filters as NumPy masks over capacity arrays')
+
+    CLI.add_argument(
+        '--weigher',
+        choices=['random'] + sorted(WEIGHERS),
+        default='random',
+        help='server weighing policy')
+
+    CLI.add_argument('--cpu-weight-multiplier', type=float, default=1.0)
+    CLI.add_argument('--ram-weight-multiplier', type=float, default=1.0)
+
+    CLI.add_argument(
+        '--batch',
+        action='store_true',
+        default=False,
+        help='schedule every coalesced batch as a unit, as --batch of run_schedulers')
+
+    CLI.add_argument('--host', default='127.0.0.1')
+    CLI.add_argument('--port', type=int, default=8775)
+
+    CLI.add_argument(
+        '--socket',
+        default=None,
+        help='Path to a Unix socket to listen on instead of TCP')
+
+    CLI.add_argument(
+        '--window',
+        type=float,
+        default=1.0,
+        help='milliseconds to wait for more requests before scheduling a batch')
+
+    CLI.add_argument(
+        '--max-batch',
+        type=int,
+        default=1024,
+        help='maximum number of requests scheduled together')
+
+    CLI.add_argument(
+        '--queue-size',
+        type=int,
+        default=4096,
+        help='maximum number of queued requests before clients are pushed back')
+
+    CLI.add_argument(
+        '--stream-output',
+        default=None,
+        help='Path to a JSON Lines file receiving the allocations of every batch')
+
+    ARGS = CLI.parse_args()
+
+    if ARGS.seed is not None:
+        random.seed(ARGS.seed)
+
+    if ARGS.vectorized:
+        from schedulers.lib.array_domain import ArrayCluster
+        cluster = ArrayCluster()
+    else:
+        cluster = Cluster()
+    cluster.load(ARGS.physical_network)
+    if ARGS.capacity_index:
+        cluster.build_capacity_index()
+    if ARGS.topology_index:
+        cluster.build_topology_index()
+
+    sink = JsonLinesAllocationWriter(ARGS.stream_output) if ARGS.stream_output else None
+    weigher_policy = make_weigher_policy(ARGS.weigher, ARGS.cpu_weight_multiplier,
+        ARGS.ram_weight_multiplier)
+    scheduler = NovaFilter(cluster, False, output_sink=sink, weigher_policy=weigher_policy,
+        batch=ARGS.batch)
+    service = SchedulingService(scheduler, window=ARGS.window / 1000.0,
+        max_batch=ARGS.max_batch, queue_size=ARGS.queue_size)
+
+    try:
+        asyncio.run(serve(service, ARGS.host, ARGS.port, ARGS.socket))
+    except KeyboardInterrupt:
+        pass
+    glog.info('service stats: {}'.format(json.dumps(service.stats())))
+    service.sink.close(scheduler.failure_stats)
+    if ARGS.stream_output:
+        glog.info('See {} file for allocation results'.format(ARGS.stream_output))
@@ -0,0 +1,49 @@
+import sys
+
+from schedulers.lib.array_domain import ArrayCluster, ArrayServer
+from schedulers.lib.domain import Server
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, make_servers, random_ticks, run_ticks
+
+
+def test_views_read_and_write_the_arrays():
+    cluster = make_cluster(cluster_class=ArrayCluster)
+    server = cluster.servers['p0_r1_s2']
+    pos = server._pos
+    server.allocate_cores(3)
+    server.allocate_ram(4.5)
+    assert cluster.cores_remaining[pos] == 13
+    assert cluster.ram_remaining[pos] == 27.5
+    assert server._cores_remaining == 13 and server._ram_remaining == 27.5
+    server.free_cores(3)
+    assert cluster.cores_remaining[pos] == 16
+
+
+def test_masks_select_servers_in_cluster_order():
+    cluster = make_cluster(cluster_class=ArrayCluster)
+    servers = list(cluster.servers.values())
+    for server in servers[::3]:
+        server.allocate_cores(10)
+    for server in servers[::4]:
+        server.allocate_ram(30.0)
+    selected = cluster.select(cluster.cpu_mask(8) & cluster.ram_mask(4.0))
+    expected = [s for s in servers if s.has_cores_capacity(8) and s.has_ram_capacity(4.0)]
+    assert list(selected) == expected
+    assert len(selected) == len(expected)
+    assert expected[0] in selected and servers[0] not in selected
+
+
+def test_views_have_no_storage_slots_of_their_own():
+    cluster = make_cluster(cluster_class=ArrayCluster)
+    view = cluster.servers['p0_r0_s0']
+    assert isinstance(view, ArrayServer)
+    assert not hasattr(view, '__dict__')
+    assert sys.getsizeof(view) < sys.getsizeof(Server('s', 1, 1.0))
+
+
+def test_placements_match_the_object_cluster_for_a_seed():
+    ticks = random_ticks()
+    plain = run_ticks(NovaFilter(make_cluster(), False), ticks)
+    vectorized = run_ticks(NovaFilter(make_cluster(cluster_class=ArrayCluster), False), ticks)
+    assert vectorized == plain
@@ -0,0 +1,71 @@
+import random
+
+import schedulers.constants as const
+from schedulers.lib.weighers import make_weigher_policy
+from schedulers.novafilter import NovaFilter
+
+from util import create, delete, make_cluster, make_servers, random_ticks, run_ticks
+
+
+def deletes_first(ticks):
+    """ Ticks reordered the way schedule_batch handles them """
+    reordered = []
+    for events in ticks:
+        created = {req.vm_uuid for req in events if req.type == const.VM_CREATE_STR}
+        early = [req for req in events
+            if req.type == const.VM_DELETE_STR and req.vm_uuid not in created]
+        reordered.append(early + [req for req in events if req not in early])
+    return reordered
+
+
+def small_cluster():
+    return make_cluster(make_servers(pods=1, racks=2, servers=4, cores=8, ram=16.0))
+
+
+def test_batch_matches_sequential_on_reordered_ticks():
+    ticks = random_ticks(n_ticks=60, creates_per_tick=12, seed=4)
+    sequential = NovaFilter(small_cluster(), False)
+    expected = run_ticks(sequential, deletes_first(ticks))
+    batched = NovaFilter(small_cluster(), False, batch=True)
+    assert run_ticks(batched, ticks) == expected
+    assert batched.failure_stats == sequential.failure_stats
+    assert sequential.failure_stats[const.FAIL_VM_STR] > 0
+
+
+def test_batch_matches_sequential_with_a_weigher():
+    ticks = random_ticks(n_ticks=40, creates_per_tick=12, seed=6)
+    expected = run_ticks(NovaFilter(small_cluster(), False,
+        weigher_policy=make_weigher_policy('pack')), deletes_first(ticks))
+    batched = NovaFilter(small_cluster(), False, weigher_policy=make_weigher_policy('pack'),
+        batch=True)
+    assert run_ticks(batched, ticks) == expected
+
+
+def test_delete_within_tick_frees_capacity_for_later_creates():
+    cluster = make_cluster(make_servers(pods=1, racks=1, servers=1, cores=4, ram=8.0))
+    scheduler = NovaFilter(cluster, False, batch=True)
+    random.seed(0)
+    scheduler.schedule([create(0, 'a', 4, 8.0), delete(0, 'a'), create(0, 'b', 4, 8.0)])
+    assert scheduler.failure_stats[const.FAIL_VM_STR] == 0
+    assert [server_id for _, server_id, _ in scheduler.allocations] == ['p0_r0_s0'] * 3
+
+
+def test_records_of_a_batched_tick_share_its_latency():
+    scheduler = NovaFilter(small_cluster(), False, batch=True)
+    random.seed(0)
+    scheduler.schedule([create(0, 'vm{}'.format(i), 1, 1.0) for i in range(5)])
+    assert len({timedelta for _, _, timedelta in scheduler.allocations}) == 1
+
+
+def test_debug_runs_are_not_batched():
+    assert not NovaFilter(small_cluster(), True, batch=True).batch
+
+
+def test_deletes_of_earlier_vms_are_recorded_first():
+    scheduler = NovaFilter(small_cluster(), False, batch=True)
+    random.seed(0)
+    scheduler.schedule([create(0, 'a')])
+    scheduler.schedule([create(1, 'b'), delete(1, 'a'), create(1, 'c'), delete(1, 'c')])
+    assert [(vm.type, vm.vm_uuid) for vm, _, _ in scheduler.allocations][1:] == [
+        (const.VM_DELETE_STR, 'a'), (const.VM_CREATE_STR, 'b'), (const.VM_CREATE_STR, 'c'),
+        (const.VM_DELETE_STR, 'c')]
@@ -0,0 +1,27 @@
+from schedulers.benchmarks.bench_scheduler import find_regressions
+
+BASELINE = {'calibration_secs': 1.0, 'allocate_events_per_sec': 1000.0,
+    'allocate_p99_microsec': 50.0, 'peak_rss_mb': 100.0}
+
+
+def test_regressions_beyond_the_tolerance_are_reported():
+    assert find_regressions(dict(BASELINE), BASELINE, 0.2) == []
+    metrics = dict(BASELINE, allocate_events_per_sec=700.0, allocate_p99_microsec=55.0,
+        peak_rss_mb=130.0)
+    regressions = find_regressions(metrics, BASELINE, 0.2)
+    assert [message.split(':')[0] for message in regressions] == \
+        ['allocate_events_per_sec', 'peak_rss_mb']
+
+
+def test_timed_metrics_are_scaled_by_the_calibration():
+    # the same code on a machine twice as slow
+    slower = dict(BASELINE, calibration_secs=2.0, allocate_events_per_sec=500.0,
+        allocate_p99_microsec=100.0)
+    assert find_regressions(slower, BASELINE, 0.2) == []
+    # without a calibration, the timings are compared as they are
+    uncalibrated = {name: value for name, value in slower.items() if name != 'calibration_secs'}
+    assert [message.split(':')[0] for message in find_regressions(uncalibrated, BASELINE, 0.2)] \
+        == ['allocate_events_per_sec', 'allocate_p99_microsec']
+    # memory does not depend on the speed of the machine
+    assert [message.split(':')[0] for message in
+        find_regressions(dict(slower, peak_rss_mb=150.0), BASELINE, 0.2)] == ['peak_rss_mb']
@@ -0,0 +1,57 @@
+import random
+
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, make_servers, random_ticks, run_ticks
+
+
+def linear_candidates(servers, cores):
+    return [server for server in servers if server.has_cores_capacity(cores)]
+
+
+def test_candidates_match_linear_scan_in_cluster_order():
+    cluster = make_cluster(make_servers(cores=8))
+    index = cluster.build_capacity_index()
+    servers = list(cluster.servers.values())
+    rng = random.Random(3)
+    for _ in range(500):
+        server = rng.choice(servers)
+        cores = rng.randint(1, 4)
+        if rng.random() < 0.6:
+            server.allocate_cores(cores)
+        elif server._cores_remaining + cores <= server.cores:
+            server.free_cores(cores)
+        wanted = rng.randint(0, 8)
+        assert index.cpu_candidates(wanted) == linear_candidates(servers, wanted)
+
+
+def test_buckets_stay_sorted_by_position():
+    cluster = make_cluster(make_servers(cores=8))
+    index = cluster.build_capacity_index()
+    servers = list(cluster.servers.values())
+    for server in reversed(servers[::3]):
+        server.allocate_cores(2)
+    for server in servers[::6]:
+        server.free_cores(2)
+    for bucket in index._core_buckets.values():
+        assert bucket == sorted(bucket)
+
+
+def test_max_remaining_rejects_requests_that_fit_nowhere():
+    cluster = make_cluster(make_servers(pods=1, racks=1, servers=2, cores=4, ram=8.0))
+    index = cluster.build_capacity_index()
+    assert index.may_fit(4, 8.0)
+    assert not index.may_fit(5, 1.0)
+    assert not index.may_fit(1, 9.0)
+    for server in cluster.servers.values():
+        server.allocate_ram(6.0)
+    assert index.max_ram_remaining() == 2.0
+    assert not index.may_fit(1, 3.0)
+
+
+def test_placements_match_linear_filters_for_a_seed():
+    ticks = random_ticks()
+    plain = run_ticks(NovaFilter(make_cluster(), False), ticks)
+    indexed_cluster = make_cluster()
+    indexed_cluster.build_capacity_index()
+    assert run_ticks(NovaFilter(indexed_cluster, False), ticks) == plain
@@ -0,0 +1,118 @@
+import random
+import threading
+
+import pytest
+
+from schedulers.lib.checkpoint import (apply_what_if, fork_what_ifs, load_checkpoint,
+    parse_what_if, save_checkpoint)
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, make_servers, placements, random_ticks, write_workload
+
+
+def small_cluster(servers=4):
+    return make_cluster(make_servers(pods=1, racks=2, servers=servers, cores=8, ram=16.0))
+
+
+def replay(scheduler, replayer, until_tick=None):
+    events = replayer.replay()
+    while len(events) > 0:
+        scheduler.schedule(events)
+        if until_tick is not None and replayer.currTick >= until_tick:
+            return
+        events = replayer.replay()
+
+
+@pytest.fixture
+def workload_path(tmp_path):
+    return write_workload(str(tmp_path / 'workload.json'),
+        random_ticks(n_ticks=40, creates_per_tick=12, seed=2))
+
+
+def loaded(workload_path):
+    replayer = WorkloadReplayer()
+    replayer.load_workload(workload_path)
+    return replayer
+
+
+def test_restored_run_continues_like_an_uninterrupted_one(workload_path, tmp_path):
+    random.seed(1)
+    uninterrupted = NovaFilter(small_cluster(), False)
+    replay(uninterrupted, loaded(workload_path))
+
+    random.seed(1)
+    first = NovaFilter(small_cluster(), False)
+    replayer = loaded(workload_path)
+    replay(first, replayer, until_tick=15)
+    checkpoint_path = str(tmp_path / 'checkpoint')
+    save_checkpoint(checkpoint_path, first, replayer)
+    done = len(first.allocations)
+
+    random.seed(99)
+    restored = NovaFilter(small_cluster(), False)
+    replayer = loaded(workload_path)
+    load_checkpoint(checkpoint_path, restored, replayer)
+    assert replayer.currTick == 15
+    replay(restored, replayer)
+    assert placements(restored) == placements(uninterrupted)[done:]
+    assert restored.failure_stats == uninterrupted.failure_stats
+
+
+def test_checkpoint_of_another_topology_is_rejected(workload_path, tmp_path):
+    scheduler = NovaFilter(small_cluster(), False)
+    replayer = loaded(workload_path)
+    replay(scheduler, replayer, until_tick=5)
+    checkpoint_path = str(tmp_path / 'checkpoint')
+    save_checkpoint(checkpoint_path, scheduler, replayer)
+    with pytest.raises(SystemExit):
+        load_checkpoint(checkpoint_path, NovaFilter(small_cluster(servers=5), False),
+            loaded(workload_path))
+
+
+def test_capacity_what_if_keeps_resources_in_use():
+    scheduler = NovaFilter(small_cluster(), False)
+    server = scheduler.servers[0]
+    server.allocate_cores(2)
+    server.allocate_ram(4.0)
+    apply_what_if(scheduler, parse_what_if('capacity=2'))
+    assert (server.cores, server._cores_remaining) == (16, 14)
+    assert (server.ram, server._ram_remaining) == (32.0, 28.0)
+    with pytest.raises(ValueError):
+        parse_what_if('policy=pack')
+
+
+def test_what_if_values_are_checked():
+    assert parse_what_if('weigher=weighted,cpu_mult=-1,ram_mult=2.5,seed=3') == {
+        'weigher': 'weighted', 'cpu_mult': '-1', 'ram_mult': '2.5', 'seed': '3'}
+    assert parse_what_if('weigher=random') == {'weigher': 'random'}
+    for spec in ('weigher=packk', 'weigher=', 'seed=1.5', 'seed=x', 'capacity=big',
+            'weigher=weighted,cpu_mult=x', 'cpu_mult=2', 'ram_mult=2,seed=1'):
+        with pytest.raises(ValueError):
+            parse_what_if(spec)
+
+
+def test_each_what_if_runs_in_its_own_child(tmp_path):
+    scheduler = NovaFilter(small_cluster(), False)
+
+    def run(index):
+        (tmp_path / 'whatif{}'.format(index)).write_text(
+            str(scheduler.weigher_policy.name if scheduler.weigher_policy else None))
+
+    statuses = fork_what_ifs(scheduler, [parse_what_if('weigher=pack'), {}], run)
+    assert statuses == [0, 0]
+    assert (tmp_path / 'whatif0').read_text() == 'pack'
+    assert (tmp_path / 'whatif1').read_text() == 'None'
+    assert scheduler.weigher_policy is None
+
+
+def test_what_ifs_are_not_forked_while_threads_run():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        with pytest.raises(SystemExit):
+            fork_what_ifs(NovaFilter(small_cluster(), False), [{}], lambda index: None)
+    finally:
+        stop.set()
+        thread.join()
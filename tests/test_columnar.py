@@ -0,0 +1,59 @@
+import json
+
+from schedulers.lib.array_domain import ArrayCluster
+from schedulers.lib.columnar import (ColumnarWorkloadReplayer, StringTable, write_topology,
+    write_workload)
+from schedulers.lib.domain import Cluster
+from schedulers.lib.replay import WorkloadReplayer
+
+from util import WORKLOAD, make_servers, replay_all
+
+
+def test_string_table_round_trip():
+    strings = ['', 'vm-1', 'ünïcode', 'vm-1']
+    table = StringTable.build(strings)
+    assert len(table) == len(strings)
+    assert [table[i] for i in range(len(table))] == strings
+
+
+def test_columnar_workload_replays_like_json(tmp_path):
+    json_path = str(tmp_path / 'workload.json')
+    with open(json_path, 'w') as ff:
+        json.dump(WORKLOAD, ff)
+    columnar_path = str(tmp_path / 'workload.nfc')
+    assert write_workload(json_path, columnar_path) == 4
+
+    expected = WorkloadReplayer()
+    expected.load_workload(json_path)
+    replayer = ColumnarWorkloadReplayer()
+    replayer.load_workload(columnar_path)
+    assert replay_all(replayer) == replay_all(expected)
+
+
+def test_columnar_topology_loads_like_json(tmp_path):
+    f_servers = make_servers(cores=12, ram=24.5)
+    json_path = str(tmp_path / 'topology.json')
+    with open(json_path, 'w') as ff:
+        json.dump({'Servers': f_servers}, ff)
+    columnar_path = str(tmp_path / 'topology.nfc')
+    assert write_topology(json_path, columnar_path) == len(f_servers)
+
+    for cluster_class in (Cluster, ArrayCluster):
+        cluster = cluster_class()
+        cluster.load(columnar_path)
+        assert [(s.id, s.cores, s.ram) for s in cluster.servers.values()] == \
+            [(server_id, cores, ram) for server_id, (cores, ram) in f_servers.items()]
+
+
+def test_mapped_topology_file_is_not_modified(tmp_path):
+    json_path = str(tmp_path / 'topology.json')
+    with open(json_path, 'w') as ff:
+        json.dump({'Servers': make_servers()}, ff)
+    columnar_path = tmp_path / 'topology.nfc'
+    write_topology(json_path, str(columnar_path))
+    before = columnar_path.read_bytes()
+    cluster = ArrayCluster()
+    cluster.load(str(columnar_path))
+    next(iter(cluster.servers.values())).reset_cores(1)
+    del cluster
+    assert columnar_path.read_bytes() == before
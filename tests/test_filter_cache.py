@@ -0,0 +1,58 @@
+import random
+
+from schedulers.lib.filter_cache import FilterCache
+from schedulers.lib.weighers import make_weigher_policy
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, make_servers, random_ticks, run_ticks
+
+
+def linear_feasible(servers, cores, ram):
+    return [server for server in servers
+        if server.has_cores_capacity(cores) and server.has_ram_capacity(ram)]
+
+
+def change(rng, server):
+    if rng.random() < 0.6:
+        server.allocate_cores(min(server._cores_remaining, rng.randint(1, 3)))
+        server.allocate_ram(min(server._ram_remaining, rng.choice((1.0, 4.0))))
+    else:
+        server.free_cores(server.cores - server._cores_remaining)
+        server.free_ram(server.ram - server._ram_remaining)
+
+
+def test_feasible_matches_linear_scan_through_evictions_and_trims():
+    servers = list(make_cluster(make_servers(cores=8, ram=16.0)).servers.values())
+    cache = FilterCache(servers, max_entries=3)
+    cache._max_log = 20
+    rng = random.Random(2)
+    for _ in range(1000):
+        for _ in range(rng.randrange(4)):
+            change(rng, rng.choice(servers))
+        cores, ram = rng.randint(1, 6), rng.choice((1.0, 4.0, 8.0))
+        assert cache.feasible(cores, ram) == linear_feasible(servers, cores, ram)
+    stats = cache.stats()
+    assert stats['hits'] > 0 and stats['evictions'] > 0
+
+
+def test_change_log_stays_bounded_without_lookups():
+    servers = list(make_cluster(make_servers(cores=8, ram=16.0)).servers.values())
+    cache = FilterCache(servers)
+    cache.feasible(1, 1.0)
+    rng = random.Random(4)
+    for _ in range(5000):
+        change(rng, rng.choice(servers))
+    assert len(cache._log) <= cache._max_log
+    assert cache.feasible(1, 1.0) == linear_feasible(servers, 1, 1.0)
+
+
+def test_cache_is_not_built_with_a_weigher_policy():
+    scheduler = NovaFilter(make_cluster(), False, weigher_policy=make_weigher_policy('pack'),
+        filter_cache_size=8)
+    assert scheduler.filter_cache is None
+
+
+def test_cached_placements_match_plain_filters_for_a_seed():
+    ticks = random_ticks(n_ticks=60)
+    plain = run_ticks(NovaFilter(make_cluster(), False), ticks)
+    assert run_ticks(NovaFilter(make_cluster(), False, filter_cache_size=2), ticks) == plain
@@ -0,0 +1,76 @@
+import pytest
+
+from schedulers.lib.filters import CoreFilter, FilterChain, RamFilter, make_filter_chain
+from schedulers.novafilter import NovaFilter
+
+from util import create, make_cluster, make_servers, random_ticks, run_ticks
+
+
+class CountingList(list):
+    """ A list that records the positions read through indexing """
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.read = []
+
+    def __getitem__(self, pos):
+        self.read.append(pos)
+        return super().__getitem__(pos)
+
+
+def cluster_servers():
+    servers = list(make_cluster(make_servers(cores=8, ram=16.0)).servers.values())
+    for pos, server in enumerate(servers):
+        server.allocate_cores(pos % 8)
+        server.allocate_ram(float(pos % 5) * 4)
+    return servers
+
+
+def test_chain_passes_the_servers_fitting_every_filter():
+    servers = cluster_servers()
+    req = create(0, 'vm', 4, 8.0)
+    expected = [server for server in servers
+        if server.has_cores_capacity(4) and server.has_ram_capacity(8.0)]
+    assert list(make_filter_chain(['ram', 'cpu']).passing(req, servers)) == expected
+
+
+def test_first_wraps_around_from_the_offset_without_reading_before_it():
+    servers = cluster_servers()
+    req = create(0, 'vm', 1, 1.0)
+    fitting = [pos for pos, server in enumerate(servers)
+        if server.has_cores_capacity(1) and server.has_ram_capacity(1.0)]
+    offset = fitting[-2]
+    counting = CountingList(servers)
+    subset = make_filter_chain(['cpu', 'ram']).first(req, counting, 3, offset)
+    assert subset == [servers[pos] for pos in fitting[-2:] + fitting[:1]]
+    assert counting.read[0] == offset
+    assert counting.read[-1] == fitting[0]
+
+
+def test_adaptive_chain_runs_the_most_selective_filter_first():
+    servers = cluster_servers()
+    chain = make_filter_chain(['cpu', 'ram'], adaptive=True, reorder_interval=10)
+    for _ in range(10):
+        list(chain.passing(create(0, 'vm', 1, 14.0), servers))
+    assert [host_filter.name for host_filter in chain.filters] == ['ram', 'cpu']
+
+
+@pytest.mark.parametrize('names', [['cpu'], ['ram'], ['cpu', 'ram', 'cpu'], []])
+def test_chain_must_run_each_filter_once(names):
+    with pytest.raises(ValueError):
+        make_filter_chain(names)
+
+
+def test_chain_placements_match_plain_filters_for_a_seed():
+    ticks = random_ticks()
+    plain = run_ticks(NovaFilter(make_cluster(), False), ticks)
+    chain = FilterChain([RamFilter(), CoreFilter()], adaptive=True, reorder_interval=5)
+    assert run_ticks(NovaFilter(make_cluster(), False, filter_chain=chain), ticks) == plain
+
+
+def test_host_subset_places_only_on_fitting_servers():
+    scheduler = NovaFilter(make_cluster(make_servers(cores=4, ram=4.0)), False, host_subset_size=2)
+    run_ticks(scheduler, random_ticks(n_ticks=60, seed=3))
+    for server in scheduler.servers:
+        assert server._cores_remaining >= 0 and server._ram_remaining >= 0
+    assert scheduler.failure_stats['fail_vms'] > 0
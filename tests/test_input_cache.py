@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+from schedulers.lib.input_cache import KIND_TOPOLOGY, InputCache, write_cache_file
+from schedulers.lib.replay import WorkloadReplayer
+
+from util import WORKLOAD, make_servers, replay_all
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    topology_path = tmp_path / 'topology.json'
+    topology_path.write_text(json.dumps({'Servers': make_servers()}))
+    workload_path = tmp_path / 'workload.json'
+    workload_path.write_text(json.dumps(WORKLOAD))
+    return str(topology_path), str(workload_path)
+
+
+def parsed_workload(workload_path):
+    replayer = WorkloadReplayer()
+    replayer.load_workload(workload_path)
+    return replay_all(replayer)
+
+
+def test_cached_inputs_match_parsed_ones(inputs, tmp_path):
+    topology_path, workload_path = inputs
+    cache = InputCache(str(tmp_path / 'cache'))
+    for _ in range(2):
+        assert cache.servers(topology_path) == make_servers()
+        assert replay_all(cache.workload_replayer(workload_path)) == \
+            parsed_workload(workload_path)
+    assert len(os.listdir(str(tmp_path / 'cache'))) == 2
+
+
+@pytest.mark.parametrize('damage', [lambda data: b'', lambda data: data[:len(data) // 2],
+    lambda data: data[:20], lambda data: b'garbage' * 10])
+def test_unreadable_cache_files_are_rewritten(inputs, tmp_path, damage):
+    topology_path, workload_path = inputs
+    cache_dir = tmp_path / 'cache'
+    cache = InputCache(str(cache_dir))
+    cache.servers(topology_path)
+    cache.workload_replayer(workload_path)
+    for path in cache_dir.iterdir():
+        path.write_bytes(damage(path.read_bytes()))
+
+    assert cache.servers(topology_path) == make_servers()
+    assert replay_all(cache.workload_replayer(workload_path)) == parsed_workload(workload_path)
+    assert replay_all(InputCache(str(cache_dir)).workload_replayer(workload_path)) == \
+        parsed_workload(workload_path)
+
+
+def test_failed_write_leaves_no_temporary_file(tmp_path):
+    with pytest.raises(TypeError):
+        write_cache_file(str(tmp_path / 'cache'), KIND_TOPOLOGY, [b'blob', 'not bytes'])
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,98 @@
+import io
+import json
+import math
+import random
+
+import pytest
+
+from schedulers.lib.latency import (MAX_EXP, MIN_EXP, N_BUCKETS, SUB_BUCKETS, LogHistogram,
+    PhaseStats, bucket_index, bucket_upper_bound)
+from schedulers.lib.weighers import make_weigher_policy
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, random_ticks, run_ticks
+
+
+class Output(io.StringIO):
+    """ A tick output whose lines can still be read after close() """
+
+    def close(self):
+        self.lines = [json.loads(line) for line in self.getvalue().splitlines()]
+
+
+def test_buckets_at_powers_of_two():
+    for exp in range(MIN_EXP, MAX_EXP):
+        value = math.ldexp(1.0, exp)
+        index = bucket_index(value)
+        # a power of two starts a bucket, the value just below it ends the previous one
+        assert bucket_upper_bound(index - 1) == value
+        assert bucket_index(math.nextafter(value, 0.0)) == index - 1
+        assert bucket_upper_bound(index) == value * (1 + 1 / SUB_BUCKETS)
+
+
+def test_values_outside_the_buckets_are_clamped():
+    assert bucket_index(0.0) == bucket_index(-5.0) == 0
+    assert bucket_index(math.ldexp(1.0, MIN_EXP - 5)) == 0
+    assert bucket_index(math.ldexp(1.0, MAX_EXP)) == N_BUCKETS - 1
+    assert bucket_index(1e300) == N_BUCKETS - 1
+    assert bucket_upper_bound(N_BUCKETS - 1) == math.ldexp(1.0, MAX_EXP)
+
+
+def test_percentiles_are_within_the_bucket_error():
+    rng = random.Random(11)
+    values = [rng.lognormvariate(4, 2) for _ in range(5000)]
+    hist = LogHistogram()
+    for value in values:
+        hist.record(value)
+    values.sort()
+    for q in (1.0, 50.0, 90.0, 99.0, 99.9):
+        exact = values[int(math.ceil(q / 100 * len(values))) - 1]
+        assert exact <= hist.percentile(q) <= exact * (1 + 1 / SUB_BUCKETS)
+    assert hist.percentile(100.0) == hist.max == values[-1]
+    assert hist.summary()['mean'] == pytest.approx(sum(values) / len(values))
+
+
+def test_percentile_is_capped_at_the_largest_value():
+    hist = LogHistogram()
+    assert hist.percentile(50.0) == 0.0
+    hist.record(100.0)
+    assert bucket_upper_bound(bucket_index(100.0)) > 100.0
+    assert hist.percentile(50.0) == hist.percentile(99.9) == 100.0
+
+
+def test_end_tick_writes_a_line_and_resets_only_the_tick():
+    output = Output()
+    stats = PhaseStats(output)
+    for value in (1.0, 2.0, 3.0):
+        stats.phase('place_vm').record(value)
+    stats.phase('deallocate')
+    stats.end_tick('tick_0')
+    stats.phase('place_vm').record(10.0)
+    stats.end_tick('tick_1')
+    stats.close()
+    (first, second), run = output.lines[:2], output.lines[2]['run']
+    assert (first['tick'], first['place_vm']['count'], first['place_vm']['max']) == \
+        ('tick_0', 3, 3.0)
+    # phases without calls in the tick are left out
+    assert sorted(first) == ['place_vm', 'tick']
+    assert (second['place_vm']['count'], second['place_vm']['max']) == (1, 10.0)
+    assert (run['place_vm']['count'], run['place_vm']['max']) == (4, 10.0)
+    assert sorted(run) == ['place_vm']
+    assert stats.phases['place_vm'].tick.count == 0
+
+
+def test_close_without_tick_output_keeps_the_summary():
+    stats = PhaseStats()
+    stats.phase('weigher').record(5.0)
+    stats.end_tick('tick_0')
+    stats.close()
+    assert stats.summary()['weigher']['count'] == 1
+
+
+def test_instrumented_weigher_is_left_untouched():
+    weigher = make_weigher_policy('pack')
+    stats = PhaseStats()
+    scheduler = NovaFilter(make_cluster(), False, weigher_policy=weigher, phase_stats=stats)
+    run_ticks(scheduler, random_ticks(n_ticks=5, seed=12))
+    assert 'best' not in vars(weigher) and 'top' not in vars(weigher)
+    assert stats.summary()['weigher']['count'] > 0
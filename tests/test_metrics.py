@@ -0,0 +1,81 @@
+import io
+import json
+
+import pytest
+
+from schedulers.lib.metrics import UtilizationMetrics
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, make_servers, random_ticks
+
+
+class Output(io.StringIO):
+    """ A tick output whose lines can still be read after close() """
+
+    def close(self):
+        self.lines = [json.loads(line) for line in self.getvalue().splitlines()]
+
+
+def recomputed(servers, min_cores=1.0, min_ram=0.5):
+    """ Aggregates of a fresh pass over the servers """
+    metrics = UtilizationMetrics(io.StringIO(), min_cores, min_ram)
+    metrics.attach(servers)
+    snapshot = metrics.snapshot()
+    for server in servers:
+        server.remove_observer(metrics)
+    return snapshot
+
+
+def test_running_metrics_match_a_fresh_pass():
+    metrics = UtilizationMetrics(Output(), min_cores=2.0, min_ram=4.0)
+    scheduler = NovaFilter(make_cluster(make_servers(cores=8, ram=16.0)), False,
+        metrics=metrics)
+    servers = scheduler.servers
+    for events in random_ticks(n_ticks=40, creates_per_tick=12, seed=8):
+        scheduler.schedule(events)
+        assert metrics.snapshot() == pytest.approx(recomputed(servers, 2.0, 4.0))
+    servers[0].set_remaining(1, 2.0)
+    servers[1].reset_cores(4)
+    assert metrics.snapshot() == pytest.approx(recomputed(servers, 2.0, 4.0))
+
+
+def test_stranded_resources_and_fragmentation():
+    metrics = UtilizationMetrics(Output(), min_cores=1.0, min_ram=2.0)
+    servers = list(make_cluster(make_servers(pods=1, racks=1, servers=3, cores=4,
+        ram=8.0)).servers.values())
+    metrics.attach(servers)
+    assert (metrics.idle_hosts, metrics.full_hosts, metrics.fragmentation()) == (3, 0, 0.0)
+    # cores left, no RAM left
+    servers[0].allocate_cores(1)
+    servers[0].allocate_ram(7.0)
+    # RAM left, no cores left
+    servers[1].allocate_cores(4)
+    servers[1].allocate_ram(2.0)
+    snapshot = metrics.snapshot()
+    assert (snapshot['full_hosts'], snapshot['idle_hosts']) == (2, 1)
+    assert (snapshot['stranded_cores'], snapshot['stranded_ram']) == (3.0, 6.0)
+    # 3 of 7 free cores and 6 of 15 free GB are stranded
+    assert snapshot['fragmentation'] == pytest.approx((3 / 7 + 6 / 15) / 2)
+    assert snapshot['cores_utilization'] == pytest.approx(5 / 12)
+
+
+def test_a_line_per_tick_and_a_run_summary():
+    output = Output()
+    metrics = UtilizationMetrics(output)
+    scheduler = NovaFilter(make_cluster(make_servers(pods=2, racks=1, servers=2, cores=8,
+        ram=16.0)), False, metrics=metrics)
+    ticks = random_ticks(n_ticks=10, seed=9)
+    for events in ticks:
+        scheduler.schedule(events)
+    scheduler.schedule([])
+    metrics.close()
+    lines, run = output.lines[:-1], output.lines[-1]['run']
+    assert [line['tick'] for line in lines] == [events[0].tick for events in ticks]
+    assert list(lines[0])[0] == 'tick'
+    for line in lines:
+        assert sorted(line['pods']) == ['p0', 'p1']
+        assert sum(used[0] for used in line['pods'].values()) == line['used_cores']
+    assert run['ticks'] == len(ticks)
+    assert run['peak']['cores_utilization'] == max(line['cores_utilization'] for line in lines)
+    assert run['peak']['full_hosts'] == max(line['full_hosts'] for line in lines)
+    assert run['last'] == metrics.snapshot()
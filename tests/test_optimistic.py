@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+import schedulers.constants as const
+from schedulers.lib.optimistic import SchedulerWorker, partition_events, simulate
+
+from util import make_servers, random_ticks
+
+
+def test_events_of_a_vm_go_to_one_worker():
+    ticks = random_ticks(n_ticks=40, creates_per_tick=12)
+    shares = partition_events(ticks, 3)
+    assert all(len(share) == len(ticks) for share in shares)
+    workers = dict()
+    for worker, share in enumerate(shares):
+        for events in share:
+            for _, vm_uuid, _, _ in events:
+                assert workers.setdefault(vm_uuid, worker) == worker
+    assert sum(len(events) for share in shares for events in share) == \
+        sum(len(events) for events in ticks)
+
+
+@pytest.mark.parametrize('n_workers', [1, 3])
+def test_every_create_is_placed_or_reported(n_workers):
+    ticks = random_ticks(n_ticks=30, creates_per_tick=10)
+    n_creates = sum(1 for events in ticks for req in events if req.type == const.VM_CREATE_STR)
+    result = simulate(make_servers(cores=8, ram=16.0), ticks, n_workers)
+    assert result['workers'] == n_workers
+    assert result['creates'] == n_creates
+    if n_workers == 1:
+        assert result['conflicts'] == 0
+
+
+def test_failing_worker_aborts_the_run_instead_of_hanging(monkeypatch):
+    def fail(self, vm_uuid, cores, ram):
+        raise ValueError('worker failure')
+
+    monkeypatch.setattr(SchedulerWorker, 'place', fail)
+    start_time = time.perf_counter()
+    with pytest.raises(RuntimeError):
+        simulate(make_servers(), random_ticks(), 2, timeout=30.0)
+    assert time.perf_counter() - start_time < 30.0
@@ -0,0 +1,102 @@
+import json
+import random
+
+from schedulers.lib.output import AllocationLog, JsonLinesAllocationWriter, json_lines_to_allocs
+from schedulers.novafilter import NovaFilter
+
+from util import create, delete, make_cluster, random_ticks, run_ticks
+
+
+def read_lines(path):
+    with open(path) as ff:
+        return [json.loads(line) for line in ff]
+
+
+def test_allocation_log_iterates_in_insertion_order():
+    log = AllocationLog()
+    a, b = create(0, 'a'), delete(1, 'a')
+    log.append(a, 's0', 1.5)
+    log.append(b, 's0', 2.5)
+    assert list(log) == [(a, 's0', 1.5), (b, 's0', 2.5)]
+    assert list(log.timedeltas()) == [1.5, 2.5]
+
+
+def test_tick_is_written_at_its_own_end(tmp_path):
+    path = str(tmp_path / 'allocs.jsonl')
+    scheduler = NovaFilter(make_cluster(), False, output_sink=JsonLinesAllocationWriter(path))
+    scheduler.schedule([create(0, 'a'), create(0, 'b')])
+    lines = read_lines(path)
+    assert [list(line) for line in lines] == [['tick_0']]
+    assert [record['vm_uuid'] for record in lines[0]['tick_0']] == ['a', 'b']
+
+
+def test_converted_stream_matches_in_memory_output(tmp_path):
+    ticks = random_ticks()
+    in_memory = str(tmp_path / 'allocs.json')
+    scheduler = NovaFilter(make_cluster(), False)
+    run_ticks(scheduler, ticks)
+    scheduler.output_allocations(in_memory)
+
+    stream = str(tmp_path / 'allocs.jsonl')
+    converted = str(tmp_path / 'converted.json')
+    scheduler = NovaFilter(make_cluster(), False, output_sink=JsonLinesAllocationWriter(stream))
+    run_ticks(scheduler, ticks)
+    scheduler.output_allocations(converted, convert_stream=True)
+
+    def strip(allocs):
+        return {tick: [{k: v for k, v in record.items() if k != 'elapsed_microsec'}
+            for record in records] if isinstance(records, list) else records
+            for tick, records in allocs.items()}
+    with open(in_memory) as a, open(converted) as b:
+        assert strip(json.load(b)) == strip(json.load(a))
+
+
+def test_conversion_merges_recurring_ticks(tmp_path):
+    stream = tmp_path / 'allocs.jsonl'
+    stream.write_text('{"tick_0":[{"vm_uuid":"a"}]}\n{"tick_1":[{"vm_uuid":"b"}]}\n'
+        '{"tick_0":[{"vm_uuid":"c"}]}\n{"failure_stats":{"fail_vms":0}}\n')
+    output = str(tmp_path / 'allocs.json')
+    json_lines_to_allocs(str(stream), output)
+    with open(output) as ff:
+        text = ff.read()
+    assert text.count('"tick_0"') == 1
+    allocs = json.loads(text)
+    assert list(allocs) == ['tick_0', 'tick_1', 'failure_stats']
+    assert allocs['tick_0'] == [{'vm_uuid': 'a'}, {'vm_uuid': 'c'}]
+
+
+def merged(lines):
+    """ Entries of the stream lines by first appearance, recurring lists joined """
+    entries = dict()
+    for line in lines:
+        (key, value), = line.items()
+        if isinstance(entries.get(key), list) and isinstance(value, list):
+            entries[key] = entries[key] + value
+        else:
+            entries[key] = value
+    return list(entries.items())
+
+
+def test_conversion_of_reused_and_late_ticks_matches_merging_in_memory(tmp_path):
+    rng = random.Random(15)
+    for _ in range(50):
+        lines = []
+        tick = 0
+        for n in range(rng.randrange(1, 30)):
+            roll = rng.random()
+            if roll < 0.2 and tick > 0:
+                # a tick id used again, or a late tick
+                key = 'tick_{}'.format(rng.randrange(tick + 3))
+            elif roll < 0.3:
+                key = rng.choice(['failure_stats', 'other'])
+            else:
+                tick += rng.randrange(2)
+                key = 'tick_{}'.format(tick)
+            value = {'n': n} if key in ('failure_stats', 'other') else [{'vm_uuid': n}]
+            lines.append({key: value})
+        stream = tmp_path / 'allocs.jsonl'
+        stream.write_text(''.join(json.dumps(line) + '\n' for line in lines))
+        output = str(tmp_path / 'allocs.json')
+        json_lines_to_allocs(str(stream), output)
+        with open(output) as ff:
+            assert list(json.load(ff).items()) == merged(lines)
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from schedulers.lib.output import JsonLinesAllocationWriter
+from schedulers.lib.pipeline import PipelinedAllocationWriter, PrefetchingReplayer
+from schedulers.lib.replay import WorkloadReplayer
+
+from util import create, make_servers, random_ticks, replay_all, write_workload
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded(workload_path):
+    replayer = WorkloadReplayer()
+    replayer.load_workload(workload_path)
+    return replayer
+
+
+@pytest.fixture
+def workload_path(tmp_path):
+    return write_workload(str(tmp_path / 'workload.json'), random_ticks(seed=3))
+
+
+def test_prefetching_replayer_matches_plain_replay(workload_path):
+    expected = replay_all(loaded(workload_path))
+    replayer = PrefetchingReplayer(loaded(workload_path), depth=2)
+    assert replay_all(replayer) == expected
+    assert replayer.replay() == []
+    assert replayer.currTick == len(expected)
+
+
+def test_prefetching_replayer_starts_where_it_was_seeked(workload_path):
+    expected = replay_all(loaded(workload_path))
+    replayer = PrefetchingReplayer(loaded(workload_path), depth=2)
+    replayer.seek(5)
+    first = replayer.replay()
+    with pytest.raises(SystemExit):
+        replayer.seek(0)
+    assert [[(e.tick, e.type, e.vm_uuid, e.cores, e.ram) for e in first]] + \
+        replay_all(replayer) == expected[5:]
+
+
+def test_pipelined_output_matches_direct_output(tmp_path):
+    ticks = random_ticks(seed=4)
+    failure_stats = {'vm': 2}
+    paths = []
+    for sink_class in (JsonLinesAllocationWriter, PipelinedAllocationWriter):
+        path = str(tmp_path / '{}.jsonl'.format(sink_class.__name__))
+        sink = sink_class(path)
+        for n, events in enumerate(ticks):
+            for req in events:
+                sink.write(req, 'p0_r0_s{}'.format(n % 4), 0.5)
+            sink.flush_tick()
+        sink.close(failure_stats)
+        paths.append(path)
+    direct, pipelined = [open(path).read() for path in paths]
+    assert pipelined == direct
+
+
+def test_failing_pipelined_run_exits(tmp_path):
+    topology = str(tmp_path / 'topology.json')
+    with open(topology, 'w') as ff:
+        json.dump({'Servers': make_servers(pods=1, racks=1, servers=4)}, ff)
+    ticks = [[create(tick, 'vm{}'.format(tick))] for tick in range(20)]
+    workload = write_workload(str(tmp_path / 'workload.json'), ticks)
+    with open(workload) as ff:
+        events = json.load(ff)
+    events['tick_20'] = [{'type': 'resize', 'vdc_uuid': 'vdc', 'vm_uuid': 'vm0'}]
+    with open(workload, 'w') as ff:
+        json.dump(events, ff)
+
+    stream = str(tmp_path / 'allocs.jsonl')
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    # the run used to hang at exit, waiting for the allocation writer
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'schedulers', 'run_schedulers.py'),
+        '-nf', '-p', topology, '-w', workload, '--no-input-cache',
+        '-o', str(tmp_path / 'allocs.json'), '--stream-output', stream, '--pipeline-depth', '2'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60)
+    assert result.returncode == 1
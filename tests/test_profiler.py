@@ -0,0 +1,107 @@
+import io
+import json
+
+import pytest
+
+from schedulers.lib.profiler import NO_PHASE, SamplingProfiler, frame_name, parse_tick_range
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, make_servers, random_ticks
+
+
+class Output(io.StringIO):
+    """ A profile output that can still be read after close() """
+
+    def close(self):
+        self.text = self.getvalue()
+
+
+def schedule():
+    pass
+
+
+def place():
+    pass
+
+
+def helper():
+    pass
+
+
+def code(func):
+    return func.__code__
+
+
+def test_parse_tick_range():
+    assert parse_tick_range('10:20') == (10, 20)
+    assert parse_tick_range(':20') == (None, 20)
+    assert parse_tick_range('10:') == (10, None)
+    assert parse_tick_range(':') == (None, None)
+    for spec in ('10', '20:10', '10:10', 'a:b'):
+        with pytest.raises(ValueError):
+            parse_tick_range(spec)
+
+
+def test_in_range_excludes_the_end_tick():
+    profiler = SamplingProfiler(Output(), first_tick=10, end_tick=20)
+    assert [profiler.in_range('tick_{}'.format(tick)) for tick in (9, 10, 19, 20)] == \
+        [False, True, True, False]
+    assert SamplingProfiler(Output(), end_tick=20).in_range('tick_0')
+    assert SamplingProfiler(Output()).in_range('tick_1000')
+    with pytest.raises(ValueError):
+        SamplingProfiler(Output(), 'pstats')
+
+
+def profiled(output_format):
+    """ A profiler with two ticks of made-up samples, 2 ms of CPU time each """
+    profiler = SamplingProfiler(Output(), output_format)
+    profiler.attach(schedule, [(place, 'filter')])
+    in_place = (code(helper), code(place), code(schedule))
+    outside = (code(helper), code(schedule))
+    profiler.ticks = [('tick_0', 0.002, {in_place: 3, outside: 1}),
+        ('tick_1', 0.002, {in_place: 4})]
+    profiler.close()
+    return profiler.output.text
+
+
+def test_collapsed_stacks_are_rooted_at_their_phase():
+    lines = profiled('collapsed').splitlines()
+    assert lines == sorted(lines)
+    values = dict(line.rsplit(' ', 1) for line in lines)
+    names = [frame_name(code(func)) for func in (schedule, place, helper)]
+    assert values == {
+        ';'.join(['filter'] + names): str(1500 + 2000),
+        ';'.join([NO_PHASE, names[0], names[2]]): '500'}
+
+
+def test_speedscope_has_a_profile_per_tick():
+    profile = json.loads(profiled('speedscope'))
+    frames = [frame['name'] for frame in profile['shared']['frames']]
+    assert [p['name'] for p in profile['profiles']] == ['tick_0', 'tick_1']
+    first = profile['profiles'][0]
+    assert first['unit'] == 'milliseconds'
+    assert first['weights'] == pytest.approx([1.5, 0.5])
+    assert first['endValue'] == pytest.approx(2.0)
+    assert [[frames[i] for i in stack] for stack in first['samples']] == [
+        ['filter', frame_name(code(schedule)), frame_name(code(place)), frame_name(code(helper))],
+        [NO_PHASE, frame_name(code(schedule)), frame_name(code(helper))]]
+
+
+def test_sampled_run_covers_the_scheduling_phases():
+    profiler = SamplingProfiler(Output(), interval=0.0002, first_tick=2)
+    scheduler = NovaFilter(make_cluster(make_servers(pods=4, racks=8, servers=16)), False,
+        profiler=profiler)
+    ticks = random_ticks(n_ticks=200, creates_per_tick=40, seed=10)
+    for events in ticks:
+        scheduler.schedule(events)
+        if profiler.samples >= 200:
+            break
+    profiler.close()
+    assert profiler.samples > 0
+    assert all(profiler.in_range(tick_id) for tick_id, _, _ in profiler.ticks)
+    summary = profiler.summary()
+    assert summary['samples'] == profiler.samples
+    assert sum(summary['phases'].values()) == pytest.approx(1.0)
+    assert set(summary['phases']) - {NO_PHASE}
+    for line in profiler.output.text.splitlines():
+        assert frame_name(code(NovaFilter.schedule)) in line.split(';')[1]
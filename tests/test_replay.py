@@ -0,0 +1,64 @@
+import io
+import json
+
+import pytest
+
+from schedulers.lib.replay import (StreamingWorkloadReplayer, WorkloadReplayer,
+    iter_json_object_items, write_json_lines)
+
+from util import WORKLOAD, replay_all
+
+
+@pytest.fixture
+def workload_path(tmp_path):
+    path = tmp_path / 'workload.json'
+    path.write_text(json.dumps(WORKLOAD, indent=4))
+    return str(path)
+
+
+def loaded(replayer_class, path):
+    replayer = replayer_class()
+    replayer.load_workload(path)
+    return replayer
+
+
+def test_streaming_matches_full_load(workload_path):
+    expected = replay_all(loaded(WorkloadReplayer, workload_path))
+    assert len(expected) == 3
+    assert replay_all(loaded(StreamingWorkloadReplayer, workload_path)) == expected
+
+
+def test_streaming_counts_ticks_without_keeping_them(workload_path):
+    replayer = loaded(StreamingWorkloadReplayer, workload_path)
+    replay_all(replayer)
+    assert replayer.currTick == 3
+    assert replayer.keys == []
+
+
+def test_line_delimited_matches_full_load(workload_path, tmp_path):
+    jsonl_path = str(tmp_path / 'workload.jsonl')
+    assert write_json_lines(workload_path, jsonl_path) == 3
+    assert (replay_all(loaded(StreamingWorkloadReplayer, jsonl_path)) ==
+        replay_all(loaded(WorkloadReplayer, workload_path)))
+
+
+def test_incremental_parser_handles_values_split_across_reads():
+    text = json.dumps({'tick_1': [{'cores': 123456789}], 'other': 'x' * 100, 'tick_2': []})
+    assert list(iter_json_object_items(io.StringIO(text), chunk_size=3)) == [
+        ('tick_1', [{'cores': 123456789}]), ('other', 'x' * 100), ('tick_2', [])]
+    assert list(iter_json_object_items(io.StringIO(' { } '))) == []
+
+
+def test_seek_skips_ticks_forwards(workload_path):
+    replayer = loaded(StreamingWorkloadReplayer, workload_path)
+    replayer.seek(2)
+    assert [e.tick for e in replayer.replay()] == ['tick_12']
+
+
+def test_out_of_order_ticks_exit(tmp_path):
+    path = tmp_path / 'workload.jsonl'
+    path.write_text('{"tick_3": []}\n{"tick_1": []}\n')
+    replayer = loaded(StreamingWorkloadReplayer, str(path))
+    replayer.replay()
+    with pytest.raises(SystemExit):
+        replayer.replay()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import random
+
+from schedulers.lib.service import SchedulingService, encode_message
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, make_servers
+
+
+def create(req_id, vm_uuid, cores=1, ram=1.0):
+    return {'id': req_id, 'type': 'create', 'vdc_uuid': 'vdc', 'vm_uuid': vm_uuid,
+        'cores': cores, 'ram_in_gb': ram}
+
+
+def delete(req_id, vm_uuid):
+    return {'id': req_id, 'type': 'delete', 'vdc_uuid': 'vdc', 'vm_uuid': vm_uuid}
+
+
+async def exchange(path, messages):
+    """ Pipeline messages on one connection and read a response per message """
+    for _ in range(200):
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            await asyncio.sleep(0.01)
+    writer.write(b''.join(msg if isinstance(msg, bytes) else encode_message(msg)
+        for msg in messages))
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in messages]
+    writer.close()
+    return responses
+
+
+def serve(service, path, *rounds):
+    """ Responses of every round of messages, each sent on its own connection """
+    async def main():
+        task = asyncio.ensure_future(service.serve(path=path))
+        try:
+            return [await exchange(path, messages) for messages in rounds]
+        finally:
+            service.stop()
+            await task
+    return asyncio.run(main())
+
+
+def make_service(**kwargs):
+    random.seed(0)
+    cluster = make_cluster(make_servers(pods=1, racks=1, servers=2, cores=4, ram=8.0))
+    return SchedulingService(NovaFilter(cluster, False), **kwargs)
+
+
+def test_responses_follow_request_order(tmp_path):
+    service = make_service()
+    responses, = serve(service, str(tmp_path / 'sock'), [create(1, 'a', 4, 8.0),
+        create(2, 'b', 4, 8.0), create(3, 'c', 4, 8.0), delete(4, 'a'), {'id': 5, 'type': 'stats'}])
+    assert [response['id'] for response in responses] == [1, 2, 3, 4, 5]
+    assert {responses[0]['server'], responses[1]['server']} == {'p0_r0_s0', 'p0_r0_s1'}
+    assert responses[2]['server'] == 'failed'
+    assert responses[3]['server'] == responses[0]['server']
+    assert responses[4]['stats']['requests'] == 5
+
+
+def test_invalid_requests_are_rejected(tmp_path):
+    service = make_service()
+    responses, = serve(service, str(tmp_path / 'sock'), [b'not json\n', create(1, 'a'),
+        create(2, 'a'), delete(3, 'b'), create(4, 'c', cores=0), {'id': 5, 'type': 'resize'}])
+    assert 'server' in responses[1]
+    assert [sorted(response) for response in responses[2:]] == [['error', 'id']] * 4
+    assert 'error' in responses[0]
+    assert service.n_errors == 5
+
+
+def test_requests_within_the_window_are_coalesced(tmp_path):
+    service = make_service(window=0.05)
+    responses, = serve(service, str(tmp_path / 'sock'),
+        [create(i, 'vm{}'.format(i)) for i in range(8)])
+    assert all('server' in response for response in responses)
+    assert service.n_batches < 8
+    assert service.n_scheduled == 8
+
+
+def test_failed_batch_is_rejected_and_service_goes_on(tmp_path):
+    service = make_service()
+    schedule = service.scheduler.schedule
+
+    def exit_once(events):
+        service.scheduler.schedule = schedule
+        raise SystemExit(1)
+
+    service.scheduler.schedule = exit_once
+    failed, served = serve(service, str(tmp_path / 'sock'), [create(1, 'a')], [create(2, 'b')])
+    assert failed == [{'id': 1, 'error': 'scheduling failed'}]
+    assert 'server' in served[0]
+    assert not service.sink.pending
@@ -0,0 +1,58 @@
+import random
+import sys
+
+import numpy as np
+import pytest
+
+from schedulers.lib.array_domain import ArrayCluster
+from schedulers.lib.sharding import partition_servers
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, make_servers, random_ticks, run_ticks
+
+
+@pytest.fixture
+def sharded_cluster():
+    cluster = make_cluster(make_servers(pods=3, racks=2, servers=3, cores=8, ram=16.0),
+        ArrayCluster)
+    router = cluster.start_shards(2)
+    yield cluster
+    router.close()
+
+
+def test_servers_are_partitioned_by_pod_then_rack_then_server():
+    ids = list(make_servers(pods=2, racks=3, servers=2))
+    assert [list(group) for group in partition_servers(ids, 2)] == [list(range(6)),
+        list(range(6, 12))]
+    assert len(partition_servers(ids, 6)) == 6
+    groups = partition_servers(ids, 20)
+    assert len(groups) == 12
+    assert sorted(np.concatenate(groups).tolist()) == list(range(12))
+
+
+def test_feasible_matches_linear_scan(sharded_cluster):
+    servers = list(sharded_cluster.servers.values())
+    rng = random.Random(1)
+    for _ in range(200):
+        server = rng.choice(servers)
+        server.allocate_cores(min(server._cores_remaining, rng.randint(0, 3)))
+        server.allocate_ram(min(server._ram_remaining, rng.choice((0.0, 4.0))))
+        cores, ram = rng.randint(0, 8), rng.choice((0.0, 4.0, 16.0))
+        expected = [server.id for server in servers
+            if server.has_cores_capacity(cores) and server.has_ram_capacity(ram)]
+        assert [server.id for server in sharded_cluster.shard_router.feasible(cores, ram)] == \
+            expected
+
+
+def test_sharded_placements_match_plain_filters_for_a_seed(sharded_cluster):
+    ticks = random_ticks(n_ticks=40)
+    f_servers = make_servers(pods=3, racks=2, servers=3, cores=8, ram=16.0)
+    plain = run_ticks(NovaFilter(make_cluster(f_servers), False), ticks)
+    assert run_ticks(NovaFilter(sharded_cluster, False), ticks) == plain
+
+
+def test_shards_require_shared_memory(monkeypatch):
+    cluster = make_cluster(make_servers(), ArrayCluster)
+    monkeypatch.setattr(sys, 'version_info', (3, 7, 0))
+    with pytest.raises(SystemExit):
+        cluster.start_shards(2)
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import schedulers.constants as const
+from schedulers.novafilter import NovaFilter
+from schedulers.run_sweep import sweep, tick_latencies
+
+from util import make_cluster, make_servers, random_ticks, run_ticks, write_workload
+
+FAILURE_FIELDS = (const.FAIL_VM_STR, const.FAIL_CORES_STR, const.FAIL_RAM_STR)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    topology = str(tmp_path / 'topology.json')
+    with open(topology, 'w') as ff:
+        json.dump({'Servers': make_servers(pods=1, racks=2, servers=4, cores=8, ram=16.0)}, ff)
+    workload = write_workload(str(tmp_path / 'workload.json'),
+        random_ticks(n_ticks=40, creates_per_tick=12, seed=13))
+    return topology, workload
+
+
+def test_rows_follow_the_runs_and_cluster_modes_agree(inputs):
+    topology, workload = inputs
+    runs = [(topology, workload, seed, 'random', cluster, False)
+        for seed in (0, 1) for cluster in ('plain', 'index', 'vectorized')]
+    rows = sweep(runs, 2)
+    assert [(row['seed'], row['cluster']) for row in rows] == [(run[2], run[4]) for run in runs]
+    for seed in (0, 1):
+        failures = {tuple(row[field] for field in FAILURE_FIELDS)
+            for row in rows if row['seed'] == seed}
+        assert len(failures) == 1
+    assert rows[0][const.FAIL_VM_STR] > 0
+    assert all(row['latency_of'] == 'event' for row in rows)
+
+
+def test_batched_percentiles_are_per_tick(inputs):
+    topology, workload = inputs
+    sequential, batched = sweep([(topology, workload, 0, 'random', 'plain', batch)
+        for batch in (False, True)], 2)
+    assert batched['latency_of'] == 'tick'
+    assert batched['events'] == sequential['events']
+
+
+def test_tick_latencies_take_one_latency_per_tick():
+    ticks = random_ticks(n_ticks=20, seed=14)
+    scheduler = NovaFilter(make_cluster(), False, batch=True)
+    run_ticks(scheduler, ticks)
+    latencies = tick_latencies(scheduler.allocations)
+    assert len(latencies) == len(ticks)
+    assert set(latencies) == set(scheduler.allocations.timedeltas())
@@ -0,0 +1,54 @@
+import io
+import json
+import random
+
+import pytest
+
+import schedulers.constants as const
+from schedulers.lib.replay import WorkloadReplayer
+from schedulers.lib.synthetic import (DEFAULT_FLAVORS, Lifetime, parse_flavors, write_topology,
+    write_workload)
+
+
+def test_topology_uses_the_servers_schema():
+    ff = io.StringIO()
+    types = parse_flavors('32:256:1,64:512:3')
+    assert write_topology(ff, 2, 3, 4, types, seed=1) == 24
+    servers = json.loads(ff.getvalue())['Servers']
+    assert sorted(servers) == sorted('p{}_r{}_s{}'.format(p, r, s)
+        for p in range(2) for r in range(3) for s in range(4))
+    assert 'p0_r0_s0' in servers
+    assert {tuple(shape) for shape in servers.values()} <= {(32.0, 256.0), (64.0, 512.0)}
+
+
+@pytest.mark.parametrize('lifetime', ['exp:5', 'uniform:0:3', 'fixed:2', 'forever'])
+def test_workload_ticks_increase_and_hold_n_events(lifetime):
+    ff = io.StringIO()
+    n_ticks = write_workload(ff, 500, 3.0, DEFAULT_FLAVORS, Lifetime(lifetime), seed=2)
+    workload = json.loads(ff.getvalue())
+    ticks = [WorkloadReplayer.tick_index(tick_id) for tick_id in workload]
+    assert len(ticks) == n_ticks
+    assert all(a < b for a, b in zip(ticks, ticks[1:]))
+    events = [event for tick_events in workload.values() for event in tick_events]
+    assert len(events) == 500
+    created = set()
+    for event in events:
+        if event[const.TYPE_STR] == const.VM_CREATE_STR:
+            created.add(event[const.VM_UUID_STR])
+        else:
+            assert event[const.VM_UUID_STR] in created
+    assert (len(created) == 500) == (lifetime == 'forever')
+
+
+def test_lifetimes_last_at_least_a_tick():
+    rand = random.Random(3)
+    assert min(Lifetime('uniform:0:2').sample(rand) for _ in range(200)) == 1
+    assert Lifetime('fixed:0').sample(rand) == 1
+    assert Lifetime('forever').sample(rand) == -1
+
+
+@pytest.mark.parametrize('spec', ['exp', 'exp:1:2', 'uniform:3', 'fixed', 'forever:1',
+    'exp:0', 'uniform:4:2', 'normal:3'])
+def test_invalid_lifetimes_are_rejected(spec):
+    with pytest.raises(ValueError):
+        Lifetime(spec)
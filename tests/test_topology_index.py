@@ -0,0 +1,51 @@
+import random
+
+from schedulers.novafilter import NovaFilter
+
+from util import make_cluster, make_servers, random_ticks, run_ticks
+
+
+def linear_candidates(servers, cores, ram):
+    return [server for server in servers
+        if server.has_cores_capacity(cores) and server.has_ram_capacity(ram)]
+
+
+def test_candidates_match_linear_scan_under_random_updates():
+    servers = make_servers(pods=3, racks=3, servers=3, cores=8, ram=16.0)
+    # servers of one rack listed apart, so visiting racks is not cluster order
+    servers = dict(sorted(servers.items(), key=lambda item: item[0].split('_')[2]))
+    cluster = make_cluster(servers)
+    index = cluster.build_topology_index()
+    servers = list(cluster.servers.values())
+    rng = random.Random(1)
+    for _ in range(800):
+        server = rng.choice(servers)
+        if rng.random() < 0.6:
+            server.allocate_cores(min(server._cores_remaining, rng.randint(1, 4)))
+            server.allocate_ram(min(server._ram_remaining, rng.choice((2.0, 8.0))))
+        else:
+            server.free_cores(server.cores - server._cores_remaining)
+            server.free_ram(server.ram - server._ram_remaining)
+        cores, ram = rng.randint(0, 8), rng.choice((0.0, 4.0, 16.0))
+        assert index.candidates(cores, ram) == linear_candidates(servers, cores, ram)
+
+
+def test_summaries_track_free_and_largest_remaining():
+    cluster = make_cluster(make_servers(pods=1, racks=2, servers=2, cores=8, ram=16.0))
+    index = cluster.build_topology_index()
+    rack = cluster.servers['p0_r0_s0'], cluster.servers['p0_r0_s1']
+    for server in rack:
+        server.allocate_cores(6)
+    summary = index.summary()['p0']
+    assert summary['racks']['r0']['free_cores'] == 4
+    assert summary['racks']['r0']['max_cores_remaining'] == 2
+    assert summary['max_cores_remaining'] == 8
+    assert index.candidates(3, 1.0) == [cluster.servers['p0_r1_s0'], cluster.servers['p0_r1_s1']]
+
+
+def test_placements_match_linear_filters_for_a_seed():
+    ticks = random_ticks()
+    plain = run_ticks(NovaFilter(make_cluster(), False), ticks)
+    indexed_cluster = make_cluster()
+    indexed_cluster.build_topology_index()
+    assert run_ticks(NovaFilter(indexed_cluster, False), ticks) == plain
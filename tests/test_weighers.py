@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from schedulers.lib.weighers import WEIGHERS, SortedServers, make_weigher_policy
+
+from util import create, make_cluster, make_servers
+
+
+def fitting(servers, weigher, req):
+    """ Feasible servers best first, by filtering the whole cluster """
+    feasible = [server for server in servers
+        if server.has_cores_capacity(req.cores) and server.has_ram_capacity(req.ram)]
+    pos = {server.id: i for i, server in enumerate(servers)}
+    return sorted(feasible, key=lambda server: weigher.key(server, pos[server.id]))
+
+
+def test_sorted_servers_match_brute_force_through_splits_and_deletes():
+    rng = random.Random(5)
+    entries = dict()
+    for pos in range(40):
+        entries[pos] = ((rng.randint(0, 8), pos), rng.randint(0, 8), rng.uniform(0, 8))
+    sorted_servers = SortedServers(list(entries.values()), load=2)
+    for _ in range(2000):
+        pos = rng.randrange(60)
+        if pos in entries:
+            sorted_servers.remove(entries.pop(pos)[0])
+        else:
+            entries[pos] = ((rng.randint(0, 8), pos), rng.randint(0, 8), rng.uniform(0, 8))
+            sorted_servers.add(*entries[pos])
+        start, cores, ram = (rng.randint(0, 8),), rng.randint(0, 8), rng.uniform(0, 8)
+        expected = sorted(key for key, key_cores, key_ram in entries.values()
+            if key >= start and key_cores >= cores and key_ram >= ram)
+        assert list(sorted_servers.iter_fitting(start, cores, ram)) == expected
+
+
+def test_empty_sorted_servers_fit_nothing():
+    sorted_servers = SortedServers([((1, 0), 1, 1.0)])
+    sorted_servers.remove((1, 0))
+    assert list(sorted_servers.iter_fitting((), 0, 0.0)) == []
+    sorted_servers.add((2, 0), 2, 2.0)
+    assert list(sorted_servers.iter_fitting((), 1, 1.0)) == [(2, 0)]
+
+
+@pytest.mark.parametrize('name', sorted(WEIGHERS))
+def test_best_and_top_match_filtering_all_servers(name):
+    servers = list(make_cluster(make_servers(racks=4, cores=8, ram=16.0)).servers.values())
+    weigher = make_weigher_policy(name, cpu_multiplier=-1.0, ram_multiplier=2.0)
+    weigher.attach(servers)
+    weigher._sorted.load = 2
+    rng = random.Random(7)
+    for _ in range(600):
+        server = rng.choice(servers)
+        if rng.random() < 0.6:
+            server.allocate_cores(min(server._cores_remaining, rng.randint(1, 3)))
+            server.allocate_ram(min(server._ram_remaining, rng.choice((1.0, 4.0))))
+        else:
+            server.free_cores(server.cores - server._cores_remaining)
+            server.free_ram(server.ram - server._ram_remaining)
+        req = create(0, 'vm', rng.randint(1, 6), rng.choice((1.0, 4.0, 12.0)))
+        expected = fitting(servers, weigher, req)
+        assert weigher.best(req) is (expected[0] if expected else None)
+        assert weigher.top(req, 3) == expected[:3]
+        if expected:
+            assert weigher.select(req, expected[::-1]) is expected[0]
+
+
+def test_pack_skips_hosts_short_of_ram():
+    servers = list(make_cluster(make_servers(pods=1, racks=1, servers=6, cores=8, ram=16.0)).servers.values())
+    weigher = make_weigher_policy('pack')
+    weigher.attach(servers)
+    for server in servers[:5]:
+        server.allocate_cores(6)
+        server.allocate_ram(15.0)
+    # the five fullest hosts by cores have too little RAM
+    assert weigher.best(create(0, 'vm', 2, 4.0)) is servers[5]
+    assert weigher.best(create(0, 'vm', 2, 1.0)) is servers[0]
+    assert weigher.best(create(0, 'vm', 9, 1.0)) is None
@@ -0,0 +1,46 @@
+import schedulers.constants as const
+from schedulers.lib.workload import VMEvent, WorkingSet
+
+from util import make_cluster
+
+
+def test_events_have_no_instance_dict():
+    event = VMEvent('tick_0', const.VM_CREATE_STR, 'vdc', 'vm', 2, 4.0)
+    assert not hasattr(event, '__dict__')
+
+
+def test_working_set_add_get_pop():
+    servers = list(make_cluster().servers.values())
+    working_set = WorkingSet(servers)
+    working_set.add('a', servers[3], 2, 4.0)
+    working_set.add('b', const.FAILED_STR, 1, 1.0)
+    assert len(working_set) == 2 and 'a' in working_set
+    assert working_set.get('a') == (servers[3], 2, 4.0)
+    assert working_set.get('b') == (const.FAILED_STR, 1, 1.0)
+    assert working_set.pop('a') == (servers[3], 2, 4.0)
+    assert 'a' not in working_set and working_set.get('a') is None
+    assert working_set.pop('a', 'missing') == 'missing'
+
+
+def test_handles_of_removed_vms_are_reused():
+    servers = list(make_cluster().servers.values())
+    working_set = WorkingSet(servers)
+    for i in range(4):
+        working_set.add('vm{}'.format(i), servers[i], 1, 1.0)
+    working_set.pop('vm1')
+    working_set.add('vm9', servers[5], 3, 6.0)
+    assert len(working_set._cores) == 4
+    assert working_set.get('vm9') == (servers[5], 3, 6.0)
+    assert dict(working_set.items())['vm2'] == (servers[2], 1, 1.0)
+
+
+def test_export_and_restore_round_trip():
+    servers = list(make_cluster().servers.values())
+    working_set = WorkingSet(servers)
+    working_set.add('a', servers[1], 2, 4.0)
+    working_set.add('b', const.FAILED_STR, 1, 1.0)
+    working_set.add('c', servers[2], 4, 8.0)
+    working_set.pop('a')
+    restored = WorkingSet(servers)
+    restored.restore(*working_set.export())
+    assert dict(restored.items()) == dict(working_set.items())
@@ -0,0 +1,90 @@
+import json
+import random
+from typing import Dict, List, Tuple
+
+import schedulers.constants as const
+from schedulers.lib.domain import Cluster
+from schedulers.lib.workload import VMEvent
+
+# a small workload in the tick format, with a create and a delete per VM
+WORKLOAD = {
+    'tick_0': [{'type': 'create', 'vdc_uuid': 'd0', 'vm_uuid': 'v0', 'cores': 2, 'ram_in_gb': 4.0}],
+    'tick_5': [{'type': 'create', 'vdc_uuid': 'd0', 'vm_uuid': 'v1', 'cores': 1, 'ram_in_gb': 0.5},
+        {'type': 'delete', 'vdc_uuid': 'd0', 'vm_uuid': 'v0'}],
+    'tick_12': [{'type': 'delete', 'vdc_uuid': 'd0', 'vm_uuid': 'v1'}],
+}
+
+
+def replay_all(replayer) -> List[List[Tuple]]:
+    """ (tick, type, vm_uuid, cores, ram) of every replayed event, by tick """
+    ticks = []
+    events = replayer.replay()
+    while events:
+        ticks.append([(e.tick, e.type, e.vm_uuid, e.cores, e.ram) for e in events])
+        events = replayer.replay()
+    return ticks
+
+
+def make_servers(pods=2, racks=2, servers=4, cores=16, ram=32.0) -> Dict[str, List]:
+    """ "Servers" section of a topology, with p<pod>_r<rack>_s<server> ids """
+    return {'p{}_r{}_s{}'.format(p, r, s): [cores, ram]
+        for p in range(pods) for r in range(racks) for s in range(servers)}
+
+
+def make_cluster(f_servers: Dict[str, List] = None, cluster_class=Cluster) -> Cluster:
+    cluster = cluster_class()
+    cluster.load_servers(f_servers or make_servers())
+    return cluster
+
+
+def create(tick: int, vm_uuid: str, cores=1, ram=1.0) -> VMEvent:
+    return VMEvent('tick_{}'.format(tick), const.VM_CREATE_STR, 'vdc', vm_uuid, cores, ram)
+
+
+def delete(tick: int, vm_uuid: str) -> VMEvent:
+    return VMEvent('tick_{}'.format(tick), const.VM_DELETE_STR, 'vdc', vm_uuid)
+
+
+def random_ticks(n_ticks=30, creates_per_tick=8, seed=0,
+        flavors=((1, 1.0), (2, 4.0), (4, 8.0), (8, 16.0))) -> List[List[VMEvent]]:
+    """ Ticks of creates of random flavors, and deletes of random live VMs. """
+    rng = random.Random(seed)
+    live = []  # type: List[str]
+    ticks = []
+    n = 0
+    for tick in range(n_ticks):
+        events = []
+        for _ in range(rng.randrange(creates_per_tick)):
+            if live and rng.random() < 0.4:
+                events.append(delete(tick, live.pop(rng.randrange(len(live)))))
+            else:
+                cores, ram = rng.choice(flavors)
+                vm_uuid = 'vm{}'.format(n)
+                n += 1
+                live.append(vm_uuid)
+                events.append(create(tick, vm_uuid, cores, ram))
+        if events:
+            ticks.append(events)
+    return ticks
+
+
+def placements(scheduler) -> List[Tuple[str, str, str]]:
+    """ (tick, vm_uuid, server_id) of every recorded allocation """
+    return [(vm.tick, vm.vm_uuid, server_id) for vm, server_id, _ in scheduler.allocations]
+
+
+def run_ticks(scheduler, ticks: List[List[VMEvent]], seed=1):
+    random.seed(seed)
+    for events in ticks:
+        scheduler.schedule(events)
+    return placements(scheduler)
+
+
+def write_workload(path: str, ticks: List[List[VMEvent]]) -> str:
+    """ Write ticks of VMEvents as a workload file in the tick format """
+    workload = {events[0].tick: [{'type': req.type, 'vdc_uuid': req.vdc_uuid,
+        'vm_uuid': req.vm_uuid, 'cores': req.cores, 'ram_in_gb': req.ram} for req in events]
+        for events in ticks}
+    with open(path, 'w') as ff:
+        json.dump(workload, ff)
+    return path